@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# benchmark-board-id.py
+#
+# Compares the old board-id probe (ioreg piped into grep, then a regex over the
+# result) with the streaming reader in macadmin/ioreg.py. The recorded ioreg
+# output in fixtures/ioreg is replayed with cat in place of ioreg, so this runs
+# on any platform.
+#
+# Usage:
+#   benchmark-board-id.py [--iterations 200] [--extra-lines 0]
+#
+# --extra-lines appends that many property lines after the board-id to mimic
+# the larger output of a deeper ioreg query.
+#
+# ================================================================================
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macadmin import ioreg
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'fixtures', 'ioreg')
+
+
+def pipeline_board_id(fixture):
+    """The probe the check scripts used before, with ioreg replaced by cat"""
+    p1 = subprocess.Popen(["cat", fixture], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    p2 = subprocess.Popen(["grep", "board-id"], stdin=p1.stdout, stdout=subprocess.PIPE,
+                          universal_newlines=True)
+    p1.stdout.close()
+    (results, err) = p2.communicate()
+    p1.wait()
+    board_id = re.sub(r"^\s*\"board-id\" = <\"(.*)\">$", r"\1", results)
+    return board_id.strip()
+
+
+def streaming_board_id(fixture):
+    return ioreg.stream_properties(["cat", fixture], ['board-id']).get('board-id')
+
+
+def parse_only_board_id(fixture):
+    with open(fixture) as f:
+        return ioreg.find_properties(f, ['board-id']).get('board-id')
+
+
+def timed(function, fixture, iterations):
+    expected = function(fixture)
+    start = time.time()
+    for i in range(iterations):
+        if function(fixture) != expected:
+            raise RuntimeError("%s returned inconsistent results" % function.__name__)
+    return expected, (time.time() - start) / iterations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark board-id readers")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--extra-lines", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        fixture = os.path.join(temp_dir, 'IODeviceTree-root.txt')
+        shutil.copy(os.path.join(FIXTURES_DIR, 'IODeviceTree-root.txt'), fixture)
+        if args.extra_lines:
+            with open(fixture, 'a') as f:
+                for index in range(args.extra_lines):
+                    f.write('      "property-%d" = <%08x>\n' % (index, index))
+
+        for function in [pipeline_board_id, streaming_board_id, parse_only_board_id]:
+            board_id, seconds = timed(function, fixture, args.iterations)
+            print("%-20s %-24s %8.3f ms" % (function.__name__, board_id, seconds * 1000))
+    finally:
+        shutil.rmtree(temp_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# benchmark-compatibility-daemon.py
+#
+# Load test for the compatibility daemon in macadmin/daemon.py. Starts the
+# daemon in-process on a temporary socket with the facts of a recorded hardware
+# profile from fixtures/profiles, then runs --clients concurrent clients that
+# each send --queries requests on one connection, and reports throughput and
+# latency percentiles. For comparison it also times one run of a checker
+# script's check_compatibility() with the facts already gathered.
+#
+# Usage:
+#   benchmark-compatibility-daemon.py [--clients 8] [--queries 2000]
+#                                     [--profile macbookpro11-5-mojave]
+#
+# ================================================================================
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES_DIR = os.path.join(REPO_DIR, 'fixtures', 'profiles')
+sys.path.insert(0, REPO_DIR)
+
+from macadmin import cache
+from macadmin import checkers
+from macadmin import daemon
+from macadmin import facts
+from macadmin import ioreg
+from macadmin import sysctl
+
+
+def install_profile(name):
+    """Makes macadmin.facts read the recorded outputs of a profile"""
+    path = os.path.join(PROFILES_DIR, name)
+    values = {}
+    with open(os.path.join(path, 'sysctl.txt')) as f:
+        for line in f:
+            if ': ' in line:
+                key, value = line.rstrip('\n').split(': ', 1)
+                values[key] = value
+    with open(os.path.join(path, 'IODeviceTree-root.txt')) as f:
+        ioreg_lines = f.readlines()
+    cache.enabled = False
+    facts.SYSTEM_VERSION_PLIST = os.path.join(path, 'SystemVersion.plist')
+    sysctl.set_provider(sysctl.FixtureSysctl(values))
+    ioreg.read_board_id = lambda: ioreg.find_properties(ioreg_lines, ['board-id']).get('board-id')
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_client(path, queries, releases, latencies):
+    client = daemon.Client(path)
+    timings = []
+    try:
+        for index in range(queries):
+            start = time.time()
+            client.query(releases[index % len(releases)])
+            timings.append(time.time() - start)
+    finally:
+        client.close()
+    latencies.extend(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the compatibility daemon")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per client")
+    parser.add_argument("--profile", default="macbookpro11-5-mojave")
+    args = parser.parse_args(argv)
+
+    install_profile(args.profile)
+    releases = [release[0] for release in checkers.RELEASES] + [daemon.ALL_RELEASES]
+
+    service = daemon.CompatibilityService()
+    start = time.time()
+    service.refresh()
+    print "Startup: probed and checked %d releases in %.2f ms" % (
+        len(service.versions), (time.time() - start) * 1000)
+
+    checker = checkers.load_checker('10.15')
+    start = time.time()
+    checker.check_compatibility()
+    print "One check_compatibility() call with gathered facts: %.3f ms" % ((time.time() - start) * 1000)
+
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, 'compatibility.sock')
+    server = daemon.CompatibilityServer(service, path)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    try:
+        latencies = []
+        threads = [threading.Thread(target=run_client,
+                                    args=(path, args.queries, releases, latencies))
+                   for index in range(args.clients)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(temp_dir)
+
+    latencies.sort()
+    print "%d clients x %d queries: %.0f queries/s" % (args.clients, args.queries,
+                                                       len(latencies) / elapsed)
+    print "Latency: p50 %.1f us, p99 %.1f us, max %.1f us" % (
+        percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6, latencies[-1] * 1e6)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
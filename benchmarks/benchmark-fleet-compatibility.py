@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# benchmark-fleet-compatibility.py
+#
+# Measures the throughput of the fleet compatibility evaluator in
+# macadmin/fleet.py on a synthetic inventory. The inventory is generated from
+# the board-ids and models in the rules table mixed with unknown values.
+#
+# With --stream the records are generated on the fly and fed to the streaming
+# evaluator once for every worker count, reporting records/s for each.
+#
+# Usage:
+#   benchmark-fleet-compatibility.py [--rows 1000000] [--reference-rows 100000]
+#   benchmark-fleet-compatibility.py --stream --workers 1,2,4,8 [--format binary]
+#
+# ================================================================================
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from macadmin import fleet
+from macadmin import rules
+
+PRODUCT_VERSIONS = ['10.6.8', '10.7.5', '10.8.5', '10.9.5', '10.10.5', '10.11.6',
+                    '10.12.6', '10.13.6', '10.14.6', '10.15.7']
+
+
+def synthetic_records(count, seed=0):
+    """Yields count random inventory records"""
+    generator = random.Random(seed)
+    board_ids = set()
+    models = set()
+    for version, key in fleet.release_keys():
+        release_rules = rules.load(version)
+        board_ids.update(release_rules.board_ids)
+        # Every revision up to the upper bound of the unsupported model intervals
+        for family, low, high in release_rules.non_supported_models:
+            models.update('%s%d,%d' % (family, major, minor)
+                          for major in range(max(low[0], 1), min(high[0], 20) + 1)
+                          for minor in range(1, 4))
+    board_ids = sorted(board_ids) + ['Mac-%016X' % generator.getrandbits(64) for i in range(20)]
+    models = sorted(models) + ['MacBookPro%d,%d' % (major, minor)
+                               for major in range(9, 17) for minor in range(1, 4)]
+    for index in range(count):
+        yield {
+            'serial_number': 'C02%08d' % index,
+            'board_id': generator.choice(board_ids),
+            'model': generator.choice(models),
+            'product_version': generator.choice(PRODUCT_VERSIONS),
+            'memsize': generator.choice([1, 2, 4, 8, 16]) * 1024 * 1024 * 1024,
+            'cpu64bit_capable': '1',
+            'cpu_features': 'FPU VME VMM' if generator.random() < 0.02 else 'FPU VME',
+        }
+
+
+def benchmark_stream(rows, worker_counts, output_format, batch_size):
+    with open(os.devnull, 'wb') as devnull:
+        for workers in worker_counts:
+            start = time.time()
+            count = fleet.write_stream(synthetic_records(rows), devnull,
+                                       output_format=output_format,
+                                       workers=workers,
+                                       batch_size=batch_size)
+            elapsed = time.time() - start
+            print("Streaming: %2d workers, %d records in %.2f s (%.0f records/s)" % (
+                workers, count, elapsed, count / elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fleet compatibility evaluator")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--reference-rows", type=int, default=100000,
+                        help="Rows evaluated with the row at a time reference implementation")
+    parser.add_argument("--stream", action="store_true",
+                        help="Benchmark the streaming evaluator instead")
+    parser.add_argument("--workers", default="1,2,4",
+                        help="Comma separated worker counts for --stream")
+    parser.add_argument("--format", choices=fleet.OUTPUT_FORMATS, default="jsonl")
+    parser.add_argument("--batch-size", type=int, default=fleet.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    print("NumPy: %s" % ("yes" if fleet.numpy is not None else "no"))
+    if args.stream:
+        worker_counts = [int(workers) for workers in args.workers.split(',')]
+        benchmark_stream(args.rows, worker_counts, args.format, args.batch_size)
+        return 0
+
+    records = list(synthetic_records(args.rows))
+
+    start = time.time()
+    inventory = fleet.Inventory(records)
+    load_time = time.time() - start
+
+    start = time.time()
+    results = fleet.evaluate(inventory)
+    evaluate_time = time.time() - start
+    print("Columnar: %d rows loaded in %.2f s, evaluated in %.2f s (%.0f rows/s)" % (
+        args.rows, load_time, evaluate_time, args.rows / evaluate_time))
+
+    reference_rows = min(args.reference_rows, args.rows)
+    release_rules = [(key, rules.load(version)) for version, key in fleet.release_keys()]
+    start = time.time()
+    for index in range(reference_rows):
+        for key, rule in release_rules:
+            verdict = fleet.evaluate_record(records[index], rule)
+            if verdict != bool(results[key][index]):
+                print("Mismatch for row %d, %s" % (index, key))
+                return 1
+    reference_time = time.time() - start
+    print("Row at a time: %d rows evaluated in %.2f s (%.0f rows/s)" % (
+        reference_rows, reference_time, reference_rows / reference_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
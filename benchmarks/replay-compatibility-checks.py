@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# replay-compatibility-checks.py
+#
+# Runs the check-10.*-compatibility.py scripts against recorded hardware
+# profiles instead of the local machine, times them end to end and per probe,
+# and compares the exit codes and conditional items with the golden results.
+# Runs anywhere the scripts' python 2.7 runs, no Mac needed.
+#
+# Every directory in fixtures/profiles is one machine:
+#   IODeviceTree-root.txt  ioreg -p IODeviceTree -r -n / -d 1
+#   SystemVersion.plist    /System/Library/CoreServices/SystemVersion.plist
+#   sysctl.txt             sysctl values in "name: value" form (sysctl -a)
+#   commands.json          output of the other commands the scripts run (also
+#                          the ioreg commands read with stream_properties()),
+#                          null for a command that fails
+#   receipts/              the package receipts of /var/db/receipts
+# The expected results are in fixtures/profiles/golden.json, with the
+# hypervisor vendor facts.virtual_machine_vendor() finds in every profile.
+#
+# Every directory in fixtures/linux is the /proc and /sys files of a Linux
+# host. check-if-virtual-machine.py is run against them through the Linux
+# backend and compared with fixtures/linux/golden.json.
+#
+# Usage:
+#   replay-compatibility-checks.py [--profile NAME ...] [--release 10.15 ...]
+#                                  [--latency 50] [--iterations 5]
+#   replay-compatibility-checks.py --update-golden
+#
+# --latency adds that many milliseconds to every replayed sysctl, ioreg and
+# command call to mimic a busy machine.
+#
+# Exit codes:
+# 0 = All results match the golden results
+# 1 = At least one result differs
+#
+# ================================================================================
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES_DIR = os.path.join(REPO_DIR, 'fixtures', 'profiles')
+GOLDEN_PATH = os.path.join(PROFILES_DIR, 'golden.json')
+LINUX_PROFILES_DIR = os.path.join(REPO_DIR, 'fixtures', 'linux')
+LINUX_GOLDEN_PATH = os.path.join(LINUX_PROFILES_DIR, 'golden.json')
+
+# Probes are only instrumented when this is set before macadmin is imported
+os.environ.setdefault('MACADMIN_METRICS', os.devnull)
+sys.path.insert(0, REPO_DIR)
+
+from macadmin import cache
+from macadmin import checkers
+from macadmin import facts
+from macadmin import ioreg
+from macadmin import linux
+from macadmin import metrics
+from macadmin import receipts
+from macadmin import sysctl
+from macadmin.plists import read_plist
+
+# The profiles must not be mixed with a cache of the local machine
+cache.enabled = False
+
+
+class ReplaySysctl(sysctl.FixtureSysctl):
+    """FixtureSysctl with an optional delay on every read"""
+
+    def __init__(self, values, latency):
+        sysctl.FixtureSysctl.__init__(self, values)
+        self.latency = latency
+
+    def string(self, name):
+        time.sleep(self.latency)
+        return sysctl.FixtureSysctl.string(self, name)
+
+    def integer(self, name):
+        time.sleep(self.latency)
+        return sysctl.FixtureSysctl.integer(self, name)
+
+
+class Profile(object):
+    """The recorded outputs of one machine"""
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.path = path
+        self.sysctl_values = {}
+        with open(os.path.join(path, 'sysctl.txt')) as f:
+            for line in f:
+                if ': ' in line:
+                    name, value = line.rstrip('\n').split(': ', 1)
+                    self.sysctl_values[name] = value
+        with open(os.path.join(path, 'IODeviceTree-root.txt')) as f:
+            self.ioreg_lines = f.readlines()
+        with open(os.path.join(path, 'commands.json')) as f:
+            self.commands = json.load(f)
+        self.system_version_plist = os.path.join(path, 'SystemVersion.plist')
+        self.receipts_dir = os.path.join(path, 'receipts')
+
+
+def load_profiles(names=None):
+    profiles = []
+    for name in sorted(os.listdir(PROFILES_DIR)):
+        path = os.path.join(PROFILES_DIR, name)
+        if os.path.isdir(path) and (not names or name in names):
+            profiles.append(Profile(path))
+    return profiles
+
+
+def install_profile(profile, latency):
+    """Points the probes of macadmin.facts to the recordings of profile"""
+    def read_board_id():
+        time.sleep(latency)
+        return ioreg.find_properties(profile.ioreg_lines, ['board-id']).get('board-id')
+
+    def stream_properties(cmd, keys, timeout=None):
+        time.sleep(latency)
+        metrics.subprocess_started()
+        output = profile.commands.get(' '.join(cmd))
+        if output is None:
+            return {}
+        return ioreg.find_properties(output.splitlines(True), keys)
+
+    facts.reset()
+    facts.SYSTEM_VERSION_PLIST = profile.system_version_plist
+    receipts.reset()
+    receipts.RECEIPTS_DIR = profile.receipts_dir
+    receipts.run_command = replay_command(profile, latency)
+    sysctl.set_provider(ReplaySysctl(profile.sysctl_values, latency))
+    ioreg.read_board_id = read_board_id
+    ioreg.stream_properties = stream_properties
+
+
+def replay_command(profile, latency):
+    """Returns a replacement of run_command() that replays commands.json"""
+    def run_command(cmd, timeout=None):
+        time.sleep(latency)
+        metrics.subprocess_started()
+        return profile.commands.get(' '.join(cmd))
+    return run_command
+
+
+def run_checker(checker, profile, latency, conditional_items_path):
+    """
+    Runs the main() of a check script against profile and returns a tuple
+    of the exit code, the conditional items written and the elapsed time
+    """
+    install_profile(profile, latency)
+    if os.path.exists(conditional_items_path):
+        os.unlink(conditional_items_path)
+    metrics.reset()
+    start = time.time()
+    exit_code = checker.main()
+    elapsed = time.time() - start
+    if os.path.exists(conditional_items_path):
+        conditional_items = dict(read_plist(conditional_items_path))
+    else:
+        conditional_items = {}
+    return exit_code, conditional_items, elapsed
+
+
+def prepare_checker(version, profile, latency, conditional_items_path, verbose):
+    checker = checkers.load_checker(version)
+    checker.verbose = verbose
+    # check-10.8 still uses the camelCase names
+    if hasattr(checker, 'updateMunkiConditionalItems'):
+        checker.updateMunkiConditionalItems = True
+        checker.conditionalItemsPath = lambda: conditional_items_path
+    else:
+        checker.update_munki_conditional_items = True
+        checker.conditional_items_path = lambda: conditional_items_path
+    return checker
+
+
+def replay_linux(names, update_golden):
+    """
+    Runs check-if-virtual-machine.py against the Linux profiles and returns
+    the number of results that differ from the golden results
+    """
+    if os.path.exists(LINUX_GOLDEN_PATH):
+        with open(LINUX_GOLDEN_PATH) as f:
+            golden = json.load(f)
+    else:
+        golden = {}
+    checker = checkers.load_script(os.path.join(REPO_DIR, 'check-if-virtual-machine.py'))
+    checker.verbose = False
+    mismatches = 0
+    for name in sorted(os.listdir(LINUX_PROFILES_DIR)):
+        path = os.path.join(LINUX_PROFILES_DIR, name)
+        if not os.path.isdir(path) or (names and name not in names):
+            continue
+        facts.reset()
+        linux.ROOT = path
+        sysctl.set_provider(sysctl.LinuxSysctl())
+        ioreg.read_board_id = lambda: linux.dmi("board_name")
+        start = time.time()
+        exit_code, conditional_items = checker.check_virtual_machine()
+        elapsed = time.time() - start
+        result = {'exit_code': exit_code, 'conditional_items': conditional_items}
+        if update_golden:
+            golden[name] = result
+            status = "recorded"
+        elif golden.get(name) == result:
+            status = "OK"
+        else:
+            status = "MISMATCH"
+            mismatches += 1
+        print "%-32s %-6s %-8s %10.2f  %s" % (
+            name, "linux", status, elapsed * 1000,
+            ", ".join("%s=%s" % item for item in sorted(conditional_items.items())))
+    if update_golden:
+        with open(LINUX_GOLDEN_PATH, 'w') as f:
+            json.dump(golden, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+    return mismatches
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded hardware profiles through the compatibility checks")
+    parser.add_argument("--profile", action="append", dest="profiles",
+                        help="Profile to replay, can be given multiple times")
+    parser.add_argument("--release", action="append", dest="releases",
+                        help="Release version to check, can be given multiple times")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="Milliseconds added to every replayed probe")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the scripts")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="Write the results to golden.json instead of comparing them")
+    args = parser.parse_args(argv)
+
+    latency = args.latency / 1000.0
+    versions = args.releases or [release[0] for release in checkers.RELEASES]
+    profiles = load_profiles(args.profiles)
+    if os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH) as f:
+            golden = json.load(f)
+    else:
+        golden = {}
+
+    temp_dir = tempfile.mkdtemp()
+    conditional_items_path = os.path.join(temp_dir, 'ConditionalItems.plist')
+    probe_totals = {}
+    mismatches = 0
+    try:
+        print "%-32s %-6s %-8s %10s  %s" % ("Profile", "OS", "Result", "Time (ms)", "Conditional items")
+        for profile in profiles:
+            for version in versions:
+                checker = prepare_checker(version, profile, latency, conditional_items_path,
+                                          args.verbose)
+                timings = []
+                for iteration in range(args.iterations):
+                    exit_code, conditional_items, elapsed = run_checker(
+                        checker, profile, latency, conditional_items_path)
+                    timings.append(elapsed)
+                    for name, probe in metrics.record()['probes'].items():
+                        total = probe_totals.setdefault(name, {'calls': 0, 'seconds': 0.0,
+                                                               'subprocesses': 0})
+                        for key in total:
+                            total[key] += probe[key]
+                result = {'exit_code': exit_code, 'conditional_items': conditional_items}
+                if args.update_golden:
+                    golden.setdefault(profile.name, {})[version] = result
+                    status = "recorded"
+                elif golden.get(profile.name, {}).get(version) == result:
+                    status = "OK"
+                else:
+                    status = "MISMATCH"
+                    mismatches += 1
+                print "%-32s %-6s %-8s %10.2f  %s" % (
+                    profile.name, version, status, median(timings) * 1000,
+                    ", ".join("%s=%s" % item for item in sorted(conditional_items.items())))
+
+            install_profile(profile, latency)
+            start = time.time()
+            vendor = facts.virtual_machine_vendor()
+            elapsed = time.time() - start
+            if args.update_golden:
+                golden.setdefault(profile.name, {})['virtual_machine_vendor'] = vendor
+                status = "recorded"
+            elif golden.get(profile.name, {}).get('virtual_machine_vendor') == vendor:
+                status = "OK"
+            else:
+                status = "MISMATCH"
+                mismatches += 1
+            print "%-32s %-6s %-8s %10.2f  virtual_machine_vendor=%s" % (
+                profile.name, "vendor", status, elapsed * 1000, vendor)
+        mismatches += replay_linux(args.profiles, args.update_golden)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print
+    print "%-24s %8s %12s %14s" % ("Probe", "Calls", "Mean (ms)", "Subprocesses")
+    for name, total in sorted(probe_totals.items()):
+        print "%-24s %8d %12.3f %14d" % (name, total['calls'],
+                                         total['seconds'] * 1000 / total['calls'],
+                                         total['subprocesses'])
+
+    if args.update_golden:
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(golden, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+        return 0
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
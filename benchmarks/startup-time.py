@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# startup-time.py
+#
+# Measures the cold start of the admin scripts: every script is loaded in a new
+# interpreter (without running main()) and the time spent importing it, the
+# wall clock time of the whole process and the modules it pulls in are
+# recorded. The process time of a bare interpreter is shown for comparison.
+# The results are compared with the budget in benchmarks/startup-budget.json:
+#
+#   deferred_modules  modules that must not be imported when a script is
+#                     loaded, only when the code path that needs them runs
+#   import_ms         the median import time allowed for every script
+#
+# Usage:
+#   startup-time.py [--runs 15] [--script check-10.15-catalina-compatibility.py ...]
+#   startup-time.py --update-budget
+#
+# Run it with the python the scripts are deployed with. --update-budget writes
+# twice the measured import times (at least 10 ms) as the new budget.
+#
+# Exit codes:
+# 0 = Every script is within its budget
+# 1 = A script imports a deferred module or is over its budget
+#
+# ================================================================================
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(REPO_DIR, 'benchmarks', 'startup-budget.json')
+
+# Loads a script as a module and prints the import time and the new modules
+CHILD = r"""
+import sys, time
+before = set(sys.modules)
+start = time.time()
+import imp
+imp.load_source('__startup__', sys.argv[1])
+elapsed = time.time() - start
+loaded = sorted(name for name in sys.modules
+                if name not in before and sys.modules[name] is not None)
+import json
+sys.stdout.write(json.dumps({'seconds': elapsed, 'modules': loaded}))
+"""
+
+
+def measure(script, runs):
+    """
+    Returns the import times and process times of runs cold starts and the
+    modules loaded
+    """
+    path = os.path.join(REPO_DIR, script)
+    timings = []
+    process_timings = []
+    modules = []
+    # The first run only compiles the bytecode of the imported modules
+    for run in range(runs + 1):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', CHILD, path], cwd=REPO_DIR)
+        elapsed = time.time() - start
+        result = json.loads(output)
+        if run:
+            timings.append(result['seconds'])
+            process_timings.append(elapsed)
+        modules = result['modules']
+    return timings, process_timings, modules
+
+
+def measure_interpreter(runs):
+    """Returns the process times of runs bare interpreter starts"""
+    timings = []
+    for run in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', 'pass'], cwd=REPO_DIR)
+        timings.append(time.time() - start)
+    return timings
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start of the admin scripts")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--script", action="append", dest="scripts",
+                        help="Script to measure, can be given multiple times")
+    parser.add_argument("--update-budget", action="store_true",
+                        help="Write the measured times to startup-budget.json")
+    args = parser.parse_args(argv)
+
+    with open(BUDGET_PATH) as f:
+        budget = json.load(f)
+    deferred = set(budget['deferred_modules'])
+    scripts = args.scripts or sorted(budget['import_ms'])
+
+    failures = 0
+    row = "%-44s %10s %10s %11s %8s  %s"
+    print row % ("Script", "Import ms", "Budget ms", "Process ms", "Modules", "Deferred modules imported")
+    print row % ("(bare interpreter)", "-", "-", "%.2f" % (median(measure_interpreter(args.runs)) * 1000),
+                 "-", "-")
+    for script in scripts:
+        timings, process_timings, modules = measure(script, args.runs)
+        import_ms = median(timings) * 1000
+        eager = sorted(name for name in modules if name.split('.')[0] in deferred)
+        allowed = budget['import_ms'].get(script)
+        if args.update_budget:
+            budget['import_ms'][script] = max(10, int(round(import_ms * 2)))
+        elif eager or allowed is None or import_ms > allowed:
+            failures += 1
+        print row % (script, "%.2f" % import_ms, allowed, "%.2f" % (median(process_timings) * 1000),
+                     len(modules), ", ".join(eager) or "-")
+
+    if args.update_budget:
+        with open(BUDGET_PATH, 'w') as f:
+            json.dump(budget, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+        return 0
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,6 +17,9 @@
 # - Machine model is not in a list of unsupported models
 # - Current system version is less than 10.13 and at least 10.8
 #
+# The supported board-ids and unsupported models are kept in
+# macadmin/compatibility_rules.plist
+#
 # Exit codes:
 # 0 = Mojave is supported
 # 1 = Mojave is not supported
@@ -30,11 +33,15 @@
 # ================================================================================
 
 import sys
-import subprocess
 import os
-import re
-import plistlib
-from distutils.version import StrictVersion
+
+from macadmin import cache
+from macadmin import facts
+from macadmin import output
+from macadmin import preferences
+from macadmin import receipts
+from macadmin import rules
+from macadmin.conditional_items import ConditionalItemsStore
 
 
 # ================================================================================
@@ -54,7 +61,9 @@ update_munki_conditional_items = False
 
 
 def logger(message, status, info):
-    if verbose:
+    if verbose and output.ndjson:
+        output.check(message, status, info)
+    elif verbose:
         print "%14s: %-40s [%s]" % (message, status, info)
     pass
 
@@ -62,16 +71,9 @@ def logger(message, status, info):
 def conditional_items_path():
     # <https://github.com/munki/munki/wiki/Conditional-Items>
     # Read the location of the ManagedInstallDir from ManagedInstall.plist
-    
-    cmd = [
-        "/usr/bin/defaults",
-        "read",
-        "/Library/Preferences/ManagedInstalls",
-        "ManagedInstallDir"
-    ]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    managed_installs_dir = results.strip()
+    bundle_id = 'ManagedInstalls'
+    pref_name = 'ManagedInstallDir'
+    managed_installs_dir = preferences.copy_app_value(pref_name, bundle_id)
     
     # Make sure we're outputting our information to "ConditionalItems.plist"
     if managed_installs_dir:
@@ -82,25 +84,15 @@ def conditional_items_path():
 
 
 def munki_installed():
-    cmd = ["pkgutil", "--pkg-info", "com.googlecode.munki.core"]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output = p.communicate()[0]
-    if p.returncode == 0:
-        return True
-    else:
-        return False
+    return receipts.munki_installed()
 
 
 def is_system_version_supported():
-    system_version_plist = plistlib.readPlist("/System/Library/CoreServices/SystemVersion.plist")
+    system_version_plist = facts.system_version()
     product_name = system_version_plist['ProductName']
     product_version = system_version_plist['ProductVersion']
-    if StrictVersion(product_version) >= StrictVersion('10.14'):
-        logger("System",
-               "%s %s" % (product_name, product_version),
-               "Failed")
-        return False
-    elif StrictVersion(product_version) >= StrictVersion('10.8'):
+    release_rules = rules.load('10.14')
+    if product_version in release_rules.system_versions:
         logger("System",
                "%s %s" % (product_name, product_version),
                "OK")
@@ -113,104 +105,24 @@ def is_system_version_supported():
 
 
 def get_board_id():
-    cmd = ["/usr/sbin/ioreg",
-           "-p", "IODeviceTree",
-           "-r",
-           "-n", "/",
-           "-d", "1"]
-    p1 = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    p2 = subprocess.Popen(["/usr/bin/grep", "board-id"], stdin=p1.stdout, stdout=subprocess.PIPE)
-    (results, err) = p2.communicate()
-    board_id = re.sub(r"^\s*\"board-id\" = <\"(.*)\">$", r"\1", results)
-    board_id = board_id.strip()
-    if board_id.startswith('Mac'):
-        return board_id
-    else:
-        return None
+    return facts.board_id()
 
 
 def is_virtual_machine():
-    cmd = ["/usr/sbin/sysctl", "-n", "machdep.cpu.features"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    for feature in results.split():
-        if feature == "VMM":
-            logger("Board ID",
-                   "Virtual machine",
-                   "OK")
-            return True
+    if facts.is_virtual_machine():
+        logger("Board ID",
+               "Virtual machine",
+               "OK")
+        return True
     return False
 
 
 def get_current_model():
-    cmd = ["/usr/sbin/sysctl", "-n", "hw.model"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    return results.strip()
+    return facts.model()
 
 
 def is_supported_model():
-    non_supported_models = [
-        'MacBookPro4,1',
-        'MacPro2,1',
-        'Macmini5,2',
-        'Macmini5,1',
-        'MacBookPro5,1',
-        'MacBookPro1,1',
-        'MacBookPro5,3',
-        'MacBookPro5,2',
-        'iMac8,1',
-        'MacBookPro5,4',
-        'MacBookAir4,2',
-        'Macmini2,1',
-        'iMac5,2',
-        'iMac11,3',
-        'MacBookPro8,2',
-        'MacBookPro3,1',
-        'Macmini5,3',
-        'MacBookPro1,2',
-        'Macmini4,1',
-        'iMac9,1',
-        'iMac6,1',
-        'Macmini3,1',
-        'Macmini1,1',
-        'MacBookPro6,1',
-        'MacBookPro2,2',
-        'MacBookPro2,1',
-        'iMac12,2',
-        'MacBook3,1',
-        'MacPro3,1',
-        'MacBook5,1',
-        'MacBook5,2',
-        'iMac11,1',
-        'iMac10,1',
-        'MacBookPro7,1',
-        'MacBook2,1',
-        'MacBookAir4,1',
-        'MacPro4,1',
-        'MacBookPro6,2',
-        'iMac12,1',
-        'MacBook1,1',
-        'MacBookPro5,5',
-        'iMac11,2',
-        'iMac4,2',
-        'Xserve2,1',
-        'MacBookAir3,1',
-        'MacBookAir3,2',
-        'MacBookAir1,1',
-        'Xserve3,1',
-        'iMac4,1',
-        'MacBookAir2,1',
-        'Xserve1,1',
-        'iMac5,1',
-        'MacBookPro8,1',
-        'MacBook7,1',
-        'MacBookPro8,3',
-        'iMac7,1',
-        'MacBook6,1',
-        'MacBook4,1',
-        'MacPro1,1',
-        ]
+    non_supported_models = rules.load('10.14').non_supported_models
     current_model = get_current_model()
     if current_model in non_supported_models:
         logger("Model",
@@ -225,65 +137,7 @@ def is_supported_model():
 
 
 def is_supported_board_id():
-    platform_support_values = [
-        'Mac-06F11F11946D27C5',
-        'Mac-031B6874CF7F642A',
-        'Mac-CAD6701F7CEA0921',
-        'Mac-50619A408DB004DA',
-        'Mac-7BA5B2D9E42DDD94',
-        'Mac-473D31EABEB93F9B',
-        'Mac-AFD8A9D944EA4843',
-        'Mac-B809C3757DA9BB8D',
-        'Mac-7DF2A3B5E5D671ED',
-        'Mac-35C1E88140C3E6CF',
-        'Mac-77EB7D7DAF985301',
-        'Mac-2E6FAB96566FE58C',
-        'Mac-827FB448E656EC26',
-        'Mac-BE0E8AC46FE800CC',
-        'Mac-00BE6ED71E35EB86',
-        'Mac-4B7AC7E43945597E',
-        'Mac-5A49A77366F81C72',
-        'Mac-35C5E08120C7EEAF',
-        'Mac-FFE5EF870D7BA81A',
-        'Mac-C6F71043CEAA02A6',
-        'Mac-4B682C642B45593E',
-        'Mac-90BE64C3CB5A9AEB',
-        'Mac-66F35F19FE2A0D05',
-        'Mac-189A3D4F975D5FFC',
-        'Mac-B4831CEBD52A0C4C',
-        'Mac-FA842E06C61E91C5',
-        'Mac-FC02E91DDD3FA6A4',
-        'Mac-06F11FD93F0323C5',
-        'Mac-9AE82516C7C6B903',
-        'Mac-27ADBB7B4CEE8E61',
-        'Mac-6F01561E16C75D06',
-        'Mac-F60DEB81FF30ACF6',
-        'Mac-81E3E92DD6088272',
-        'Mac-7DF21CB3ED6977E5',
-        'Mac-937CB26E2E02BB01',
-        'Mac-3CBD00234E554E41',
-        'Mac-F221BEC8',
-        'Mac-9F18E312C5C2BF0B',
-        'Mac-65CE76090165799A',
-        'Mac-CF21D135A7D34AA6',
-        'Mac-F65AE981FFA204ED',
-        'Mac-112B0A653D3AAB9C',
-        'Mac-DB15BD556843C820',
-        'Mac-937A206F2EE63C01',
-        'Mac-77F17D7DA9285301',
-        'Mac-C3EC7CD22292981F',
-        'Mac-BE088AF8C5EB4FA2',
-        'Mac-551B86E5744E2388',
-        'Mac-A5C67F76ED83108C',
-        'Mac-031AEE4D24BFF0B1',
-        'Mac-EE2EBD4B90B839A8',
-        'Mac-42FD25EABCABB274',
-        'Mac-F305150B0C7DEEEF',
-        'Mac-2BD1B31983FE1663',
-        'Mac-66E35819EE2D0D05',
-        'Mac-A369DDC4E67F1C45',
-        'Mac-E43C1C25D4880AD6',
-        ]
+    platform_support_values = rules.load('10.14').board_ids
     board_id = get_board_id()
     if board_id in platform_support_values:
         logger("Board ID",
@@ -298,19 +152,26 @@ def is_supported_board_id():
 
 
 def append_conditional_items(dictionary):
-    current_conditional_items_path = conditional_items_path()
-    if os.path.exists(current_conditional_items_path):
-        existing_dict = plistlib.readPlist(current_conditional_items_path)
-        output_dict = dict(existing_dict.items() + dictionary.items())
-    else:
-        output_dict = dictionary
-    plistlib.writePlist(output_dict, current_conditional_items_path)
-    pass
+    store = ConditionalItemsStore(conditional_items_path())
+    store.update(dictionary)
+    store.commit()
 
 
-def main(argv=None):
+def check_compatibility():
+    """
+    Runs the checks and returns a tuple of the exit code and a dictionary
+    of conditional items
+    """
     mojave_supported_dict = {}
 
+    # Gather the facts concurrently. If a probe does not finish in time the
+    # release is reported as not supported.
+    timed_out = facts.prefetch()
+    if timed_out:
+        for name in timed_out:
+            logger("Probe", "%s timed out" % name, "Failed")
+        return 1, {'mojave_supported': False}
+
     # Run the checks
     model_passed = is_supported_model()
     board_id_passed = is_supported_board_id()
@@ -326,10 +187,25 @@ def main(argv=None):
         mojave_supported = 1
         mojave_supported_dict = {'mojave_supported': False}
 
+    return mojave_supported, mojave_supported_dict
+
+
+def main(argv=None):
+    result = cache.get_verdict('10.14')
+    if result is None:
+        result = check_compatibility()
+        cache.set_verdict('10.14', result)
+    else:
+        logger("Cache", "Result of an earlier run", "OK")
+    mojave_supported, mojave_supported_dict = result
+
     # Update "ConditionalItems.plist" if munki is installed
-    if munki_installed() and update_munki_conditional_items:
+    if update_munki_conditional_items and munki_installed():
         append_conditional_items(mojave_supported_dict)
 
+    if verbose:
+        output.summary(mojave_supported, mojave_supported_dict)
+
     # Exit codes:
     # 0 = Mojave is supported
     # 1 = Mojave is not supported
@@ -14,6 +14,9 @@
 # - At least 2GB of memory
 # - System version earlier than 10.8 but at least 10.6.6
 #
+# The supported board-ids and unsupported models are kept in
+# macadmin/compatibility_rules.plist
+#
 # Exit codes:
 # 0 = Mountain Lion is supported
 # 1 = Mountain Lion is not supported
@@ -30,13 +33,15 @@
 # ================================================================================
 
 import sys
-import subprocess
 import os
-import re
-import plistlib
-import platform
-from distutils.version import StrictVersion
-from Foundation import CFPreferencesCopyAppValue
+
+from macadmin import cache
+from macadmin import facts
+from macadmin import output
+from macadmin import preferences
+from macadmin import receipts
+from macadmin import rules
+from macadmin.conditional_items import ConditionalItemsStore
 
 # ================================================================================
 # Start configuration
@@ -52,7 +57,9 @@ updateMunkiConditionalItems = False
 
 
 def logger(message, status, info):
-    if verbose:
+    if verbose and output.ndjson:
+        output.check(message, status, info)
+    elif verbose:
         print "%10s: %-40s [%s]" % (message, status, info)
     pass
 
@@ -62,7 +69,7 @@ def conditionalItemsPath():
     # Read the location of the ManagedInstallDir from ManagedInstall.plist
     BUNDLE_ID = 'ManagedInstalls'
     pref_name = 'ManagedInstallDir'
-    managedinstalldir = CFPreferencesCopyAppValue(pref_name, BUNDLE_ID)
+    managedinstalldir = preferences.copy_app_value(pref_name, BUNDLE_ID)
     # Make sure we're outputting our information to "ConditionalItems.plist"
     if managedinstalldir:
         return os.path.join(managedinstalldir, 'ConditionalItems.plist')
@@ -72,25 +79,15 @@ def conditionalItemsPath():
 
 
 def munkiInstalled():
-    pkgutilProcess = [ "pkgutil", "--pkg-info", "com.googlecode.munki.core" ]
-    p = subprocess.Popen(pkgutilProcess, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output = p.communicate()[0]
-    if p.returncode == 0:
-        return True
-    else:
-        return False
+    return receipts.munki_installed()
 
 
 def isSystemVersionSupported():
-    systemVersionPlist = plistlib.readPlist("/System/Library/CoreServices/SystemVersion.plist")
+    systemVersionPlist = facts.system_version()
     productName = systemVersionPlist['ProductName']
     productVersion = systemVersionPlist['ProductVersion']
-    if StrictVersion(productVersion) > StrictVersion('10.8'):
-        logger("System",
-                "%s %s" % (productName, productVersion),
-                "Failed")
-        return False
-    elif StrictVersion(productVersion) >= StrictVersion('10.6.6'):
+    releaseRules = rules.load('10.8')
+    if productVersion in releaseRules.system_versions:
         logger("System",
                 "%s %s" % (productName, productVersion),
                 "OK")
@@ -103,27 +100,11 @@ def isSystemVersionSupported():
 
 
 def getBoardID():
-    ioregProcess = [ "/usr/sbin/ioreg",
-                     "-p", "IODeviceTree",
-                     "-r",
-                     "-n", "/",
-                     "-d", "1" ]
-    p1 = subprocess.Popen(ioregProcess, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    p2 = subprocess.Popen(["/usr/bin/grep", "board-id"], stdin=p1.stdout, stdout=subprocess.PIPE)
-    (results, err) = p2.communicate()
-    boardID = re.sub(r"^\s*\"board-id\" = <\"(.*)\">$", r"\1", results)
-    boardID = boardID.strip()
-    if boardID.startswith('Mac'):
-        return boardID
-    else:
-        return None
+    return facts.board_id()
 
 
 def is64BitCapable():
-    sysctlProcess = [ "sysctl", "-n", "hw.cpu64bit_capable" ]
-    p = subprocess.Popen(sysctlProcess, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    if bool(results):
+    if facts.cpu64bit_capable():
         logger("CPU",
                 "64 bit capable",
                 "OK")
@@ -136,11 +117,8 @@ def is64BitCapable():
 
 
 def hasRequiredAmountOfRAM():
-    minimumRam = int(2048 * 1024 * 1024)
-    sysctlProcess = [ "sysctl", "-n", "hw.memsize" ]
-    p = subprocess.Popen(sysctlProcess, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    actualRAM = int(results)
+    minimumRam = rules.load('10.8').minimum_memory
+    actualRAM = facts.memsize()
     actualRAMGigabytes = actualRAM / 1024 / 1024 / 1024
     if actualRAM >= minimumRam:
         logger("Memory",
@@ -149,83 +127,24 @@ def hasRequiredAmountOfRAM():
         return True
     else:
         logger("Memory",
-                "%i GB installed, 2 GB required" % (actualRAMGigabytes),
+                "%i GB installed, %i GB required" % (actualRAMGigabytes, minimumRam / 1024 / 1024 / 1024),
                 "Failed")
         return False
 
 
 def isVirtualMachine():
-    sysctlProcess = [ "sysctl", "-n", "machdep.cpu.features" ]
-    p = subprocess.Popen(sysctlProcess, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    for aFeature in results.split():
-        if aFeature == "VMM":
-            logger("Board ID",
-                    "Virtual machine",
-                    "OK")
-            return True
+    if facts.is_virtual_machine():
+        logger("Board ID",
+                "Virtual machine",
+                "OK")
+        return True
     return False
 
 
 def isSupportedBoardID():
     if isVirtualMachine():
         return True
-    platformSupportValues = [
-        "Mac-F42D88C8",
-        "Mac-F2218EA9",
-        "Mac-F42D86A9",
-        "Mac-F22C8AC8",
-        "Mac-942B59F58194171B",
-        "Mac-F226BEC8",
-        "Mac-F2268DC8",
-        "Mac-2E6FAB96566FE58C",
-        "Mac-7BA5B2794B2CDB12",
-        "Mac-4B7AC7E43945597E",
-        "Mac-F22C89C8",
-        "Mac-942459F5819B171B",
-        "Mac-F42388C8",
-        "Mac-F223BEC8",
-        "Mac-F4238CC8",
-        "Mac-F222BEC8",
-        "Mac-F227BEC8",
-        "Mac-F2208EC8",
-        "Mac-66F35F19FE2A0D05",
-        "Mac-F4238BC8",
-        "Mac-F221BEC8",
-        "Mac-C08A6BB70A942AC2",
-        "Mac-8ED6AF5B48C039E1",
-        "Mac-F2238AC8",
-        "Mac-F22586C8",
-        "Mac-6F01561E16C75D06",
-        "Mac-F2268EC8",
-        "Mac-F22589C8",
-        "Mac-F22587A1",
-        "Mac-F22788AA",
-        "Mac-F42C86C8",
-        "Mac-942C5DF58193131B",
-        "Mac-F2238BAE",
-        "Mac-F22C86C8",
-        "Mac-F2268CC8",
-        "Mac-F2218FC8",
-        "Mac-742912EFDBEE19B3",
-        "Mac-F42D89C8",
-        "Mac-F22587C8",
-        "Mac-F42D89A9",
-        "Mac-F2268AC8",
-        "Mac-F42C89C8",
-        "Mac-942452F5819B1C1B",
-        "Mac-F2218FA9",
-        "Mac-F221DCC8",
-        "Mac-94245B3640C91C81",
-        "Mac-F42D86C8",
-        "Mac-4BC72D62AD45599E",
-        "Mac-F2268DAE",
-        "Mac-F42C88C8",
-        "Mac-94245A3940C91C80",
-        "Mac-F42386C8",
-        "Mac-C3EC7CD22292981F",
-        "Mac-942B5BF58194151B",
-        "Mac-F2218EC8" ]
+    platformSupportValues = rules.load('10.8').board_ids
     boardID = getBoardID()
     if boardID in platformSupportValues:
         logger("Board ID",
@@ -240,18 +159,25 @@ def isSupportedBoardID():
 
 
 def appendConditionalItems(aDict):
-    conditionalitemspath = conditionalItemsPath()
-    if os.path.exists(conditionalItemsPath()):
-        existing_dict = plistlib.readPlist(conditionalitemspath)
-        output_dict = dict(existing_dict.items() + aDict.items())
-    else:
-        output_dict = aDict
-    plistlib.writePlist(output_dict, conditionalitemspath)
-    pass
-
-def main(argv=None):
+    store = ConditionalItemsStore(conditionalItemsPath())
+    store.update(aDict)
+    store.commit()
+
+def check_compatibility():
+    """
+    Runs the checks and returns a tuple of the exit code and a dictionary
+    of conditional items
+    """
     mountainlion_supported_dict = {}
 
+    # Gather the facts concurrently. If a probe does not finish in time the
+    # release is reported as not supported.
+    timed_out = facts.prefetch()
+    if timed_out:
+        for name in timed_out:
+            logger("Probe", "%s timed out" % name, "Failed")
+        return 1, {'mountainlion_supported': False}
+
     # Run the checks
     boardIDPassed = isSupportedBoardID()
     memoryPassed = hasRequiredAmountOfRAM()
@@ -265,10 +191,25 @@ def main(argv=None):
         mountainLionSupported = 1
         mountainlion_supported_dict = { 'mountainlion_supported': False }
 
+    return mountainLionSupported, mountainlion_supported_dict
+
+
+def main(argv=None):
+    result = cache.get_verdict('10.8')
+    if result is None:
+        result = check_compatibility()
+        cache.set_verdict('10.8', result)
+    else:
+        logger("Cache", "Result of an earlier run", "OK")
+    mountainLionSupported, mountainlion_supported_dict = result
+
     # Update "ConditionalItems.plist" if munki is installed
-    if ( munkiInstalled() and updateMunkiConditionalItems ):
+    if ( updateMunkiConditionalItems and munkiInstalled() ):
         appendConditionalItems(mountainlion_supported_dict)
 
+    if verbose:
+        output.summary(mountainLionSupported, mountainlion_supported_dict)
+
     # Exit codes:
     # 0 = Mountain Lion is supported
     # 1 = Mountain Lion is not supported
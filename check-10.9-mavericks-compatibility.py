@@ -15,6 +15,9 @@
 # - Current system version is less than 10.9
 # - Current system version is at least 10.6.6 or newer
 #
+# The supported board-ids and unsupported models are kept in
+# macadmin/compatibility_rules.plist
+#
 # Exit codes:
 # 0 = Mavericks is supported
 # 1 = Mavericks is not supported
@@ -35,12 +38,17 @@
 # ================================================================================
 
 import sys
-import subprocess
 import os
-import re
-import plistlib
-from distutils.version import StrictVersion
-from Foundation import CFPreferencesCopyAppValue
+
+from macadmin import cache
+from macadmin import facts
+from macadmin import ioreg
+from macadmin import metrics
+from macadmin import output
+from macadmin import preferences
+from macadmin import receipts
+from macadmin import rules
+from macadmin.conditional_items import ConditionalItemsStore
 
 # ================================================================================
 # Start configuration
@@ -56,7 +64,9 @@ update_munki_conditional_items = False
 
 
 def logger(message, status, info):
-    if verbose:
+    if verbose and output.ndjson:
+        output.check(message, status, info)
+    elif verbose:
         print "%14s: %-40s [%s]" % (message, status, info)
     pass
 
@@ -66,7 +76,7 @@ def conditional_items_path():
     # Read the location of the ManagedInstallDir from ManagedInstall.plist
     bundle_id = 'ManagedInstalls'
     pref_name = 'ManagedInstallDir'
-    managed_installs_dir = CFPreferencesCopyAppValue(pref_name, bundle_id)
+    managed_installs_dir = preferences.copy_app_value(pref_name, bundle_id)
     # Make sure we're outputting our information to "ConditionalItems.plist"
     if managed_installs_dir:
         return os.path.join(managed_installs_dir, 'ConditionalItems.plist')
@@ -76,25 +86,15 @@ def conditional_items_path():
 
 
 def munki_installed():
-    cmd = ["pkgutil", "--pkg-info", "com.googlecode.munki.core"]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output = p.communicate()[0]
-    if p.returncode == 0:
-        return True
-    else:
-        return False
+    return receipts.munki_installed()
 
 
 def is_system_version_supported():
-    system_version_plist = plistlib.readPlist("/System/Library/CoreServices/SystemVersion.plist")
+    system_version_plist = facts.system_version()
     product_name = system_version_plist['ProductName']
     product_version = system_version_plist['ProductVersion']
-    if StrictVersion(product_version) >= StrictVersion('10.9'):
-        logger("System",
-               "%s %s" % (product_name, product_version),
-               "Failed")
-        return False
-    elif StrictVersion(product_version) >= StrictVersion('10.6.6'):
+    release_rules = rules.load('10.9')
+    if product_version in release_rules.system_versions:
         logger("System",
                "%s %s" % (product_name, product_version),
                "OK")
@@ -107,27 +107,11 @@ def is_system_version_supported():
 
 
 def get_board_id():
-    cmd = ["/usr/sbin/ioreg",
-           "-p", "IODeviceTree",
-           "-r",
-           "-n", "/",
-           "-d", "1"]
-    p1 = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    p2 = subprocess.Popen(["/usr/bin/grep", "board-id"], stdin=p1.stdout, stdout=subprocess.PIPE)
-    (results, err) = p2.communicate()
-    board_id = re.sub(r"^\s*\"board-id\" = <\"(.*)\">$", r"\1", results)
-    board_id = board_id.strip()
-    if board_id.startswith('Mac'):
-        return board_id
-    else:
-        return None
+    return facts.board_id()
 
 
 def is_64bit_capable():
-    cmd = ["/usr/sbin/sysctl", "-n", "hw.cpu64bit_capable"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    if bool(results):
+    if facts.cpu64bit_capable():
         logger("CPU",
                "64 bit capable",
                "OK")
@@ -140,11 +124,8 @@ def is_64bit_capable():
 
 
 def has_required_amount_of_memory():
-    minimum_memory = int(2048 * 1024 * 1024)
-    cmd = ["/usr/sbin/sysctl", "-n", "hw.memsize"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    actual_memory = int(results)
+    minimum_memory = rules.load('10.9').minimum_memory
+    actual_memory = facts.memsize()
     actual_memory_gigabytes = actual_memory / 1024 / 1024 / 1024
     if actual_memory >= minimum_memory:
         logger("Memory",
@@ -153,95 +134,25 @@ def has_required_amount_of_memory():
         return True
     else:
         logger("Memory",
-               "%i GB installed, 2 GB required" % actual_memory_gigabytes,
+               "%i GB installed, %i GB required" % (actual_memory_gigabytes,
+                                                    minimum_memory / 1024 / 1024 / 1024),
                "Failed")
         return False
 
 
 def is_virtual_machine():
-    cmd = ["/usr/sbin/sysctl", "-n", "machdep.cpu.features"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    for feature in results.split():
-        if feature == "VMM":
-            logger("Board ID",
-                   "Virtual machine",
-                   "OK")
-            return True
+    if facts.is_virtual_machine():
+        logger("Board ID",
+               "Virtual machine",
+               "OK")
+        return True
     return False
 
 
 def is_supported_board_id():
     if is_virtual_machine():
         return True
-    platform_support_values = [
-        "Mac-00BE6ED71E35EB86",
-        "Mac-031AEE4D24BFF0B1",
-        "Mac-031B6874CF7F642A",
-        "Mac-27ADBB7B4CEE8E61",
-        "Mac-2E6FAB96566FE58C",
-        "Mac-35C1E88140C3E6CF",
-        "Mac-4B7AC7E43945597E",
-        "Mac-4BC72D62AD45599E",
-        "Mac-50619A408DB004DA",
-        "Mac-66F35F19FE2A0D05",
-        "Mac-6F01561E16C75D06",
-        "Mac-742912EFDBEE19B3",
-        "Mac-77EB7D7DAF985301",
-        "Mac-7BA5B2794B2CDB12",
-        "Mac-7DF21CB3ED6977E5",
-        "Mac-7DF2A3B5E5D671ED",
-        "Mac-8ED6AF5B48C039E1",
-        "Mac-942452F5819B1C1B",
-        "Mac-942459F5819B171B",
-        "Mac-94245A3940C91C80",
-        "Mac-94245B3640C91C81",
-        "Mac-942B59F58194171B",
-        "Mac-942B5BF58194151B",
-        "Mac-942C5DF58193131B",
-        "Mac-AFD8A9D944EA4843",
-        "Mac-C08A6BB70A942AC2",
-        "Mac-C3EC7CD22292981F",
-        "Mac-F2208EC8",
-        "Mac-F2218EA9",
-        "Mac-F2218EC8"
-        "Mac-F2218FA9",
-        "Mac-F2218FC8",
-        "Mac-F221BEC8",
-        "Mac-F221DCC8",
-        "Mac-F222BEC8",
-        "Mac-F2238AC8",
-        "Mac-F2238BAE",
-        "Mac-F223BEC8",
-        "Mac-F22586C8",
-        "Mac-F22587A1",
-        "Mac-F22587C8",
-        "Mac-F22589C8",
-        "Mac-F2268AC8",
-        "Mac-F2268CC8",
-        "Mac-F2268DAE",
-        "Mac-F2268DC8",
-        "Mac-F2268EC8",
-        "Mac-F226BEC8",
-        "Mac-F22788AA",
-        "Mac-F227BEC8",
-        "Mac-F22C86C8",
-        "Mac-F22C89C8",
-        "Mac-F22C8AC8",
-        "Mac-F42386C8",
-        "Mac-F42388C8",
-        "Mac-F4238BC8",
-        "Mac-F4238CC8",
-        "Mac-F42C86C8",
-        "Mac-F42C88C8",
-        "Mac-F42C89C8",
-        "Mac-F42D86A9",
-        "Mac-F42D86C8",
-        "Mac-F42D88C8",
-        "Mac-F42D89A9",
-        "Mac-F42D89C8",
-        "Mac-F65AE981FFA204ED",
-        "Mac-FC02E91DDD3FA6A4"]
+    platform_support_values = rules.load('10.9').board_ids
     board_id = get_board_id()
     if board_id in platform_support_values:
         logger("Board ID",
@@ -256,41 +167,29 @@ def is_supported_board_id():
 
 
 def append_conditional_items(dictionary):
-    current_conditional_items_path = conditional_items_path()
-    if os.path.exists(current_conditional_items_path):
-        existing_dict = plistlib.readPlist(current_conditional_items_path)
-        output_dict = dict(existing_dict.items() + dictionary.items())
-    else:
-        output_dict = dictionary
-    plistlib.writePlist(output_dict, current_conditional_items_path)
-    pass
+    store = ConditionalItemsStore(conditional_items_path())
+    store.update(dictionary)
+    store.commit()
 
 
+@metrics.timed('firmware')
 def check_firmware_version():
-    """docstring for check_firmware_version"""
+    """Returns the model and firmware revision of the internal SSD"""
     cmd = ["/usr/sbin/ioreg", "-p", "IOService",
            "-n", "AppleAHCIDiskDriver",
            "-r",
            "-l",
            "-d", "1",
            "-w", "0"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    disk_dict = {}
-    for line in results.splitlines():
-        m = re.match(r"^\s*\"(?P<key>.*)\" = \"(?P<value>.*)\"$", line)
-        if m:
-            disk_dict[m.group('key')] = m.group('value').strip()
-    model = disk_dict.get('Model', '')
-    revision = disk_dict.get('Revision', '')
+    # ioreg is stopped as soon as both properties have been read
+    disk_dict = ioreg.stream_properties(cmd, ['Model', 'Revision'])
+    model = disk_dict.get('Model', '').strip()
+    revision = disk_dict.get('Revision', '').strip()
     return model, revision
 
 
 def hardware_model():
-    cmd = ["/usr/sbin/sysctl", "-n", "hw.model"]
-    p = subprocess.Popen(cmd, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    return results.strip()
+    return facts.model()
 
 
 def is_firmware_compatible():
@@ -322,10 +221,22 @@ def is_firmware_compatible():
         return True
 
 
-def main(argv=None):
+def check_compatibility():
+    """
+    Runs the checks and returns a tuple of the exit code and a dictionary
+    of conditional items
+    """
     mavericks_supported_dict = {}
     mavericks_needs_fw_update_dict = {}
 
+    # Gather the facts concurrently. If a probe does not finish in time the
+    # release is reported as not supported.
+    timed_out = facts.prefetch()
+    if timed_out:
+        for name in timed_out:
+            logger("Probe", "%s timed out" % name, "Failed")
+        return 1, {'mavericks_supported': False, 'mavericks_needs_fw_update': False}
+
     # Run the checks
     board_id_passed = is_supported_board_id()
     firmware_passed = is_firmware_compatible()
@@ -349,15 +260,30 @@ def main(argv=None):
         mavericks_supported_dict = {'mavericks_supported': False}
         mavericks_needs_fw_update_dict = {'mavericks_needs_fw_update': False}
 
+    mavericks_dict = dict(mavericks_supported_dict.items() + mavericks_needs_fw_update_dict.items())
+    return mavericks_supported and mavericks_needs_fw_update, mavericks_dict
+
+
+def main(argv=None):
+    result = cache.get_verdict('10.9')
+    if result is None:
+        result = check_compatibility()
+        cache.set_verdict('10.9', result)
+    else:
+        logger("Cache", "Result of an earlier run", "OK")
+    mavericks_supported, mavericks_dict = result
+
     # Update "ConditionalItems.plist" if munki is installed
-    if munki_installed() and update_munki_conditional_items:
-        append_conditional_items(mavericks_supported_dict)
-        append_conditional_items(mavericks_needs_fw_update_dict)
+    if update_munki_conditional_items and munki_installed():
+        append_conditional_items(mavericks_dict)
+
+    if verbose:
+        output.summary(mavericks_supported, mavericks_dict)
 
     # Exit codes:
     # 0 = Mavericks is supported
     # 1 = Mavericks is not supported
-    return mavericks_supported and mavericks_needs_fw_update
+    return mavericks_supported
 
 
 if __name__ == '__main__':
@@ -7,6 +7,14 @@
 # This script checks if the current system is running virtualized. This is done
 # by checking if machdep.cpu.features from sysctl contains VMM. OS X Mountain
 # Lion installer performs this same check when determining if it can be installed.
+# Apple silicon has no machdep.cpu.features, so kern.hv_vmm_present and the
+# model and board-id signatures of the hypervisor vendors are checked too.
+#
+# The hypervisor vendor (vmware, parallels, virtualbox, apple_virtualization,
+# qemu, unknown or none on a physical machine) is identified from these
+# signals by macadmin/virtualization.py, kept for the boot session and written
+# as the "virtual_machine_vendor" custom conditional. The machine is virtual
+# when the vendor is not none, so the two conditionals always agree.
 #
 # Hannes Juutilainen <hjuutilainen@mac.com>
 # https://github.com/hjuutilainen/adminscripts
@@ -20,16 +28,19 @@
 
 import sys
 import os
-import subprocess
-import plistlib
-from Foundation import CFPreferencesCopyAppValue
+
+from macadmin import output
+from macadmin import preferences
+from macadmin import receipts
+from macadmin.conditional_items import ConditionalItemsStore
 
 # ================================================================================
 # Start configuration
 # ================================================================================
 # Set this to False if you don't want any output, just the exit codes
 verbose = True
-# Set this to True if you want to add "virtual_machine" custom conditional to
+# Set this to True if you want to add "virtual_machine" and
+# "virtual_machine_vendor" custom conditionals to
 # /Library/Managed Installs/ConditionalItems.plist
 update_munki_conditional_items = True
 # ================================================================================
@@ -37,7 +48,9 @@ update_munki_conditional_items = True
 # ================================================================================
 
 def logger(message, status, info):
-    if verbose:
+    if verbose and output.ndjson:
+        output.check(message, status, info)
+    elif verbose:
         print "%10s: %-40s [%s]" % (message, status, info)
     pass
 
@@ -47,7 +60,7 @@ def conditional_items_path():
     # Read the location of the ManagedInstallDir from ManagedInstall.plist
     BUNDLE_ID = 'ManagedInstalls'
     pref_name = 'ManagedInstallDir'
-    managed_installs_dir = CFPreferencesCopyAppValue(pref_name, BUNDLE_ID)
+    managed_installs_dir = preferences.copy_app_value(pref_name, BUNDLE_ID)
     # Make sure we're outputting our information to "ConditionalItems.plist"
     if managed_installs_dir:
         return os.path.join(managed_installs_dir, 'ConditionalItems.plist')
@@ -57,52 +70,63 @@ def conditional_items_path():
 
 
 def munki_installed():
-    pkgutil_process = ["pkgutil", "--pkg-info", "com.googlecode.munki.core"]
-    p = subprocess.Popen(pkgutil_process, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output = p.communicate()[0]
-    if p.returncode == 0:
-        return True
-    else:
-        return False
+    return receipts.munki_installed()
 
 
 def is_virtual_machine():
-    sysctl_process = ["sysctl", "-n", "machdep.cpu.features"]
-    p = subprocess.Popen(sysctl_process, bufsize=1, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    for feature in results.split():
-        if feature == "VMM":
-            return True
-    return False
+    # The signals are read through the shared facts, so they are probed once
+    # when this check runs with the others in munki-conditions.py.
+    # The facts are imported here to keep the start of a standalone run short.
+    from macadmin import facts
+    return facts.is_virtual_machine()
+
+
+def virtual_machine_vendor():
+    from macadmin import facts
+    return facts.virtual_machine_vendor()
 
 
 def append_conditional_items(conditionals_dict):
-    conditionals_path = conditional_items_path()
-    if os.path.exists(conditionals_path):
-        existing_dict = plistlib.readPlist(conditionals_path)
-        output_dict = dict(existing_dict.items() + conditionals_dict.items())
+    store = ConditionalItemsStore(conditional_items_path())
+    store.update(conditionals_dict)
+    store.commit()
+
+
+def check_virtual_machine():
+    """
+    Runs the check and returns a tuple of the exit code and a dictionary
+    of conditional items
+    """
+    vendor = virtual_machine_vendor()
+    if is_virtual_machine():
+        return 0, {'virtual_machine': True, 'virtual_machine_vendor': vendor}
     else:
-        output_dict = conditionals_dict
-    plistlib.writePlist(output_dict, conditionals_path)
-    pass
+        return 1, {'virtual_machine': False, 'virtual_machine_vendor': vendor}
 
 
 def main(argv=None):
-    new_conditional_items = {}
-
-    if is_virtual_machine():
-        print "This system is virtual"
-        machine_type = 0
-        new_conditional_items = {'virtual_machine': True}
+    machine_type, new_conditional_items = check_virtual_machine()
+
+    vendor = new_conditional_items['virtual_machine_vendor']
+    if machine_type == 0:
+        if output.ndjson:
+            logger("Machine", "Virtual", "OK")
+            logger("Vendor", vendor, "OK")
+        else:
+            print "This system is virtual (%s)" % vendor
     else:
-        print "This system is not virtual"
-        machine_type = 1
-        new_conditional_items = {'virtual_machine': False}
+        if output.ndjson:
+            logger("Machine", "Not virtual", "Failed")
+        else:
+            print "This system is not virtual"
 
     # Update "ConditionalItems.plist" if munki is installed
     if munki_installed() and update_munki_conditional_items:
         append_conditional_items(new_conditional_items)
 
+    if verbose:
+        output.summary(machine_type, new_conditional_items)
+
     # Exit codes:
     # 0 = This machine is virtual
     # 1 = This machine is not virtual
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# check-macos-compatibility.py
+#
+# This script checks if the current system is compatible with every macOS release
+# that has a check-10.*-compatibility.py script in this repo, from 10.8 Mountain
+# Lion to 10.15 Catalina. The release specific rules are loaded from those
+# scripts and the hardware is probed only once for all of them.
+#
+# Usage:
+#   check-macos-compatibility.py [version ...]
+#
+# Give one or more release versions (for example 10.14 10.15) to check only
+# those releases. By default all releases are checked.
+#
+# The system version check of every release rejects the releases up to the
+# running one, so no machine supports all of them. The exit code tells whether
+# there is a release this machine can be upgraded to, and the newest one is
+# printed at the end.
+#
+# Exit codes:
+# 0 = At least one of the checked releases is supported
+# 1 = None of the checked releases is supported
+#
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
+
+import sys
+import os
+
+from macadmin import checkers
+from macadmin import output
+from macadmin import preferences
+from macadmin import receipts
+from macadmin.conditional_items import ConditionalItemsStore
+
+
+# ================================================================================
+# Start configuration
+# ================================================================================
+
+# Set this to False if you don't want any output, just the exit codes
+verbose = True
+
+# Set this to True if you want to add the "<release>_supported" custom conditionals
+# (mountainlion_supported, mavericks_supported, ..., catalina_supported) to
+# /Library/Managed Installs/ConditionalItems.plist
+update_munki_conditional_items = False
+
+# ================================================================================
+# End configuration
+# ================================================================================
+
+
+def logger(message, status, info):
+    if verbose and output.ndjson:
+        output.check(message, status, info)
+    elif verbose:
+        print "%14s: %-40s [%s]" % (message, status, info)
+    pass
+
+
+def conditional_items_path():
+    # <https://github.com/munki/munki/wiki/Conditional-Items>
+    # Read the location of the ManagedInstallDir from ManagedInstall.plist
+    bundle_id = 'ManagedInstalls'
+    pref_name = 'ManagedInstallDir'
+    managed_installs_dir = preferences.copy_app_value(pref_name, bundle_id)
+
+    # Make sure we're outputting our information to "ConditionalItems.plist"
+    if managed_installs_dir:
+        return os.path.join(managed_installs_dir, 'ConditionalItems.plist')
+    else:
+        # Munki default
+        return "/Library/Managed Installs/ConditionalItems.plist"
+
+
+def munki_installed():
+    return receipts.munki_installed()
+
+
+def append_conditional_items(dictionary):
+    store = ConditionalItemsStore(conditional_items_path())
+    store.update(dictionary)
+    store.commit()
+
+
+def check_releases(versions):
+    """
+    Runs the checks of every release in versions and returns a tuple of the
+    newest supported release (None if no release is supported) and a
+    dictionary of conditional items for all of them
+    """
+    results = {}
+    conditional_items = {}
+    for version in versions:
+        # The per-check output of every release would repeat the same probes,
+        # print one line per release instead
+        supported, items = checkers.release_result(version)
+        results[version] = supported, items
+        conditional_items.update(items)
+        supported_key = "%s_supported" % checkers.release_for_version(version)[1]
+        if items.get(supported_key):
+            logger(version, supported_key, "OK")
+        else:
+            logger(version, supported_key, "Failed")
+    return checkers.newest_supported(results), conditional_items
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    versions = argv or [release[0] for release in checkers.RELEASES]
+    for version in versions:
+        if checkers.release_for_version(version) is None:
+            print >> sys.stderr, "Unknown release: %s" % version
+            return 1
+
+    newest_supported, conditional_items = check_releases(versions)
+    logger("Newest", newest_supported or "none", "OK" if newest_supported else "Failed")
+    exit_code = 0 if newest_supported else 1
+
+    # Update "ConditionalItems.plist" if munki is installed
+    if update_munki_conditional_items and munki_installed():
+        append_conditional_items(conditional_items)
+
+    if verbose:
+        output.summary(exit_code, conditional_items)
+
+    # Exit codes:
+    # 0 = At least one of the checked releases is supported
+    # 1 = None of the checked releases is supported
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
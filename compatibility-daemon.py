@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# compatibility-daemon.py
+#
+# This script keeps the results of every check-10.*-compatibility.py script in
+# memory and answers "is release X supported here?" over a local Unix domain
+# socket, so tools that ask often do not need to start a checker each time.
+# The hardware is probed once at start and again after a reboot or an OS
+# update. The protocol is described in macadmin/daemon.py.
+#
+# Usage:
+#   compatibility-daemon.py [--socket PATH]          Run the daemon
+#   compatibility-daemon.py --query 10.15            Ask a running daemon
+#
+# Run the daemon as root from a LaunchDaemon with KeepAlive set. Python tools
+# can use macadmin.daemon.Client, others can write "10.15\n" to the socket
+# and read one line of JSON back.
+#
+# Exit codes with --query:
+# 0 = The release is supported (with "all": at least one release is supported)
+# 1 = The release is not supported or the daemon could not be reached
+#
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
+
+import sys
+import json
+import socket
+import argparse
+
+from macadmin import daemon
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer macOS compatibility queries over a Unix socket")
+    parser.add_argument("--socket", default=daemon.SOCKET_PATH, help="Path of the Unix domain socket")
+    parser.add_argument("--query", metavar="RELEASE",
+                        help="Ask a running daemon about a release (or \"all\") and exit")
+    parser.add_argument("--refresh-interval", type=float, default=daemon.REFRESH_INTERVAL,
+                        help="Seconds between checks for a reboot or an OS update")
+    args = parser.parse_args(argv)
+
+    if args.query:
+        try:
+            answer = daemon.query(args.query, args.socket)
+        except (socket.error, KeyError) as e:
+            print >> sys.stderr, "Query failed: %s" % e
+            return 1
+        print json.dumps(answer, sort_keys=True)
+        return 0 if answer['supported'] else 1
+
+    service = daemon.CompatibilityService()
+    service.refresh()
+    server = daemon.CompatibilityServer(service, args.socket, args.refresh_interval)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# compile-compatibility-rules.py
+#
+# This script updates macadmin/compatibility_rules.plist from the Distribution
+# file of an OSInstall.mpkg installer package. The supported board-ids and the
+# unsupported models are read from the boardIds and nonSupportedModels arrays
+# of the installCheckScript, and the compiled rules used by the
+# check-10.*-compatibility.py scripts are rebuilt.
+#
+# Expand the installer package first:
+#   pkgutil --expand /Volumes/InstallESD/Packages/OSInstall.mpkg /tmp/OSInstall
+#
+# Usage:
+#   compile-compatibility-rules.py --release 10.15 /tmp/OSInstall
+#   compile-compatibility-rules.py --release 10.16 --system-versions "10.10 <= OS < 10.16" /tmp/OSInstall/Distribution
+#   compile-compatibility-rules.py --release 10.15 --dry-run /tmp/OSInstall
+#
+# Installers that have already been compiled are recognized by the hash of the
+# Distribution file and are not parsed again.
+#
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
+
+import sys
+import argparse
+
+from macadmin import distribution
+from macadmin import rules
+from macadmin.intervals import parse_version_range
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile compatibility rules from an OSInstall.mpkg Distribution file")
+    parser.add_argument("distribution", help="Distribution file or expanded OSInstall.mpkg directory")
+    parser.add_argument("--release", required=True, help="Release version, for example 10.15")
+    parser.add_argument("--system-versions",
+                        help="Supported system versions of a new release, for example \"10.9 <= OS < 10.15\"")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="Print what was found without updating the rules")
+    args = parser.parse_args(argv)
+
+    if args.system_versions is not None:
+        try:
+            parse_version_range(args.system_versions)
+        except ValueError as e:
+            parser.error(str(e))
+
+    found = distribution.read_distribution(args.distribution)
+    if not found:
+        print >> sys.stderr, "No boardIds or nonSupportedModels found in %s" % args.distribution
+        return 1
+    print "%s: %d board-ids, %d unsupported model rules" % (
+        args.release, len(found.get('BoardIDs', [])), len(found.get('NonSupportedModels', [])))
+    for model_rule in found.get('NonSupportedModels', []):
+        print "    %s" % model_rule
+
+    if args.dry_run:
+        return 0
+
+    source = rules.read_source()
+    try:
+        changed = distribution.update_release(source, args.release, found, args.system_versions)
+    except ValueError as e:
+        print >> sys.stderr, "%s, give them with --system-versions" % e
+        return 1
+    if changed:
+        rules.write_source(source)
+        rules.compile_rules()
+        print "Updated %s, RulesVersion is now %d" % (rules.RULES_SOURCE, source['RulesVersion'])
+    else:
+        print "The rules of %s are up to date" % args.release
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# fleet-compatibility-report.py
+#
+# This script evaluates a hardware inventory against the same rules as the
+# check-10.*-compatibility.py scripts, without running anything on the hosts.
+# The inventory is a CSV file, a JSON lines file (.jsonl or .ndjson) or a JSON
+# array of records (.json) with the columns described in macadmin/fleet.py
+# (board_id, model, product_version, memsize, cpu64bit_capable, cpu_features).
+# The output has one row per host and one "<release>_supported" column per
+# release.
+#
+# Inventories that do not fit in memory can be processed with --stream. The
+# records are then read and evaluated in batches on --workers processes and
+# the results are written as they are ready, in the input order.
+#
+# Usage:
+#   fleet-compatibility-report.py inventory.csv
+#   fleet-compatibility-report.py inventory.jsonl -o matrix.jsonl --format jsonl
+#   fleet-compatibility-report.py inventory.csv --release 10.14 --release 10.15
+#   fleet-compatibility-report.py archive.jsonl --stream --workers 8 --format binary -o matrix.bin
+#
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
+
+import sys
+import argparse
+
+from macadmin import fleet
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate macOS compatibility for an inventory")
+    parser.add_argument("inventory", help="CSV, JSON or JSON lines inventory file")
+    parser.add_argument("-o", "--output", help="Output file, defaults to standard output")
+    parser.add_argument("--format", choices=fleet.OUTPUT_FORMATS, default="csv",
+                        help="Output format, defaults to csv")
+    parser.add_argument("--id-column", default=fleet.DEFAULT_ID_COLUMN,
+                        help="Inventory column that identifies a host")
+    parser.add_argument("--release", action="append", dest="releases",
+                        help="Release version to evaluate, can be given multiple times")
+    parser.add_argument("--stream", action="store_true",
+                        help="Evaluate the inventory in batches without loading it into memory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes with --stream")
+    parser.add_argument("--batch-size", type=int, default=fleet.DEFAULT_BATCH_SIZE,
+                        help="Records per batch with --stream")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        output = open(args.output, 'wb')
+    else:
+        output = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    try:
+        if args.stream:
+            fleet.write_stream(fleet.read_records(args.inventory), output,
+                               versions=args.releases,
+                               output_format=args.format,
+                               workers=args.workers,
+                               batch_size=args.batch_size,
+                               id_column=args.id_column)
+        else:
+            inventory = fleet.read_inventory(args.inventory, args.id_column)
+            results = fleet.evaluate(inventory, args.releases)
+            fleet.write_matrix(inventory, results, output, args.format)
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
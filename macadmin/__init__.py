@@ -0,0 +1,13 @@
+# encoding: utf-8
+
+# ================================================================================
+# macadmin
+#
+# Shared helpers for the admin scripts in this repo. The scripts import this
+# package from the directory they are run from, so keep it next to them when
+# deploying (for example to /usr/local/munki/conditions).
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
@@ -0,0 +1,171 @@
+# encoding: utf-8
+"""
+Persistent cache of probed facts and per-release verdicts.
+
+The hardware facts do not change while the machine is running, so they are
+written to a small JSON file the first time they are probed and read back by
+every later run. The cache is keyed on the boot session (kern.boottime) and
+the modification time of SystemVersion.plist, which makes it invalid after a
+reboot or an OS update. Verdicts are also keyed on the rules_version of the
+release rules that produced them.
+
+Only root writes the cache, and a cache file is trusted only if it is owned
+by root and not writable by group or others.
+"""
+
+import atexit
+import os
+import stat
+
+from macadmin import sysctl
+
+CACHE_DIR = "/Library/Caches/com.github.hjuutilainen.adminscripts"
+CACHE_PATH = os.path.join(CACHE_DIR, "compatibility.json")
+
+# Set this to False to always probe
+enabled = True
+
+_state = None
+_dirty = False
+_save_registered = False
+
+
+def cache_key():
+    """
+    Returns the key of the current boot session and OS install, or None if
+    it can not be determined
+    """
+    from macadmin import facts
+    boottime = sysctl.boottime()
+    if boottime is None:
+        return None
+    try:
+        mtime = os.stat(facts.SYSTEM_VERSION_PLIST).st_mtime
+    except OSError:
+        return None
+    return [boottime[0], boottime[1], mtime]
+
+
+def trusted(path):
+    """
+    Returns True if the file at path is owned by root and not writable by
+    group or others
+    """
+    try:
+        info = os.stat(path)
+    except OSError:
+        return False
+    return info.st_uid == 0 and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _read(path, key):
+    import json
+    if not trusted(path):
+        return None
+    try:
+        with open(path) as f:
+            contents = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(contents, dict) or contents.get('key') != key:
+        return None
+    return contents
+
+
+def _write(contents, path):
+    import json
+    import tempfile
+    # Write to a temporary file first so that readers never see a partial file
+    directory = os.path.dirname(path)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o755)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.compatibility-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(contents, f, sort_keys=True)
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def load():
+    """Returns the cache contents, reading the cache file on first use"""
+    global _state
+    if _state is None:
+        key = cache_key() if enabled else None
+        contents = None
+        if key is not None:
+            contents = _read(CACHE_PATH, key)
+        if contents is None:
+            contents = {'key': key, 'facts': {}, 'verdicts': {}}
+        _state = contents
+    return _state
+
+
+def _changed():
+    global _dirty, _save_registered
+    _dirty = True
+    if not _save_registered:
+        atexit.register(save)
+        _save_registered = True
+
+
+def get_fact(name, default=None):
+    """Returns a cached fact or default if it is not cached"""
+    return load()['facts'].get(name, default)
+
+
+def set_fact(name, value):
+    """Stores a fact in the cache"""
+    state = load()
+    if state['key'] is not None:
+        state['facts'][name] = value
+        _changed()
+
+
+def _rules_version(version):
+    from macadmin import rules
+    return rules.load(version).rules_version
+
+
+def get_verdict(version):
+    """
+    Returns the cached (exit code, conditional items) tuple of a release or
+    None if it is not cached or was produced by other rules
+    """
+    verdict = load()['verdicts'].get(version)
+    if verdict is None or verdict.get('rules_version') != _rules_version(version):
+        return None
+    return verdict['exit_code'], verdict['conditional_items']
+
+
+def set_verdict(version, result):
+    """
+    Stores the (exit code, conditional items) tuple of a release. Verdicts
+    that depend on a probe that timed out are not stored.
+    """
+    from macadmin import facts
+    state = load()
+    if state['key'] is not None and not facts.timed_out():
+        exit_code, conditional_items = result
+        state['verdicts'][version] = {'rules_version': _rules_version(version),
+                                      'exit_code': exit_code,
+                                      'conditional_items': conditional_items}
+        _changed()
+
+
+def save():
+    """Writes the cache if it has changed and we are running as root"""
+    global _dirty
+    if not _dirty or _state is None or os.geteuid() != 0:
+        return
+    _write(_state, CACHE_PATH)
+    _dirty = False
+
+
+def reset():
+    """Forgets the loaded cache without touching the cache file"""
+    global _state, _dirty
+    _state = None
+    _dirty = False
@@ -0,0 +1,252 @@
+# encoding: utf-8
+"""
+Precomputed index of the releases every board-id and model can run.
+
+The index keeps one bitmask per board-id and per model interval, where bit n
+is the nth release of checkers.RELEASES (oldest first). The mask of a machine
+is the board-id mask and the model mask combined, so "which releases can this
+hardware run" and "what is the newest one" are a couple of dictionary lookups
+and bit operations instead of a run of every checker.
+
+The rules describe unsupported models as intervals ("iMac <= 12,2"), so the
+models of a family are indexed as a table of consecutive intervals with one
+mask each. The mask of a model identifier is looked up from that table once
+and then kept by identifier.
+
+The index covers the hardware: board-id, model, memory, 64 bit CPU and
+virtual machines. The system version a release can be installed from is not
+part of it.
+
+The binary file written by write() starts with CAPABILITY_MAGIC, followed by
+(all integers big-endian):
+
+    releases:  count (B), then per release the version (B length + bytes),
+               the minimum memory (Q) and flags (B, 1 = requires a 64 bit
+               CPU, 2 = virtual machines are always supported)
+    board-ids: count (I), then per board-id the id (B length + bytes) and
+               the mask (I)
+    models:    count of families (H), then per family the name (B length +
+               bytes), the interval count (H) and per interval the inclusive
+               upper bound major (I), minor (I) and the mask (I)
+"""
+
+import bisect
+import struct
+
+from macadmin import checkers
+from macadmin import rules
+from macadmin.intervals import parse_model
+
+CAPABILITY_MAGIC = b'MACX\x01'
+
+# The upper bound of the last interval of every family
+_HIGHEST = (0xffffffff, 0xffffffff)
+
+_REQUIRES_64BIT = 1
+_VIRTUAL_MACHINE_SUPPORTED = 2
+
+
+def _predecessor(revision):
+    major, minor = revision
+    if minor > 0:
+        return major, minor - 1
+    return major - 1, _HIGHEST[1]
+
+
+class CapabilityIndex(object):
+    """Release bitmasks per board-id and per model"""
+
+    def __init__(self, versions, requirements, board_masks, model_tables):
+        # requirements is a (minimum memory, flags) tuple per release and
+        # model_tables maps a family to a sorted list of (upper bound, mask)
+        self.versions = list(versions)
+        self.requirements = list(requirements)
+        self.board_masks = board_masks
+        self.model_tables = model_tables
+        self.all_releases = (1 << len(self.versions)) - 1
+        self._bits = dict((version, 1 << bit) for bit, version in enumerate(self.versions))
+        self._uppers = dict((family, [upper for upper, mask in table])
+                            for family, table in model_tables.items())
+        self._model_masks = {}
+        self._requires_64bit = 0
+        self._virtual_machine_supported = 0
+        for bit, (minimum_memory, flags) in enumerate(self.requirements):
+            if flags & _REQUIRES_64BIT:
+                self._requires_64bit |= 1 << bit
+            if flags & _VIRTUAL_MACHINE_SUPPORTED:
+                self._virtual_machine_supported |= 1 << bit
+
+    def bit(self, version):
+        """Returns the mask bit of a release version"""
+        return self._bits[version]
+
+    def model_mask(self, model):
+        """Returns the mask of the releases that do not exclude model"""
+        mask = self._model_masks.get(model)
+        if mask is None:
+            mask = self.all_releases
+            parsed = parse_model(model)
+            if parsed is not None and parsed[0] in self.model_tables:
+                uppers = self._uppers[parsed[0]]
+                index = bisect.bisect_left(uppers, parsed[1:])
+                mask = self.model_tables[parsed[0]][index][1]
+            self._model_masks[model] = mask
+        return mask
+
+    def _memory_mask(self, memsize):
+        mask = self.all_releases
+        for bit, (minimum_memory, flags) in enumerate(self.requirements):
+            if memsize < minimum_memory:
+                mask &= ~(1 << bit)
+        return mask
+
+    def mask(self, board_id=None, model=None, virtual_machine=False, memsize=None,
+             cpu64bit_capable=None):
+        """
+        Returns the mask of the releases a machine can run. memsize and
+        cpu64bit_capable are only checked when they are given.
+        """
+        board_mask = self.board_masks.get(board_id, 0)
+        if virtual_machine:
+            # A virtual machine passes the board-id check of every release
+            board_mask = self.all_releases
+        mask = board_mask & self.model_mask(model)
+        if memsize is not None:
+            mask &= self._memory_mask(memsize)
+        if cpu64bit_capable is False:
+            mask &= ~self._requires_64bit
+        if virtual_machine:
+            mask |= self._virtual_machine_supported
+        return mask
+
+    def newest_supported(self, mask):
+        """Returns the newest release version in mask, or None if it is empty"""
+        if not mask:
+            return None
+        return self.versions[mask.bit_length() - 1]
+
+    def supported_versions(self, mask):
+        """Returns the release versions in mask, oldest first"""
+        return [version for bit, version in enumerate(self.versions) if mask & (1 << bit)]
+
+    def supports(self, mask, version):
+        """Returns True if release version is in mask"""
+        return bool(mask & self._bits[version])
+
+    def write(self, f):
+        """Writes the index to the binary file object f"""
+        chunks = [CAPABILITY_MAGIC, struct.pack('>B', len(self.versions))]
+        for version, (minimum_memory, flags) in zip(self.versions, self.requirements):
+            chunks.append(_string(version) + struct.pack('>QB', minimum_memory, flags))
+        chunks.append(struct.pack('>I', len(self.board_masks)))
+        for board_id, mask in sorted(self.board_masks.items()):
+            chunks.append(_string(board_id) + struct.pack('>I', mask))
+        chunks.append(struct.pack('>H', len(self.model_tables)))
+        for family, table in sorted(self.model_tables.items()):
+            chunks.append(_string(family) + struct.pack('>H', len(table)))
+            for (major, minor), mask in table:
+                chunks.append(struct.pack('>III', major, minor, mask))
+        f.write(b''.join(chunks))
+
+
+def _string(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return struct.pack('>B', len(text)) + text
+
+
+def _model_tables(all_rules):
+    """Returns the interval table of every family in the model rules"""
+    families = {}
+    for bit, release_rules in enumerate(all_rules):
+        for family, low, high in release_rules.non_supported_models:
+            families.setdefault(family, []).append((bit, low, high))
+    all_releases = (1 << len(all_rules)) - 1
+    tables = {}
+    for family, ranges in families.items():
+        # Every interval bound is a point where the mask can change
+        uppers = set([_HIGHEST])
+        for bit, low, high in ranges:
+            if low > (0, 0):
+                uppers.add(_predecessor(low))
+            uppers.add(min(high, _HIGHEST))
+        table = []
+        for upper in sorted(uppers):
+            mask = all_releases
+            for bit, low, high in ranges:
+                if low <= upper <= high:
+                    mask &= ~(1 << bit)
+            table.append((upper, mask))
+        tables[family] = table
+    return tables
+
+
+def build(versions=None):
+    """Builds the index from the rules of the releases in versions (all by default)"""
+    versions = versions or [release[0] for release in checkers.RELEASES]
+    all_rules = [rules.load(version) for version in versions]
+    requirements = []
+    board_masks = {}
+    for bit, release_rules in enumerate(all_rules):
+        flags = 0
+        if release_rules.requires_64bit_cpu:
+            flags |= _REQUIRES_64BIT
+        if release_rules.virtual_machine == 'supported':
+            flags |= _VIRTUAL_MACHINE_SUPPORTED
+        requirements.append((release_rules.minimum_memory, flags))
+        for board_id in release_rules.board_ids:
+            board_masks[board_id] = board_masks.get(board_id, 0) | 1 << bit
+    return CapabilityIndex(versions, requirements, board_masks, _model_tables(all_rules))
+
+
+def read(f):
+    """Reads an index written by CapabilityIndex.write() from the binary file object f"""
+    data = f.read()
+    if not data.startswith(CAPABILITY_MAGIC):
+        raise ValueError("Not a capability index")
+    offset = [len(CAPABILITY_MAGIC)]
+
+    def unpack(fmt):
+        values = struct.unpack_from(fmt, data, offset[0])
+        offset[0] += struct.calcsize(fmt)
+        return values
+
+    def string():
+        (length,) = unpack('>B')
+        text = data[offset[0]:offset[0] + length].decode('utf-8')
+        offset[0] += length
+        return text
+
+    versions = []
+    requirements = []
+    for index in range(unpack('>B')[0]):
+        versions.append(string())
+        requirements.append(unpack('>QB'))
+    board_masks = {}
+    for index in range(unpack('>I')[0]):
+        board_id = string()
+        board_masks[board_id] = unpack('>I')[0]
+    model_tables = {}
+    for index in range(unpack('>H')[0]):
+        family = string()
+        table = []
+        for interval in range(unpack('>H')[0]):
+            major, minor, mask = unpack('>III')
+            table.append(((major, minor), mask))
+        model_tables[family] = table
+    return CapabilityIndex(versions, requirements, board_masks, model_tables)
+
+
+def machine_mask(index):
+    """Returns the mask of this machine, from the probed facts"""
+    from macadmin import facts
+    return index.mask(facts.board_id(), facts.model(), facts.is_virtual_machine(),
+                      facts.memsize(), facts.cpu64bit_capable())
+
+
+def inventory_masks(index, inventory):
+    """Returns the mask of every host in a fleet.Inventory"""
+    return [index.mask(board_id, model, virtual_machine, memsize, cpu64bit_capable)
+            for board_id, model, virtual_machine, memsize, cpu64bit_capable
+            in zip(inventory.board_ids, inventory.models, inventory.virtual_machines,
+                   inventory.memsizes, inventory.cpu64bit_capable)]
@@ -0,0 +1,87 @@
+# encoding: utf-8
+"""
+Loads the check-10.*-compatibility.py scripts as modules so that several
+releases can be checked from a single process.
+"""
+
+import os
+import types
+
+from macadmin import cache
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (version, name, script) for every release that has a checker script,
+# oldest first. The name is the prefix of the "<name>_supported" conditional.
+RELEASES = [
+    ('10.8', 'mountainlion', 'check-10.8-mountainlion-compatibility.py'),
+    ('10.9', 'mavericks', 'check-10.9-mavericks-compatibility.py'),
+    ('10.10', 'yosemite', 'check-10.10-yosemite-compatibility.py'),
+    ('10.11', 'elcapitan', 'check-10.11-elcapitan-compatibility.py'),
+    ('10.12', 'sierra', 'check-10.12-sierra-compatibility.py'),
+    ('10.13', 'high_sierra', 'check-10.13-highsierra-compatibility.py'),
+    ('10.14', 'mojave', 'check-10.14-mojave-compatibility.py'),
+    ('10.15', 'catalina', 'check-10.15-catalina-compatibility.py'),
+]
+
+_checkers = {}
+
+
+def load_script(path):
+    """
+    Executes the script at path as a module without running its main()
+    and returns the module
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    module = types.ModuleType(name.replace('-', '_').replace('.', '_'))
+    module.__file__ = path
+    with open(path) as f:
+        code = compile(f.read(), path, 'exec')
+    exec(code, module.__dict__)
+    return module
+
+
+def release_for_version(version):
+    """Returns the RELEASES entry for version, or None if it is unknown"""
+    for release in RELEASES:
+        if release[0] == version:
+            return release
+    return None
+
+
+def newest_supported(results):
+    """
+    Returns the newest release version with exit code 0 in results, a
+    dictionary of version -> (exit code, conditional items), or None if no
+    release is supported
+    """
+    order = [release[0] for release in RELEASES]
+    supported = [version for version, (exit_code, items) in results.items() if exit_code == 0]
+    if not supported:
+        return None
+    return max(supported, key=order.index)
+
+
+def load_checker(version):
+    """Returns the checker module for a release version such as "10.15" """
+    if version not in _checkers:
+        release = release_for_version(version)
+        if release is None:
+            raise ValueError("No compatibility checker for %s" % version)
+        _checkers[version] = load_script(os.path.join(SCRIPTS_DIR, release[2]))
+    return _checkers[version]
+
+
+def release_result(version):
+    """
+    Returns the tuple of exit code and conditional items of a release,
+    from the cache if an earlier run has checked it. The output of the
+    checker is turned off.
+    """
+    result = cache.get_verdict(version)
+    if result is None:
+        checker = load_checker(version)
+        checker.verbose = False
+        result = checker.check_compatibility()
+        cache.set_verdict(version, result)
+    return result
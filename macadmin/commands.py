@@ -0,0 +1,62 @@
+# encoding: utf-8
+"""
+Running external commands with a deadline.
+
+communicate() in the python 2.7 subprocess module has no timeout, so a hung
+ioreg or pkgutil would stall the whole Munki run. Every command started
+through this module is killed by a timer thread once its deadline passes.
+"""
+
+import threading
+
+from macadmin import metrics
+
+# Seconds a single command may run before it is killed
+DEFAULT_TIMEOUT = 10
+
+
+def _kill(process):
+    try:
+        process.kill()
+    except OSError:
+        # The process exited already
+        pass
+
+
+def kill_after(process, timeout):
+    """
+    Starts and returns a timer that kills process after timeout seconds.
+    Stop the timer with stop_timer() once the process has exited.
+    """
+    timer = threading.Timer(timeout, _kill, [process])
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def stop_timer(timer):
+    """Cancels a timer from kill_after() and waits for its thread to exit"""
+    timer.cancel()
+    timer.join()
+
+
+def run_command(cmd, timeout=DEFAULT_TIMEOUT):
+    """
+    Runs cmd and returns its standard output, or None if it could not be
+    run, exited with an error or did not finish within timeout seconds
+    """
+    import subprocess
+    try:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    except OSError:
+        return None
+    metrics.subprocess_started()
+    timer = kill_after(p, timeout)
+    try:
+        (results, err) = p.communicate()
+    finally:
+        stop_timer(timer)
+    if p.returncode != 0:
+        return None
+    return results
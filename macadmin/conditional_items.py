@@ -0,0 +1,95 @@
+# encoding: utf-8
+"""
+Batched, atomic updates of Munki's ConditionalItems.plist.
+
+A ConditionalItemsStore collects any number of key updates and writes them
+with a single read-merge-write in commit(). The merge happens under an
+advisory lock on a lock file next to the plist, so conditions scripts that
+run back to back do not lose each other's keys, and the new plist is written
+to a temporary file that is renamed over the old one. Nothing is written if
+the merged dictionary equals the existing one.
+
+An empty plist, or an XML plist that was cut short before its closing tag,
+is replaced. Any other plist that can not be read (no permission, a format
+the plist reader does not know, not a dictionary) makes commit() raise
+without writing, so the keys of other scripts are never dropped.
+"""
+
+import fcntl
+import os
+
+from macadmin import metrics
+from macadmin.plists import read_plist_from_string
+from macadmin.plists import write_plist
+
+LOCK_SUFFIX = ".lock"
+
+
+class ConditionalItemsStore(object):
+    """Pending updates to the ConditionalItems.plist at path"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}
+
+    def update(self, dictionary):
+        """Adds the keys of dictionary to the pending updates"""
+        self.pending.update(dictionary)
+
+    def _read_existing(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if not data.strip():
+            return {}
+        try:
+            existing = read_plist_from_string(data)
+        except Exception:
+            if data.lstrip().startswith(b'<') and not data.rstrip().endswith(b'</plist>'):
+                # A truncated XML plist is replaced
+                return {}
+            raise
+        if not isinstance(existing, dict):
+            raise ValueError("%s is not a dictionary" % self.path)
+        return dict(existing)
+
+    def _write(self, dictionary):
+        import tempfile
+        directory = os.path.dirname(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.ConditionalItems-')
+        os.close(fd)
+        try:
+            write_plist(dictionary, temp_path)
+            os.chmod(temp_path, 0o644)
+            os.rename(temp_path, self.path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    @metrics.timed('conditional_items_write')
+    def commit(self):
+        """
+        Merges the pending updates into the plist. Returns True if the plist
+        was written and False if it already had the same contents.
+        """
+        if not self.pending:
+            return False
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        lock_file = open(self.path + LOCK_SUFFIX, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            existing = self._read_existing()
+            merged = dict(existing)
+            merged.update(self.pending)
+            changed = merged != existing
+            if changed:
+                self._write(merged)
+            self.pending = {}
+            return changed
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            lock_file.close()
+
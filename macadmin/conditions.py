@@ -0,0 +1,64 @@
+# encoding: utf-8
+"""
+Runs the Munki conditions checks of this repo as plugins of one process.
+
+A plugin is a script in this repo and a function in it that runs the check
+and returns a tuple of the exit code and a dictionary of conditional items
+without writing them anywhere. The release checks share the probed facts
+through macadmin.facts, so the hardware is probed once for all of them.
+"""
+
+import os
+
+from macadmin import checkers
+
+# (name, script, function) for every check besides the release checks. The
+# release checks are named by their version, for example "10.15".
+PLUGINS = [
+    ('virtual_machine', 'check-if-virtual-machine.py', 'check_virtual_machine'),
+    ('office_2011_language', 'office2011-installed-language.py', 'check_installed_language'),
+]
+
+_modules = {}
+
+
+def names():
+    """Returns the names of all checks in the order they are run"""
+    return [plugin[0] for plugin in PLUGINS] + [release[0] for release in checkers.RELEASES]
+
+
+def _plugin(name):
+    for plugin in PLUGINS:
+        if plugin[0] == name:
+            return plugin
+    return None
+
+
+def run_check(name):
+    """
+    Runs the check called name and returns its tuple of exit code and
+    conditional items
+    """
+    if checkers.release_for_version(name) is not None:
+        return checkers.release_result(name)
+    plugin = _plugin(name)
+    if plugin is None:
+        raise ValueError("No check called %s" % name)
+    if name not in _modules:
+        module = checkers.load_script(os.path.join(checkers.SCRIPTS_DIR, plugin[1]))
+        module.verbose = False
+        _modules[name] = module
+    return getattr(_modules[name], plugin[2])()
+
+
+def selected(enabled=None, disabled=()):
+    """
+    Returns the names of the checks to run: the checks in enabled (all of
+    them if it is None) that are not in disabled
+    """
+    unknown = set(enabled or ()) | set(disabled)
+    unknown.difference_update(names())
+    if unknown:
+        raise ValueError("No check called %s" % ", ".join(sorted(unknown)))
+    return [name for name in names()
+            if (enabled is None or name in enabled) and name not in disabled]
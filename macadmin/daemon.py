@@ -0,0 +1,207 @@
+# encoding: utf-8
+"""
+Answers compatibility queries over a local Unix domain socket.
+
+CompatibilityService runs the checks of every release once and keeps the
+encoded answers in memory, so a query costs a dictionary lookup and a write
+to the socket. The answers are recomputed when the boot session or the
+SystemVersion.plist changes (see macadmin.cache.cache_key), and retried while
+a probe of the last refresh timed out, whose answers are the fail-closed
+"not supported" ones.
+
+The protocol is line based. A request is a release version such as "10.15",
+or "all" for every release, followed by a newline. The response is a single
+line of JSON:
+
+    {"release": "10.15", "supported": true, "exit_code": 0,
+     "conditional_items": {"catalina_supported": true}}
+
+The answer to "all" has the conditional items of every release and the
+supported releases, newest last:
+
+    {"release": "all", "supported": true, "exit_code": 0,
+     "newest_supported": "10.15", "supported_releases": ["10.14", "10.15"],
+     "conditional_items": {...}}
+
+No machine supports every release (each one rejects the system versions
+up to its own), so "supported" and "exit_code" of "all" tell whether at
+least one release is supported, not whether all of them are.
+
+Unknown requests get {"error": "..."}. A connection can be used for any
+number of requests. A request longer than MAX_REQUEST bytes gets an error
+and the connection is closed.
+"""
+
+import json
+import os
+import socket
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from macadmin import cache
+from macadmin import checkers
+from macadmin import facts
+
+SOCKET_PATH = "/var/run/com.github.hjuutilainen.adminscripts.compatibility.sock"
+
+# Seconds between checks for a new boot session or OS version
+REFRESH_INTERVAL = 60
+
+ALL_RELEASES = 'all'
+
+# Longest request line in bytes, including the newline
+MAX_REQUEST = 256
+
+
+def _encode(dictionary):
+    return (json.dumps(dictionary, sort_keys=True) + '\n').encode('utf-8')
+
+
+class CompatibilityService(object):
+    """The checks of every release and their encoded answers"""
+
+    def __init__(self, versions=None):
+        self.versions = versions or [release[0] for release in checkers.RELEASES]
+        self.key = None
+        self.timed_out = []
+        self.responses = {}
+
+    def refresh(self):
+        """Probes the facts again and recomputes every answer"""
+        facts.reset()
+        cache.reset()
+        key = cache.cache_key()
+        responses = {}
+        results = {}
+        all_items = {}
+        for version in self.versions:
+            exit_code, conditional_items = checkers.release_result(version)
+            supported_key = "%s_supported" % checkers.release_for_version(version)[1]
+            responses[version] = _encode({'release': version,
+                                          'supported': bool(conditional_items.get(supported_key)),
+                                          'exit_code': exit_code,
+                                          'conditional_items': conditional_items})
+            results[version] = exit_code, conditional_items
+            all_items.update(conditional_items)
+        newest = checkers.newest_supported(results)
+        responses[ALL_RELEASES] = _encode({'release': ALL_RELEASES,
+                                           'supported': newest is not None,
+                                           'exit_code': 0 if newest else 1,
+                                           'newest_supported': newest,
+                                           'supported_releases': [version for version in self.versions
+                                                                  if results[version][0] == 0],
+                                           'conditional_items': all_items})
+        cache.save()
+        # Replace the answers in one step, readers never see a partial set
+        self.responses = responses
+        self.key = key
+        self.timed_out = facts.timed_out()
+
+    def is_stale(self):
+        """
+        Returns True after a reboot or an OS update, or if a probe timed
+        out during the last refresh
+        """
+        return bool(self.timed_out) or cache.cache_key() != self.key
+
+    def response(self, request):
+        """Returns the encoded answer to a request line"""
+        answer = self.responses.get(request)
+        if answer is None:
+            return _encode({'error': "Unknown release: %s" % request})
+        return answer
+
+
+class _QueryHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            line = self.rfile.readline(MAX_REQUEST + 1)
+            if not line:
+                break
+            if len(line) > MAX_REQUEST:
+                self.wfile.write(_encode({'error': "Request too long"}))
+                break
+            request = line.strip().decode('utf-8', 'replace')
+            self.wfile.write(service.response(request))
+
+
+class CompatibilityServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a CompatibilityService on a Unix domain socket"""
+
+    daemon_threads = True
+
+    def __init__(self, service, path=SOCKET_PATH, refresh_interval=REFRESH_INTERVAL):
+        if os.path.exists(path):
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, _QueryHandler)
+        # Queries are read-only, every local user may ask
+        os.chmod(path, 0o666)
+        self.path = path
+        self.service = service
+        self.refresh_interval = refresh_interval
+        self._stopped = threading.Event()
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self.refresh_interval):
+            if self.service.is_stale():
+                self.service.refresh()
+
+    def serve_forever(self, poll_interval=0.5):
+        refresher = threading.Thread(target=self._refresh_loop, name='refresh')
+        refresher.daemon = True
+        refresher.start()
+        try:
+            socketserver.UnixStreamServer.serve_forever(self, poll_interval)
+        finally:
+            self._stopped.set()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class Client(object):
+    """A connection to the compatibility daemon"""
+
+    def __init__(self, path=SOCKET_PATH, timeout=5):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(path)
+        self._file = self.socket.makefile('rb')
+
+    def query(self, release=ALL_RELEASES):
+        """Returns the answer for a release version, or for all releases"""
+        self.socket.sendall((release + '\n').encode('utf-8'))
+        answer = json.loads(self._file.readline().decode('utf-8'))
+        if 'error' in answer:
+            raise KeyError(answer['error'])
+        return answer
+
+    def supported(self, release):
+        """Returns True if release is supported on this machine"""
+        return self.query(release)['supported']
+
+    def close(self):
+        self._file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def query(release=ALL_RELEASES, path=SOCKET_PATH):
+    """Asks the daemon at path about release once"""
+    with Client(path) as client:
+        return client.query(release)
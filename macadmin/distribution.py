@@ -0,0 +1,171 @@
+# encoding: utf-8
+"""
+Compiles compatibility rules from the Distribution file of OSInstall.mpkg.
+
+The installCheckScript and volCheckScript functions of the Distribution file
+check the board-id and model of the machine against two JavaScript arrays,
+boardIds and nonSupportedModels. read_distribution() streams the Distribution
+XML, collects the text of its <script> elements and extracts those arrays.
+
+Results are cached by the SHA-256 hash of the Distribution file, so compiling
+an installer that has already been compiled only costs hashing the file.
+
+To get the Distribution file of an installer, expand OSInstall.mpkg with
+pkgutil --expand and point the compiler to the expanded directory or to the
+Distribution file in it.
+"""
+
+import hashlib
+import json
+import os
+import re
+from xml.etree import ElementTree
+
+from macadmin import rules
+from macadmin.intervals import parse_model
+
+CACHE_DIR = os.path.join(rules.COMPILED_DIR, 'distribution')
+
+# Part of the cache file names, bump it when the parsed results change
+PARSER_VERSION = 2
+
+_ARRAY = r'\bvar\s+%s\s*=\s*\[(?P<items>.*?)\]\s*;'
+_BOARD_IDS = re.compile(_ARRAY % 'boardIds', re.S)
+_NON_SUPPORTED_MODELS = re.compile(_ARRAY % 'nonSupportedModels', re.S)
+_STRING = re.compile(r'''(['"])(?P<value>.*?)\1''')
+
+
+def distribution_path(path):
+    """Returns the Distribution file of an expanded package or path itself"""
+    if os.path.isdir(path):
+        return os.path.join(path, 'Distribution')
+    return path
+
+
+def file_hash(path):
+    """Returns the SHA-256 hex digest of the file at path"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_scripts(path):
+    """Yields the text of every <script> element of a Distribution file"""
+    for event, element in ElementTree.iterparse(path, events=('end',)):
+        if element.tag == 'script':
+            yield element.text or ''
+        # The Distribution is read as a stream, drop what has been handled
+        element.clear()
+
+
+def _array(pattern, script):
+    m = pattern.search(script)
+    if not m:
+        return None
+    return [s.group('value') for s in _STRING.finditer(m.group('items'))]
+
+
+def parse_distribution(path):
+    """
+    Returns a dictionary with the BoardIDs and NonSupportedModels arrays
+    found in the scripts of a Distribution file. Arrays that are not found
+    are left out.
+    """
+    found = {}
+    for script in iter_scripts(path):
+        if 'BoardIDs' not in found:
+            board_ids = _array(_BOARD_IDS, script)
+            if board_ids is not None:
+                found['BoardIDs'] = sorted(set(board_ids))
+        if 'NonSupportedModels' not in found:
+            models = _array(_NON_SUPPORTED_MODELS, script)
+            if models is not None:
+                found['NonSupportedModels'] = model_intervals(models)
+        if len(found) == 2:
+            break
+    return found
+
+
+def model_intervals(models):
+    """
+    Returns a list of model identifiers as interval rules that exclude
+    exactly the listed models. Consecutive minor revisions of the same major
+    revision are written as "Family major,low - major,high", the only kind
+    of interval that can not cover an identifier that is not listed. Other
+    identifiers, and those that can not be parsed, are kept as is.
+    """
+    families = {}
+    intervals = []
+    for model in models:
+        parsed = parse_model(model)
+        if parsed is None:
+            intervals.append(model)
+        else:
+            families.setdefault(parsed[0], set()).add(parsed[1:])
+    for family, revisions in sorted(families.items()):
+        runs = []
+        for major, minor in sorted(revisions):
+            if runs and runs[-1][0] == major and runs[-1][2] == minor - 1:
+                runs[-1][2] = minor
+            else:
+                runs.append([major, minor, minor])
+        for major, low, high in runs:
+            if low == high:
+                intervals.append("%s%d,%d" % (family, major, low))
+            else:
+                intervals.append("%s %d,%d - %d,%d" % (family, major, low, major, high))
+    return intervals
+
+
+def _cache_path(digest):
+    return os.path.join(CACHE_DIR, "%s-%d.json" % (digest, PARSER_VERSION))
+
+
+def read_distribution(path):
+    """
+    Returns parse_distribution() of the Distribution file at path (or in
+    the expanded package at path), using the result cached for the same
+    file contents if there is one
+    """
+    path = distribution_path(path)
+    digest = file_hash(path)
+    try:
+        with open(_cache_path(digest)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        pass
+    found = parse_distribution(path)
+    temp_path = "%s.%d" % (_cache_path(digest), os.getpid())
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        with open(temp_path, 'w') as f:
+            json.dump(found, f)
+        os.rename(temp_path, _cache_path(digest))
+    except (IOError, OSError):
+        pass
+    return found
+
+
+def update_release(source, version, found, system_versions=None):
+    """
+    Merges the arrays found in a Distribution file into the release version
+    of the rules source dictionary. Returns True if the source changed, in
+    which case RulesVersion is incremented. A new release needs
+    system_versions, for example "10.9 <= OS < 10.15".
+    """
+    releases = source.setdefault('Releases', {})
+    release = dict(releases.get(version, {}))
+    if system_versions is not None:
+        release['SystemVersions'] = system_versions
+    if 'SystemVersions' not in release:
+        raise ValueError("The system versions of %s are not known" % version)
+    release.setdefault('VirtualMachine', 'supported')
+    release.update(found)
+    if releases.get(version) == release:
+        return False
+    releases[version] = release
+    source['RulesVersion'] = source.get('RulesVersion', 0) + 1
+    return True
@@ -0,0 +1,193 @@
+# encoding: utf-8
+"""
+Hardware and system facts shared by the compatibility checks.
+
+Every fact is gathered on first use and then kept for the lifetime of the
+process, so no probe runs more than once no matter how many checks read the
+same value. sysctl values are read through macadmin.sysctl and the board-id
+through macadmin.ioreg, both in-process where possible.
+
+Facts are also kept in the persistent macadmin.cache, so later runs during
+the same boot session read them from the cache file instead of probing.
+
+prefetch() gathers the hardware facts concurrently and gives up on probes
+that do not finish within PROBE_TIMEOUT seconds of starting. A probe that
+timed out gets its fallback value from FALLBACKS and is not written to the
+persistent cache. The checks report a release as not supported when a probe
+timed out.
+"""
+
+import threading
+import time
+
+from macadmin import cache
+from macadmin import ioreg
+from macadmin import metrics
+from macadmin import sysctl
+from macadmin.plists import read_plist
+
+SYSTEM_VERSION_PLIST = "/System/Library/CoreServices/SystemVersion.plist"
+
+# Seconds prefetch() gives each probe to finish, counted from its start
+PROBE_TIMEOUT = 10
+
+# Values of the facts whose probes did not finish in time
+FALLBACKS = {
+    'board_id': None,
+    'model': '',
+    'memsize': 0,
+    'cpu64bit_capable': False,
+    'cpu_features': [],
+}
+
+_facts = {}
+_timed_out = set()
+_missing = object()
+
+
+def _memoize(func):
+    """
+    Caches the return value of a fact function in the module cache. The
+    probe itself is timed by macadmin.metrics.
+    """
+    name = func.__name__
+    func = metrics.timed(name)(func)
+
+    def wrapper():
+        if name not in _facts:
+            value = cache.get_fact(name, _missing)
+            if value is _missing:
+                value = func()
+                # A probe that finishes after prefetch() gave up on it does
+                # not replace the fallback value. Facts gathered after a
+                # timeout may be derived from fallback values, such as the
+                # virtual machine vendor, and are not kept either.
+                if _facts.setdefault(name, value) is value and not _timed_out:
+                    cache.set_fact(name, value)
+            else:
+                _facts.setdefault(name, value)
+        return _facts[name]
+    wrapper.__name__ = name
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def reset():
+    """Forgets all gathered facts"""
+    _facts.clear()
+    _timed_out.clear()
+
+
+def gathered(name):
+    """Returns a fact if it has been gathered already, without probing"""
+    return _facts.get(name)
+
+
+def timed_out():
+    """Returns the names of the facts that have their fallback values"""
+    return sorted(_timed_out)
+
+
+def prefetch(names=None, timeout=None):
+    """
+    Gathers the facts in names (all facts in FALLBACKS by default) on
+    concurrent threads and gives each probe timeout seconds (PROBE_TIMEOUT
+    by default) from the moment its thread starts running, so a probe that
+    starts late gets as long as the others. Facts that are not ready by
+    then are set to their fallback values. Returns the names of the facts
+    in names that have their fallback values, whether they timed out in
+    this call or in an earlier one.
+    """
+    if names is None:
+        names = sorted(FALLBACKS)
+    # Load the persistent cache before the threads start using it
+    cache.load()
+    if timeout is None:
+        timeout = PROBE_TIMEOUT
+    threads = []
+    for name in names:
+        if name in _facts:
+            continue
+        if cache.get_fact(name, _missing) is not _missing:
+            globals()[name]()
+        else:
+            thread = threading.Thread(target=globals()[name], name=name)
+            thread.daemon = True
+            # start() returns once the thread runs, the deadline of the
+            # probe is counted from then
+            thread.start()
+            threads.append((thread, time.time() + timeout))
+    for thread, deadline in threads:
+        thread.join(max(0, deadline - time.time()))
+        if thread.is_alive() and thread.name not in _facts:
+            _facts[thread.name] = FALLBACKS[thread.name]
+            _timed_out.add(thread.name)
+    return [name for name in names if name in _timed_out]
+
+
+@_memoize
+def raw_board_id():
+    """
+    Returns the board-id property of the device tree root as it is, also on
+    virtual machines and other hardware, or None if it is not set
+    """
+    return ioreg.read_board_id()
+
+
+@_memoize
+def board_id():
+    """Returns the board-id of this machine or None if it is not a Mac"""
+    value = raw_board_id()
+    if value and value.startswith('Mac'):
+        return value
+    else:
+        return None
+
+
+@_memoize
+def model():
+    """Returns the hw.model identifier, for example "MacBookPro11,5" """
+    return sysctl.string("hw.model") or ''
+
+
+@_memoize
+def memsize():
+    """Returns the amount of physical memory in bytes"""
+    return sysctl.integer("hw.memsize") or 0
+
+
+@_memoize
+def cpu64bit_capable():
+    """Returns True if hw.cpu64bit_capable is set"""
+    return bool(sysctl.integer("hw.cpu64bit_capable"))
+
+
+@_memoize
+def cpu_features():
+    """Returns the list of machdep.cpu.features flags"""
+    return (sysctl.string("machdep.cpu.features") or '').split()
+
+
+def is_virtual_machine():
+    """
+    Returns True if macadmin.virtualization finds a hypervisor, from the VMM
+    CPU feature flag, kern.hv_vmm_present or the signature of a vendor
+    """
+    from macadmin import virtualization
+    return virtual_machine_vendor() != virtualization.NONE
+
+
+@_memoize
+def virtual_machine_vendor():
+    """
+    Returns the hypervisor vendor from macadmin.virtualization, for example
+    "vmware", or "none" on a physical machine
+    """
+    from macadmin import virtualization
+    return virtualization.detect(virtualization.signals())
+
+
+@_memoize
+def system_version():
+    """Returns the contents of SystemVersion.plist as a dictionary"""
+    return read_plist(SYSTEM_VERSION_PLIST)
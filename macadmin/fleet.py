@@ -0,0 +1,408 @@
+# encoding: utf-8
+"""
+Offline compatibility evaluation for a whole hardware inventory.
+
+The inventory is kept as columns. Board-ids, models and system versions
+repeat a lot across a fleet, so every column is dictionary encoded and the
+release rules from compatibility_rules.plist are evaluated once per distinct
+value. The per-host verdicts are then gathered from those lookup tables and
+combined column at a time, with NumPy when it is installed and with plain
+list comprehensions when it is not.
+
+Inventory records have the following fields:
+
+    serial_number      Host identifier (see id_column)
+    board_id           board-id from IODeviceTree
+    model              hw.model
+    product_version    ProductVersion from SystemVersion.plist
+    memsize            hw.memsize in bytes
+    cpu64bit_capable   hw.cpu64bit_capable (1/0, true/false)
+    cpu_features       machdep.cpu.features, space separated
+    virtual_machine    Optional, true/false. Used when cpu_features is empty.
+
+Inventories that do not fit in memory can be evaluated with write_stream(),
+which reads the records as a generator, evaluates them in batches on a
+process pool and writes the results as they come back. Only a few batches
+are in memory at any time.
+"""
+
+import csv
+import json
+import struct
+from collections import OrderedDict, deque
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from macadmin import checkers
+from macadmin import rules
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_ID_COLUMN = 'serial_number'
+DEFAULT_BATCH_SIZE = 10000
+
+OUTPUT_FORMATS = ['csv', 'jsonl', 'binary']
+
+# The binary output starts with BINARY_MAGIC, a count byte and the conditional
+# keys as length prefixed strings. Every host is then a length prefixed id
+# followed by a 32 bit mask where bit n is the nth key.
+BINARY_MAGIC = b'MACF\x01'
+
+_TRUE_VALUES = frozenset(['1', 'true', 'yes', 'y'])
+
+
+def _truthy(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().lower() in _TRUE_VALUES
+
+
+def _integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def release_keys(versions=None):
+    """Returns (version, conditional key) for every release, oldest first"""
+    return [(release[0], "%s_supported" % release[1]) for release in checkers.RELEASES
+            if versions is None or release[0] in versions]
+
+
+class Inventory(object):
+    """A hardware inventory stored as columns"""
+
+    def __init__(self, records=(), id_column=DEFAULT_ID_COLUMN):
+        self.id_column = id_column
+        self.ids = []
+        self.board_ids = []
+        self.models = []
+        self.product_versions = []
+        self.memsizes = []
+        self.cpu64bit_capable = []
+        self.virtual_machines = []
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, record):
+        """Adds one inventory record (a dictionary) to the columns"""
+        self.ids.append(record.get(self.id_column, len(self.ids)))
+        self.board_ids.append(record.get('board_id') or None)
+        self.models.append(record.get('model') or '')
+        self.product_versions.append(record.get('product_version') or '')
+        self.memsizes.append(_integer(record.get('memsize')))
+        self.cpu64bit_capable.append(_truthy(record.get('cpu64bit_capable')))
+        features = record.get('cpu_features') or ''
+        self.virtual_machines.append('VMM' in features.split() or
+                                     _truthy(record.get('virtual_machine')))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+
+def _json_lines(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_records(path):
+    """
+    Yields inventory records from a CSV, JSON or JSON lines file. Files
+    ending in .jsonl or .ndjson are read as JSON lines. A .json file is a
+    JSON array of records, which is read into memory as a whole, or JSON
+    lines if it does not start with "[".
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path) as f:
+            for record in _json_lines(f):
+                yield record
+    elif path.endswith('.json'):
+        with open(path) as f:
+            start = f.read(1)
+            while start and start.isspace():
+                start = f.read(1)
+            f.seek(0)
+            if start == '[':
+                for record in json.load(f):
+                    yield record
+            else:
+                for record in _json_lines(f):
+                    yield record
+    else:
+        with open(path) as f:
+            for record in csv.DictReader(f):
+                yield record
+
+
+def read_inventory(path, id_column=DEFAULT_ID_COLUMN):
+    """Returns an Inventory with every record in path"""
+    return Inventory(read_records(path), id_column)
+
+
+def _encode(values):
+    """Returns the distinct values and the code of every value"""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    uniques = [None] * len(index)
+    for value, code in index.items():
+        uniques[code] = value
+    if numpy is not None:
+        codes = numpy.asarray(codes, dtype=numpy.intp)
+    return uniques, codes
+
+
+def _column(values):
+    if numpy is not None:
+        return numpy.asarray(values, dtype=bool)
+    return values
+
+
+def _gather(table, codes):
+    if numpy is not None:
+        return numpy.asarray(table, dtype=bool)[codes]
+    return [table[code] for code in codes]
+
+
+def _and(*columns):
+    if numpy is not None:
+        result = columns[0]
+        for column in columns[1:]:
+            result = result & column
+        return result
+    return [all(values) for values in zip(*columns)]
+
+
+def _or(a, b):
+    if numpy is not None:
+        return a | b
+    return [x or y for x, y in zip(a, b)]
+
+
+def _at_least(values, minimum):
+    if numpy is not None:
+        return numpy.asarray(values, dtype=numpy.int64) >= minimum
+    return [value >= minimum for value in values]
+
+
+def _version_table(versions, release_rules):
+    return [version in release_rules.system_versions for version in versions]
+
+
+class _EncodedInventory(object):
+    """Dictionary encoded columns shared by the evaluation of every release"""
+
+    def __init__(self, inventory):
+        self.board_ids, self.board_codes = _encode(inventory.board_ids)
+        self.models, self.model_codes = _encode(inventory.models)
+        self.versions, self.version_codes = _encode(inventory.product_versions)
+        self.memsizes = inventory.memsizes
+        self.cpu64bit_capable = _column(inventory.cpu64bit_capable)
+        self.virtual_machines = _column(inventory.virtual_machines)
+
+
+def _evaluate_release(encoded, release_rules):
+    board_ok = _gather([board_id in release_rules.board_ids for board_id in encoded.board_ids],
+                       encoded.board_codes)
+    version_ok = _gather(_version_table(encoded.versions, release_rules),
+                         encoded.version_codes)
+    if release_rules.virtual_machine == 'supported':
+        model_ok = _gather([model not in release_rules.non_supported_models
+                            for model in encoded.models], encoded.model_codes)
+        return _or(encoded.virtual_machines, _and(model_ok, board_ok, version_ok))
+    columns = [_or(board_ok, encoded.virtual_machines), version_ok]
+    if release_rules.non_supported_models:
+        columns.append(_gather([model not in release_rules.non_supported_models
+                                for model in encoded.models], encoded.model_codes))
+    if release_rules.minimum_memory:
+        columns.append(_at_least(encoded.memsizes, release_rules.minimum_memory))
+    if release_rules.requires_64bit_cpu:
+        columns.append(encoded.cpu64bit_capable)
+    return _and(*columns)
+
+
+def evaluate(inventory, versions=None):
+    """
+    Evaluates every host in inventory against the releases in versions (all
+    releases by default) and returns an ordered dictionary of conditional
+    key -> column of booleans, one value per host
+    """
+    encoded = _EncodedInventory(inventory)
+    results = OrderedDict()
+    for version, key in release_keys(versions):
+        results[key] = _evaluate_release(encoded, rules.load(version))
+    return results
+
+
+def evaluate_record(record, release_rules):
+    """
+    Evaluates a single inventory record against release_rules the same way
+    as evaluate(). This is the row at a time reference implementation.
+    """
+    features = record.get('cpu_features') or ''
+    virtual_machine = 'VMM' in features.split() or _truthy(record.get('virtual_machine'))
+    board_ok = record.get('board_id') in release_rules.board_ids
+    model_ok = (record.get('model') or '') not in release_rules.non_supported_models
+    version_ok = _version_table([record.get('product_version') or ''], release_rules)[0]
+    if release_rules.virtual_machine == 'supported':
+        return virtual_machine or (model_ok and board_ok and version_ok)
+    return ((board_ok or virtual_machine) and version_ok and model_ok and
+            _integer(record.get('memsize')) >= release_rules.minimum_memory and
+            (_truthy(record.get('cpu64bit_capable')) or not release_rules.requires_64bit_cpu))
+
+
+def matrix_rows(inventory, results):
+    """Yields (host id, [verdict, ...]) for every host in inventory"""
+    columns = list(results.values())
+    for index, host_id in enumerate(inventory.ids):
+        yield host_id, [bool(column[index]) for column in columns]
+
+
+def _to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+
+def format_header(keys, output_format, id_column=DEFAULT_ID_COLUMN):
+    """Returns the bytes that start an output file"""
+    if output_format == 'binary':
+        header = BINARY_MAGIC + struct.pack('>B', len(keys))
+        for key in keys:
+            key = _to_bytes(key)
+            header += struct.pack('>B', len(key)) + key
+        return header
+    if output_format == 'csv':
+        return _csv_bytes([[id_column] + keys])
+    return b''
+
+
+def _csv_bytes(rows):
+    buf = StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerows(rows)
+    return _to_bytes(buf.getvalue())
+
+
+def format_rows(keys, rows, output_format, id_column=DEFAULT_ID_COLUMN):
+    """Returns (host id, verdicts) rows serialized in output_format as bytes"""
+    if output_format == 'binary':
+        chunks = []
+        for host_id, verdicts in rows:
+            host_id = _to_bytes(str(host_id))
+            mask = 0
+            for bit, verdict in enumerate(verdicts):
+                if verdict:
+                    mask |= 1 << bit
+            chunks.append(struct.pack('>H', len(host_id)) + host_id + struct.pack('>I', mask))
+        return b''.join(chunks)
+    if output_format == 'jsonl':
+        lines = []
+        for host_id, verdicts in rows:
+            record = OrderedDict([(id_column, host_id)])
+            record.update(zip(keys, verdicts))
+            lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+        return _to_bytes(''.join(lines))
+    return _csv_bytes([[host_id] + verdicts for host_id, verdicts in rows])
+
+
+def write_matrix(inventory, results, f, output_format='csv'):
+    """Writes the per-host release matrix to the binary file object f"""
+    keys = list(results.keys())
+    f.write(format_header(keys, output_format, inventory.id_column))
+    f.write(format_rows(keys, list(matrix_rows(inventory, results)), output_format,
+                        inventory.id_column))
+
+
+def read_binary_matrix(f):
+    """Yields (host id, {conditional key: verdict}) from binary output"""
+    magic = f.read(len(BINARY_MAGIC))
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary compatibility matrix")
+    (key_count,) = struct.unpack('>B', f.read(1))
+    keys = []
+    for index in range(key_count):
+        (length,) = struct.unpack('>B', f.read(1))
+        keys.append(f.read(length).decode('utf-8'))
+    while True:
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return
+        (length,) = struct.unpack('>H', length_bytes)
+        host_id = f.read(length).decode('utf-8')
+        (mask,) = struct.unpack('>I', f.read(4))
+        yield host_id, dict((key, bool(mask & (1 << bit))) for bit, key in enumerate(keys))
+
+
+def _batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _evaluate_batch(args):
+    """Evaluates one batch of records and returns the serialized rows"""
+    records, versions, id_column, output_format = args
+    inventory = Inventory(records, id_column)
+    results = evaluate(inventory, versions)
+    return len(records), format_rows(list(results.keys()), list(matrix_rows(inventory, results)),
+                                     output_format, id_column)
+
+
+def write_stream(records, f, versions=None, output_format='jsonl', workers=1,
+                 batch_size=DEFAULT_BATCH_SIZE, id_column=DEFAULT_ID_COLUMN):
+    """
+    Evaluates an iterable of inventory records in batches and writes the
+    per-host release matrix to the binary file object f as batches finish.
+    The output is in the same order as the input. With more than one worker
+    the batches are evaluated on a process pool and at most two batches per
+    worker are in flight. Returns the number of records written.
+    """
+    keys = [key for version, key in release_keys(versions)]
+    f.write(format_header(keys, output_format, id_column))
+    batches = ((batch, versions, id_column, output_format)
+               for batch in _batches(records, batch_size))
+    count = 0
+    if workers <= 1:
+        for batch in batches:
+            written, data = _evaluate_batch(batch)
+            f.write(data)
+            count += written
+        return count
+
+    import multiprocessing
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_evaluate_batch, (batch,)))
+            if len(pending) >= workers * 2:
+                written, data = pending.popleft().get()
+                f.write(data)
+                count += written
+        while pending:
+            written, data = pending.popleft().get()
+            f.write(data)
+            count += written
+    finally:
+        pool.terminate()
+        pool.join()
+    return count
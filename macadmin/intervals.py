@@ -0,0 +1,148 @@
+# encoding: utf-8
+"""
+Interval rules for system versions and model identifiers.
+
+System versions ("10.14.6") and hw.model identifiers ("iMac12,2") are parsed
+once into tuples of integers and compared by range instead of constructing
+StrictVersion objects or scanning lists of every model revision. The rules
+source writes them as intervals:
+
+    "10.9 <= OS < 10.15"      a range of system versions
+    "iMac <= 12,2"            every iMac up to and including iMac12,2
+    "MacPro 4,1 - 5,1"        MacPro4,1 up to and including MacPro5,1
+    "MacPro >= 6,1"           MacPro6,1 and newer
+    "MacPro5,1"               a single model
+"""
+
+import re
+
+# Compiled on first use by the re module cache, most runs load compiled rules
+# and never parse
+_MODEL = r'^\s*(?P<family>[A-Za-z]+)(?P<major>\d+),(?P<minor>\d+)\s*$'
+_MODEL_RANGE = (r'^\s*(?P<family>[A-Za-z]+)\s*'
+                r'(?:(?P<op><=|>=)\s*(?P<major>\d+),(?P<minor>\d+)|'
+                r'(?P<low_major>\d+),(?P<low_minor>\d+)\s*-\s*'
+                r'(?P<high_major>\d+),(?P<high_minor>\d+))\s*$')
+_VERSION_RANGE = r'^\s*(?P<minimum>[0-9.]+)\s*<=\s*OS\s*<\s*(?P<maximum>[0-9.]+)\s*$'
+
+# Bounds of the open ends of a model range
+_LOWEST = (0, 0)
+_HIGHEST = (1 << 30, 1 << 30)
+
+
+def parse_version(version):
+    """
+    Returns a system version string as a tuple of three integers, or None
+    if it is not a valid version. "10.8" is the same as "10.8.0" like with
+    StrictVersion.
+    """
+    try:
+        parts = [int(part) for part in str(version).strip().split('.')]
+    except ValueError:
+        return None
+    if not 2 <= len(parts) <= 3:
+        return None
+    return tuple(parts + [0] * (3 - len(parts)))
+
+
+def parse_model(model):
+    """
+    Returns a model identifier such as "iMac12,2" as a (family, major, minor)
+    tuple, for example ("iMac", 12, 2), or None if it is not one
+    """
+    m = re.match(_MODEL, model or '')
+    if not m:
+        return None
+    return m.group('family'), int(m.group('major')), int(m.group('minor'))
+
+
+def parse_model_range(text):
+    """
+    Returns a model interval written as in the rules source as a
+    (family, (low major, low minor), (high major, high minor)) tuple with
+    inclusive bounds. Raises ValueError if text is not a model interval.
+    """
+    model = parse_model(text)
+    if model is not None:
+        return model[0], model[1:], model[1:]
+    m = re.match(_MODEL_RANGE, text)
+    if not m:
+        raise ValueError("Invalid model interval: %r" % text)
+    if m.group('op') == '<=':
+        return m.group('family'), _LOWEST, (int(m.group('major')), int(m.group('minor')))
+    if m.group('op') == '>=':
+        return m.group('family'), (int(m.group('major')), int(m.group('minor'))), _HIGHEST
+    return (m.group('family'),
+            (int(m.group('low_major')), int(m.group('low_minor'))),
+            (int(m.group('high_major')), int(m.group('high_minor'))))
+
+
+def parse_version_range(text):
+    """
+    Returns a system version interval such as "10.9 <= OS < 10.15" as a
+    (minimum, maximum) tuple of parsed versions. Raises ValueError if text
+    is not a version interval.
+    """
+    m = re.match(_VERSION_RANGE, text)
+    minimum = parse_version(m.group('minimum')) if m else None
+    maximum = parse_version(m.group('maximum')) if m else None
+    if minimum is None or maximum is None:
+        raise ValueError("Invalid system version interval: %r" % text)
+    return minimum, maximum
+
+
+def format_version(version):
+    """Returns a parsed version as a string, leaving out a zero patch level"""
+    if version[2] == 0:
+        return "%d.%d" % version[:2]
+    return "%d.%d.%d" % version
+
+
+class VersionRange(object):
+    """System versions from minimum (inclusive) up to maximum (exclusive)"""
+
+    def __init__(self, minimum, maximum):
+        self.minimum = tuple(minimum)
+        self.maximum = tuple(maximum)
+
+    def __contains__(self, version):
+        if not isinstance(version, tuple):
+            version = parse_version(version)
+        return version is not None and self.minimum <= version < self.maximum
+
+    def __repr__(self):
+        return "VersionRange(%r <= OS < %r)" % (format_version(self.minimum),
+                                                format_version(self.maximum))
+
+
+class ModelRanges(object):
+    """
+    A set of model identifiers described by intervals. Supports the in
+    operator with model identifier strings or parsed models.
+    """
+
+    def __init__(self, ranges=()):
+        self.ranges = tuple((family, tuple(low), tuple(high)) for family, low, high in ranges)
+        self._families = {}
+        for family, low, high in self.ranges:
+            self._families.setdefault(family, []).append((low, high))
+
+    def __contains__(self, model):
+        if not isinstance(model, tuple):
+            model = parse_model(model)
+        if model is None:
+            return False
+        revision = model[1:]
+        for low, high in self._families.get(model[0], ()):
+            if low <= revision <= high:
+                return True
+        return False
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __repr__(self):
+        return "ModelRanges(%r)" % (self.ranges,)
@@ -0,0 +1,190 @@
+# encoding: utf-8
+"""
+Readers for I/O Registry properties.
+
+find_properties() reads ioreg output line by line, either the default text
+format or the XML property list written by ioreg -a, and stops as soon as it
+has seen every requested property. stream_properties() runs ioreg and feeds
+its output to find_properties() as it is written, terminating ioreg once the
+properties have been found.
+
+read_board_id() looks the board-id up from the registry directly through
+IOKit and ctypes when it can, and streams the ioreg output otherwise. On
+Linux, which has no I/O Registry, the DMI board name takes its place.
+"""
+
+import os
+import re
+import sys
+
+from macadmin import metrics
+from macadmin.commands import DEFAULT_TIMEOUT
+from macadmin.commands import kill_after
+from macadmin.commands import stop_timer
+
+BOARD_ID_CMD = ["/usr/sbin/ioreg",
+                "-p", "IODeviceTree",
+                "-r",
+                "-n", "/",
+                "-d", "1"]
+
+_TEXT_PROPERTY = r'^\s*"(?P<key>[^"]+)" = (?P<value>.*?)\s*$'
+_PLIST_VALUE = r'^<(?P<type>string|integer|real)>(?P<value>.*)</(?P=type)>$'
+
+
+def _text_value(value):
+    if value.startswith('<"') and value.endswith('">'):
+        return value[2:-2]
+    if value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    return value
+
+
+def _data_value(encoded):
+    import base64
+    value = base64.b64decode(encoded.encode('ascii'))
+    return value.rstrip(b'\0').decode('utf-8', 'replace')
+
+
+def find_properties(lines, keys):
+    """
+    Returns a dictionary of the properties in keys found in lines of ioreg
+    output. Stops reading lines once every key has been found. Data values
+    that contain a string are returned as that string.
+    """
+    text_property = re.compile(_TEXT_PROPERTY)
+    plist_value = re.compile(_PLIST_VALUE)
+    wanted = set(keys)
+    found = {}
+    pending_key = None
+    pending_data = None
+    for line in lines:
+        stripped = line.strip()
+        if pending_data is not None:
+            if stripped.endswith('</data>'):
+                pending_data.append(stripped[:-len('</data>')])
+                found[pending_key] = _data_value(''.join(pending_data))
+                pending_key = None
+                pending_data = None
+            else:
+                pending_data.append(stripped)
+        elif pending_key is not None:
+            if stripped.startswith('<data>'):
+                pending_data = [stripped[len('<data>'):]]
+                if stripped.endswith('</data>'):
+                    found[pending_key] = _data_value(stripped[len('<data>'):-len('</data>')])
+                    pending_key = None
+                    pending_data = None
+            else:
+                m = plist_value.match(stripped)
+                found[pending_key] = m.group('value') if m else stripped
+                pending_key = None
+        elif stripped.startswith('<key>') and stripped.endswith('</key>'):
+            key = stripped[len('<key>'):-len('</key>')]
+            if key in wanted and key not in found:
+                pending_key = key
+        else:
+            m = text_property.match(line)
+            if m and m.group('key') in wanted and m.group('key') not in found:
+                found[m.group('key')] = _text_value(m.group('value'))
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+def stream_properties(cmd, keys, timeout=DEFAULT_TIMEOUT):
+    """
+    Runs an ioreg command and returns the properties in keys from its
+    output. The command is terminated as soon as every key has been found,
+    or after timeout seconds with the properties found until then.
+    """
+    import subprocess
+    devnull = open(os.devnull, 'w')
+    try:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=devnull,
+                             universal_newlines=True)
+    except OSError:
+        devnull.close()
+        return {}
+    metrics.subprocess_started()
+    timer = kill_after(p, timeout)
+    try:
+        found = find_properties(iter(p.stdout.readline, ''), keys)
+    finally:
+        stop_timer(timer)
+        if p.poll() is None:
+            p.kill()
+        p.stdout.close()
+        p.wait()
+        devnull.close()
+    return found
+
+
+_iokit = None
+
+
+def _load_iokit():
+    global _iokit
+    if _iokit is None:
+        import ctypes
+        import ctypes.util
+        iokit = ctypes.CDLL(ctypes.util.find_library('IOKit'))
+        cf = ctypes.CDLL(ctypes.util.find_library('CoreFoundation'))
+        iokit.IORegistryEntryFromPath.argtypes = [ctypes.c_uint32, ctypes.c_char_p]
+        iokit.IORegistryEntryFromPath.restype = ctypes.c_uint32
+        iokit.IORegistryEntryCreateCFProperty.argtypes = [ctypes.c_uint32, ctypes.c_void_p,
+                                                          ctypes.c_void_p, ctypes.c_uint32]
+        iokit.IORegistryEntryCreateCFProperty.restype = ctypes.c_void_p
+        iokit.IOObjectRelease.argtypes = [ctypes.c_uint32]
+        cf.CFStringCreateWithCString.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_uint32]
+        cf.CFStringCreateWithCString.restype = ctypes.c_void_p
+        cf.CFGetTypeID.argtypes = [ctypes.c_void_p]
+        cf.CFGetTypeID.restype = ctypes.c_ulong
+        cf.CFDataGetTypeID.restype = ctypes.c_ulong
+        cf.CFDataGetLength.argtypes = [ctypes.c_void_p]
+        cf.CFDataGetLength.restype = ctypes.c_long
+        cf.CFDataGetBytePtr.argtypes = [ctypes.c_void_p]
+        cf.CFDataGetBytePtr.restype = ctypes.c_void_p
+        cf.CFRelease.argtypes = [ctypes.c_void_p]
+        _iokit = (ctypes, iokit, cf)
+    return _iokit
+
+
+def registry_data_property(path, key):
+    """
+    Returns a data property of the registry entry at path (for example
+    "IODeviceTree:/") as a string using IOKit, or None if it is not set
+    """
+    ctypes, iokit, cf = _load_iokit()
+    k_cf_string_encoding_utf8 = 0x08000100
+    entry = iokit.IORegistryEntryFromPath(0, path.encode('utf-8'))
+    if not entry:
+        return None
+    cf_key = cf.CFStringCreateWithCString(None, key.encode('utf-8'), k_cf_string_encoding_utf8)
+    try:
+        value = iokit.IORegistryEntryCreateCFProperty(entry, cf_key, None, 0)
+        if not value:
+            return None
+        try:
+            if cf.CFGetTypeID(value) != cf.CFDataGetTypeID():
+                return None
+            data = ctypes.string_at(cf.CFDataGetBytePtr(value), cf.CFDataGetLength(value))
+            return data.rstrip(b'\0').decode('utf-8', 'replace')
+        finally:
+            cf.CFRelease(value)
+    finally:
+        cf.CFRelease(cf_key)
+        iokit.IOObjectRelease(entry)
+
+
+def read_board_id():
+    """Returns the raw board-id property of the device tree root or None"""
+    if sys.platform.startswith('linux'):
+        from macadmin import linux
+        return linux.dmi("board_name")
+    if sys.platform == 'darwin':
+        try:
+            return registry_data_property("IODeviceTree:/", "board-id")
+        except (OSError, AttributeError, TypeError):
+            pass
+    return stream_properties(BOARD_ID_CMD, ['board-id']).get('board-id')
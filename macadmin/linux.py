@@ -0,0 +1,85 @@
+# encoding: utf-8
+"""
+Readers for the Linux /proc and /sys files that stand in for sysctl and
+ioreg on Linux hosts.
+
+Everything is read from files, no command is run. ROOT is the directory the
+paths are resolved in, so the readers can be pointed to a recorded tree (see
+fixtures/linux) instead of the running system.
+"""
+
+import os
+
+ROOT = "/"
+
+DMI_DIR = "sys/class/dmi/id"
+
+
+def _read(path):
+    try:
+        with open(os.path.join(ROOT, path)) as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def dmi(name):
+    """
+    Returns a DMI value from /sys/class/dmi/id (for example "sys_vendor" or
+    "product_name"), or None if it is not available
+    """
+    value = _read(os.path.join(DMI_DIR, name))
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+def hypervisor_type():
+    """Returns /sys/hypervisor/type (for example "xen") or None"""
+    value = _read("sys/hypervisor/type")
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+def cpuinfo():
+    """
+    Returns the fields of the first processor in /proc/cpuinfo as a
+    dictionary, or an empty dictionary if it can not be read
+    """
+    fields = {}
+    for line in (_read("proc/cpuinfo") or '').splitlines():
+        if not line.strip():
+            if fields:
+                break
+            continue
+        if ':' in line:
+            name, value = line.split(':', 1)
+            fields[name.strip()] = value.strip()
+    return fields
+
+
+def meminfo(name):
+    """Returns a /proc/meminfo value (for example "MemTotal") in bytes or None"""
+    for line in (_read("proc/meminfo") or '').splitlines():
+        if line.startswith(name + ':'):
+            parts = line.split()
+            try:
+                value = int(parts[1])
+            except (IndexError, ValueError):
+                return None
+            if len(parts) > 2 and parts[2] == 'kB':
+                value *= 1024
+            return value
+    return None
+
+
+def boottime():
+    """Returns the btime of /proc/stat in seconds since the epoch or None"""
+    for line in (_read("proc/stat") or '').splitlines():
+        if line.startswith('btime '):
+            try:
+                return int(line.split()[1])
+            except (IndexError, ValueError):
+                return None
+    return None
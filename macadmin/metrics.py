@@ -0,0 +1,118 @@
+# encoding: utf-8
+"""
+Optional latency instrumentation of the probes.
+
+Set the MACADMIN_METRICS environment variable to turn it on:
+
+    MACADMIN_METRICS=stderr           print a JSON record to stderr at exit
+    MACADMIN_METRICS=/path/file.jsonl append the JSON record to a file
+
+The record has the wall clock duration, number of calls and number of
+subprocesses started for every function decorated with timed(), and the
+totals of the whole run. When the variable is not set timed() returns the
+function as is, so the instrumentation costs nothing.
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+
+ENVIRONMENT_VARIABLE = 'MACADMIN_METRICS'
+
+destination = os.environ.get(ENVIRONMENT_VARIABLE) or None
+enabled = destination is not None
+
+_started = time.time()
+_probes = {}
+_lock = threading.Lock()
+_local = threading.local()
+_subprocesses = [0]
+
+
+def _thread_subprocesses():
+    return getattr(_local, 'subprocesses', 0)
+
+
+def subprocess_started():
+    """Counts a subprocess started by the current thread"""
+    _local.subprocesses = _thread_subprocesses() + 1
+    with _lock:
+        _subprocesses[0] += 1
+
+
+def _record(name, seconds, subprocesses):
+    with _lock:
+        probe = _probes.setdefault(name, {'calls': 0, 'seconds': 0.0, 'subprocesses': 0})
+        probe['calls'] += 1
+        probe['seconds'] += seconds
+        probe['subprocesses'] += subprocesses
+
+
+def timed(name):
+    """
+    Returns a decorator that records the duration and subprocess count of
+    every call of a function under name
+    """
+    def decorator(func):
+        if not enabled:
+            return func
+
+        def wrapper(*args, **kwargs):
+            subprocesses = _thread_subprocesses()
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.time() - start, _thread_subprocesses() - subprocesses)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+def record():
+    """Returns the metrics of this process as a dictionary"""
+    from macadmin import facts
+    with _lock:
+        probes = dict((name, dict(probe)) for name, probe in _probes.items())
+        subprocesses = _subprocesses[0]
+    return {
+        'script': os.path.basename(sys.argv[0]) if sys.argv else None,
+        'timestamp': int(_started),
+        'pid': os.getpid(),
+        # Lets the records be grouped by hardware class without probing
+        'model': facts.gathered('model'),
+        'board_id': facts.gathered('board_id'),
+        'seconds': time.time() - _started,
+        'subprocesses': subprocesses,
+        'probes': probes,
+    }
+
+
+def reset():
+    """Forgets the metrics recorded so far"""
+    global _started
+    with _lock:
+        _probes.clear()
+        _subprocesses[0] = 0
+    _started = time.time()
+
+
+def emit():
+    """Writes the record to the destination in MACADMIN_METRICS"""
+    import json
+    line = json.dumps(record(), sort_keys=True)
+    if destination == 'stderr':
+        sys.stderr.write(line + '\n')
+        return
+    try:
+        with open(destination, 'a') as f:
+            f.write(line + '\n')
+    except (IOError, OSError):
+        pass
+
+
+if enabled:
+    atexit.register(emit)
@@ -0,0 +1,73 @@
+# encoding: utf-8
+"""
+Optional machine-readable output of the checks.
+
+Set the MACADMIN_OUTPUT environment variable to ndjson to have the scripts
+print one compact JSON record per line instead of the human readable text:
+
+    {"check":"Model","script":"check-10.15-catalina-compatibility.py",
+     "seconds":0.000012,"type":"check","value":"MacBookPro11,5","verdict":"OK"}
+
+and a summary record before they exit:
+
+    {"checks":4,"conditional_items":{"catalina_supported":true},"exit_code":0,
+     "failed":0,"script":"...","seconds":0.041,"type":"summary"}
+
+The seconds of a check record is the time since the previous record (or the
+start of the script), so the first check also includes gathering the facts.
+The exit codes of the scripts are the same in both modes, and a script with
+verbose set to False prints nothing in either mode.
+"""
+
+import os
+import sys
+import time
+
+ENVIRONMENT_VARIABLE = 'MACADMIN_OUTPUT'
+
+ndjson = os.environ.get(ENVIRONMENT_VARIABLE) == 'ndjson'
+
+_started = time.time()
+_last = [_started]
+_counts = {'checks': 0, 'failed': 0}
+
+
+def _script():
+    return os.path.basename(sys.argv[0]) if sys.argv else None
+
+
+def _emit(record):
+    import json
+    sys.stdout.write(json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n')
+
+
+def check(name, value, verdict):
+    """Prints the record of one check"""
+    now = time.time()
+    _emit({
+        'type': 'check',
+        'script': _script(),
+        'check': name,
+        'value': value,
+        'verdict': verdict,
+        'seconds': round(now - _last[0], 6),
+    })
+    _last[0] = now
+    _counts['checks'] += 1
+    if verdict == 'Failed':
+        _counts['failed'] += 1
+
+
+def summary(exit_code, conditional_items):
+    """Prints the summary record if the NDJSON output is enabled"""
+    if not ndjson:
+        return
+    _emit({
+        'type': 'summary',
+        'script': _script(),
+        'exit_code': exit_code,
+        'conditional_items': conditional_items,
+        'checks': _counts['checks'],
+        'failed': _counts['failed'],
+        'seconds': round(time.time() - _started, 6),
+    })
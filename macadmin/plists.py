@@ -0,0 +1,135 @@
+# encoding: utf-8
+"""
+Property list helpers that work with both the plistlib API of the system
+python 2.7 and the newer python 3 API. plistlib is imported on first use,
+it pulls in the XML parser and is not needed by most runs.
+
+The plistlib of python 2.7 can not read binary property lists, which is the
+format the preferences system writes, so those are read by
+read_binary_plist_from_string() with every python version.
+"""
+
+import struct
+
+BINARY_HEADER = b'bplist00'
+
+# Seconds from 1970-01-01 to 2001-01-01, the epoch of binary plist dates
+_BINARY_EPOCH = 978307200
+
+
+def read_plist(path):
+    """Returns the deserialized contents of the property list at path"""
+    with open(path, 'rb') as f:
+        return read_plist_from_string(f.read())
+
+
+def read_plist_from_string(data):
+    """Returns the deserialized contents of a property list string"""
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    if data.startswith(BINARY_HEADER):
+        return read_binary_plist_from_string(data)
+    import plistlib
+    if hasattr(plistlib, 'loads'):
+        return plistlib.loads(data)
+    return plistlib.readPlistFromString(data)
+
+
+def read_binary_plist_from_string(data):
+    """
+    Returns the deserialized contents of a binary property list. Raises
+    ValueError if data is not one.
+    """
+    if not data.startswith(BINARY_HEADER) or len(data) < len(BINARY_HEADER) + 32:
+        raise ValueError("Not a binary property list")
+    (offset_size, ref_size, count,
+     top, table_offset) = struct.unpack('>6xBBQQQ', data[-32:])
+    if (not 1 <= offset_size <= 8 or not 1 <= ref_size <= 8 or top >= count or
+            table_offset + count * offset_size > len(data) - 32):
+        raise ValueError("Invalid binary property list trailer")
+
+    def integer(start, size):
+        value = 0
+        for byte in bytearray(data[start:start + size]):
+            value = value << 8 | byte
+        return value
+
+    offsets = [integer(table_offset + index * offset_size, offset_size)
+               for index in range(count)]
+
+    def length_and_start(start, info):
+        # A length of 0xF is followed by an integer object with the length
+        if info != 0xF:
+            return info, start + 1
+        size = 1 << (bytearray(data[start + 1:start + 2])[0] & 0xF)
+        return integer(start + 2, size), start + 2 + size
+
+    def references(start, info, per_item):
+        length, begin = length_and_start(start, info)
+        if begin + length * per_item * ref_size > table_offset:
+            raise ValueError("Invalid binary property list container")
+        return length, begin
+
+    def read_object(ref, depth=0):
+        if depth > 100:
+            raise ValueError("Binary property list is nested too deep")
+        start = offsets[ref]
+        marker = bytearray(data[start:start + 1])[0]
+        kind, info = marker >> 4, marker & 0xF
+        if marker == 0x00:
+            return None
+        if marker == 0x08:
+            return False
+        if marker == 0x09:
+            return True
+        if kind == 0x1:
+            size = 1 << info
+            value = integer(start + 1, size)
+            if size == 8 and value >= 1 << 63:
+                value -= 1 << 64
+            return value
+        if kind == 0x2:
+            fmt = '>f' if info == 2 else '>d'
+            return struct.unpack(fmt, data[start + 1:start + 1 + (1 << info)])[0]
+        if kind == 0x3:
+            import datetime
+            (seconds,) = struct.unpack('>d', data[start + 1:start + 9])
+            return datetime.datetime.utcfromtimestamp(_BINARY_EPOCH + seconds)
+        if kind == 0x4:
+            length, begin = length_and_start(start, info)
+            return data[begin:begin + length]
+        if kind == 0x5:
+            length, begin = length_and_start(start, info)
+            text = data[begin:begin + length]
+            return text if str is bytes else text.decode('ascii')
+        if kind == 0x6:
+            length, begin = length_and_start(start, info)
+            return data[begin:begin + length * 2].decode('utf-16-be')
+        if kind == 0x8:
+            return integer(start + 1, info + 1)
+        if kind in (0xA, 0xC):
+            length, begin = references(start, info, 1)
+            return [read_object(integer(begin + index * ref_size, ref_size), depth + 1)
+                    for index in range(length)]
+        if kind == 0xD:
+            length, begin = references(start, info, 2)
+            values = begin + length * ref_size
+            return dict((read_object(integer(begin + index * ref_size, ref_size), depth + 1),
+                         read_object(integer(values + index * ref_size, ref_size), depth + 1))
+                        for index in range(length))
+        raise ValueError("Unknown binary property list object 0x%02x" % marker)
+
+    try:
+        return read_object(top)
+    except (IndexError, OverflowError, TypeError, struct.error):
+        raise ValueError("Invalid binary property list")
+
+
+def write_plist(dictionary, path):
+    """Writes dictionary to path as an XML property list"""
+    import plistlib
+    if hasattr(plistlib, 'dump'):
+        with open(path, 'wb') as f:
+            plistlib.dump(dictionary, f)
+    else:
+        plistlib.writePlist(dictionary, path)
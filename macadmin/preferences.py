@@ -0,0 +1,62 @@
+# encoding: utf-8
+"""
+Reads preference values without loading PyObjC.
+
+CFPreferencesCopyAppValue() is the reference, but importing Foundation takes
+longer than everything else a conditions script does. copy_app_value() reads
+the plist of the domain in /Library/Preferences directly, binary or XML, and
+only asks CFPreferences when the value could come from somewhere with a
+higher precedence: a managed (MDM or profile forced) preferences file, or
+the preferences of the current user.
+"""
+
+import os
+
+from macadmin.plists import read_plist
+
+PREFERENCES_DIR = "/Library/Preferences"
+MANAGED_PREFERENCES_DIR = "/Library/Managed Preferences"
+
+
+def _user_name():
+    import pwd
+    try:
+        return pwd.getpwuid(os.getuid()).pw_name
+    except KeyError:
+        return None
+
+
+def _overriding_paths(domain):
+    """Returns the preference files that take precedence over /Library/Preferences"""
+    filename = domain + ".plist"
+    paths = [os.path.join(MANAGED_PREFERENCES_DIR, filename),
+             os.path.expanduser(os.path.join("~/Library/Preferences", filename))]
+    user_name = _user_name()
+    if user_name:
+        paths.append(os.path.join(MANAGED_PREFERENCES_DIR, user_name, filename))
+    return paths
+
+
+def _cfpreferences_value(key, domain):
+    try:
+        from Foundation import CFPreferencesCopyAppValue
+    except ImportError:
+        return None
+    return CFPreferencesCopyAppValue(key, domain)
+
+
+def copy_app_value(key, domain):
+    """
+    Returns the value of key in the preferences domain (for example
+    "ManagedInstalls"), or None if it is not set
+    """
+    if any(os.path.exists(path) for path in _overriding_paths(domain)):
+        return _cfpreferences_value(key, domain)
+    path = os.path.join(PREFERENCES_DIR, domain + ".plist")
+    if not os.path.exists(path):
+        return None
+    try:
+        return read_plist(path).get(key)
+    except Exception:
+        # Let the preferences system deal with a file it can read and we can not
+        return _cfpreferences_value(key, domain)
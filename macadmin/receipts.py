@@ -0,0 +1,140 @@
+# encoding: utf-8
+"""
+Installer package receipts.
+
+pkgutil --pkg-info asks the receipts database, which is slow to start, only
+to tell whether a package is installed. The receipts of the boot volume are
+one <package id>.plist (and .bom) per package in RECEIPTS_DIR, so
+is_installed() looks for that file instead. pkgutil is only run when
+RECEIPTS_DIR does not exist, on a macOS release that keeps its receipts
+elsewhere. Answers are kept for the lifetime of the process.
+
+package_infos() reads the receipts of many packages in one pass over
+RECEIPTS_DIR and returns them as the dictionaries of
+pkgutil --pkg-info-plist, instead of one pkgutil run per package. Only the
+receipts of the identifiers asked for are parsed. They can be read on
+several threads, which overlaps the reads on a cold disk; parsing itself
+holds the interpreter lock, so one thread is as fast once they are cached.
+"""
+
+import os
+import sys
+import threading
+
+from macadmin.commands import run_command
+from macadmin.plists import read_plist
+from macadmin.plists import read_plist_from_string
+
+RECEIPTS_DIR = "/var/db/receipts"
+
+MUNKI_CORE = "com.googlecode.munki.core"
+
+_installed = {}
+
+
+def reset():
+    """Forgets the answers of is_installed()"""
+    _installed.clear()
+
+
+def receipt_path(package_id):
+    """Returns the path of the receipt plist of package_id"""
+    return os.path.join(RECEIPTS_DIR, package_id + ".plist")
+
+
+def _pkgutil_installed(package_id):
+    if sys.platform != 'darwin':
+        # No pkgutil and no packages
+        return False
+    return run_command(["pkgutil", "--pkg-info", package_id]) is not None
+
+
+def is_installed(package_id):
+    """Returns True if the package package_id is installed on the boot volume"""
+    if package_id not in _installed:
+        if os.path.isdir(RECEIPTS_DIR):
+            _installed[package_id] = os.path.exists(receipt_path(package_id))
+        else:
+            _installed[package_id] = _pkgutil_installed(package_id)
+    return _installed[package_id]
+
+
+def munki_installed():
+    """Returns True if the Munki core tools are installed"""
+    return is_installed(MUNKI_CORE)
+
+
+def _timestamp(date):
+    import calendar
+    if date is None:
+        return 0
+    return calendar.timegm(date.utctimetuple())
+
+
+def info_from_receipt(receipt):
+    """
+    Returns the pkgutil --pkg-info-plist dictionary of a receipt plist
+    (pkgid, pkg-version, volume, install-location and install-time)
+    """
+    return {
+        'pkgid': receipt.get('PackageIdentifier'),
+        'pkg-version': receipt.get('PackageVersion'),
+        'volume': '/',
+        'install-location': receipt.get('InstallPrefixPath'),
+        'install-time': _timestamp(receipt.get('InstallDate')),
+    }
+
+
+def _read_infos(identifiers, infos, start, step):
+    for index in range(start, len(identifiers), step):
+        try:
+            info = info_from_receipt(read_plist(receipt_path(identifiers[index])))
+        except Exception:
+            # A receipt being written, removed or damaged, pkgutil would
+            # not list it either
+            continue
+        info['pkgid'] = info['pkgid'] or identifiers[index]
+        infos[index] = info
+
+
+def _pkgutil_package_infos(matches):
+    results = run_command(["/usr/sbin/pkgutil", "--pkgs-plist"])
+    if results is None:
+        return []
+    infos = []
+    for identifier in sorted(read_plist_from_string(results)):
+        if matches is not None and not matches(identifier):
+            continue
+        results = run_command(["/usr/sbin/pkgutil", "--pkg-info-plist", identifier])
+        if results is not None:
+            infos.append(read_plist_from_string(results))
+    return infos
+
+
+def package_infos(matches=None, threads=1):
+    """
+    Returns the pkgutil --pkg-info-plist dictionaries of the installed
+    packages whose identifier matches(identifier) returns True for (every
+    package by default), sorted by identifier. The receipts are read on
+    threads threads.
+    """
+    if not os.path.isdir(RECEIPTS_DIR):
+        if sys.platform != 'darwin':
+            return []
+        return _pkgutil_package_infos(matches)
+    identifiers = sorted(name[:-len(".plist")] for name in os.listdir(RECEIPTS_DIR)
+                         if name.endswith(".plist"))
+    if matches is not None:
+        identifiers = [identifier for identifier in identifiers if matches(identifier)]
+    infos = [None] * len(identifiers)
+    if threads > 1:
+        workers = [threading.Thread(target=_read_infos,
+                                    args=(identifiers, infos, start, threads))
+                   for start in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        _read_infos(identifiers, infos, 0, 1)
+    return [info for info in infos if info is not None]
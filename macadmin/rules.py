@@ -0,0 +1,182 @@
+# encoding: utf-8
+"""
+Requirements of every macOS release: supported board-ids, unsupported models,
+supported system versions, memory and CPU requirements and how virtual
+machines are treated.
+
+The rules live in compatibility_rules.plist next to this module. Supported
+system versions and unsupported models are written there as intervals (see
+macadmin.intervals). Parsing the whole property list for every check would
+be wasteful, so the first load compiles each release into a small marshal
+file of frozensets and integer tuples in the compiled directory. Later loads
+read only the compiled file of the requested release. The compiled files are
+rebuilt automatically when the source plist changes.
+
+Every verdict is decided by these files, so like the macadmin.cache file they
+are only written by root and only read if they are owned by root and not
+writable by group or others. Otherwise the rules are compiled in memory.
+"""
+
+import marshal
+import os
+import sys
+from collections import namedtuple
+
+from macadmin import cache
+from macadmin.intervals import ModelRanges
+from macadmin.intervals import VersionRange
+from macadmin.intervals import parse_model_range
+from macadmin.intervals import parse_version_range
+
+RULES_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compatibility_rules.plist')
+COMPILED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compiled')
+
+# The marshal format is only stable within one python version
+COMPILED_SUFFIX = '-py%d%d.marshal' % sys.version_info[:2]
+
+ReleaseRules = namedtuple('ReleaseRules', [
+    'version',
+    'rules_version',
+    'board_ids',
+    # ModelRanges of the models that are not supported
+    'non_supported_models',
+    # VersionRange of the system versions the release can be installed from
+    'system_versions',
+    # Minimum physical memory in bytes, 0 if there is no requirement
+    'minimum_memory',
+    'requires_64bit_cpu',
+    # "board-id" if a virtual machine only passes the board-id check,
+    # "supported" if a virtual machine is always supported
+    'virtual_machine',
+])
+
+_COMPILED_FIELDS = ReleaseRules._fields[2:]
+
+_loaded = {}
+
+
+def _source_signature():
+    info = os.stat(RULES_SOURCE)
+    return [int(info.st_mtime), info.st_size]
+
+
+def compiled_path(version):
+    """Returns the path of the compiled rules for a release"""
+    return os.path.join(COMPILED_DIR, version + COMPILED_SUFFIX)
+
+
+def _rules_from_dict(version, rules_version, release):
+    return ReleaseRules(version,
+                        rules_version,
+                        frozenset(release.get('BoardIDs', [])),
+                        ModelRanges(parse_model_range(text)
+                                    for text in release.get('NonSupportedModels', [])),
+                        VersionRange(*parse_version_range(release['SystemVersions'])),
+                        int(release.get('MinimumMemory', 0)),
+                        bool(release.get('Requires64BitCPU', False)),
+                        release.get('VirtualMachine', 'board-id'))
+
+
+def _compiled_value(field, value):
+    # marshal only handles builtin types
+    if field == 'non_supported_models':
+        return value.ranges
+    if field == 'system_versions':
+        return value.minimum, value.maximum
+    return value
+
+
+def _rules_value(field, value):
+    if field == 'non_supported_models':
+        return ModelRanges(value)
+    if field == 'system_versions':
+        return VersionRange(*value)
+    return value
+
+
+def _read_compiled(version, signature):
+    path = compiled_path(version)
+    if not cache.trusted(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            compiled = marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if compiled.get('signature') != signature:
+        return None
+    if any(field not in compiled for field in _COMPILED_FIELDS):
+        return None
+    return ReleaseRules(version, compiled['rules_version'],
+                        *[_rules_value(field, compiled[field]) for field in _COMPILED_FIELDS])
+
+
+def _write_compiled(rules, signature):
+    if os.geteuid() != 0:
+        # Tables written by others would not be trusted
+        return
+    compiled = dict((field, _compiled_value(field, value))
+                    for field, value in zip(_COMPILED_FIELDS, rules[2:]))
+    compiled['signature'] = signature
+    compiled['rules_version'] = rules.rules_version
+    path = compiled_path(rules.version)
+    temp_path = "%s.%d" % (path, os.getpid())
+    try:
+        if not os.path.isdir(COMPILED_DIR):
+            os.makedirs(COMPILED_DIR, 0o755)
+        with open(temp_path, 'wb') as f:
+            marshal.dump(compiled, f)
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        # Not being able to cache is not an error, we just compile again
+        # next time
+        pass
+
+
+def read_source():
+    """Returns the deserialized rules source plist"""
+    from macadmin.plists import read_plist
+    return read_plist(RULES_SOURCE)
+
+
+def write_source(source):
+    """Writes the rules source plist"""
+    from macadmin.plists import write_plist
+    write_plist(source, RULES_SOURCE)
+
+
+def compile_rules():
+    """
+    Compiles every release in the rules source and returns a dictionary
+    of ReleaseRules keyed by release version
+    """
+    signature = _source_signature()
+    source = read_source()
+    rules_version = source.get('RulesVersion', 0)
+    compiled = {}
+    for version, release in source.get('Releases', {}).items():
+        rules = _rules_from_dict(version, rules_version, release)
+        _write_compiled(rules, signature)
+        compiled[version] = rules
+    return compiled
+
+
+def load(version):
+    """Returns the ReleaseRules for a release version such as "10.15" """
+    if version in _loaded:
+        return _loaded[version]
+    rules = _read_compiled(version, _source_signature())
+    if rules is None:
+        rules = compile_rules().get(version)
+        if rules is None:
+            raise KeyError("No compatibility rules for %s" % version)
+    _loaded[version] = rules
+    return rules
+
+
+if __name__ == '__main__':
+    for version, rules in sorted(compile_rules().items()):
+        print("%s: %d board-ids, %d unsupported model intervals, %r" % (
+            version, len(rules.board_ids), len(rules.non_supported_models),
+            rules.system_versions))
@@ -0,0 +1,223 @@
+# encoding: utf-8
+"""
+Pluggable sysctl readers.
+
+On macOS the values are read in-process with sysctlbyname(3) through ctypes,
+which saves a fork and exec of /usr/sbin/sysctl for every value. If libc can
+not be loaded the values are read by running /usr/sbin/sysctl instead. On
+Linux the few values the checks use are translated from /proc and /sys by
+LinuxSysctl, without running any command. A FixtureSysctl with canned
+values can be installed with set_provider() to run the checks and
+benchmarks on other platforms.
+
+Every provider returns None for values that do not exist.
+"""
+
+import re
+import struct
+import sys
+
+from macadmin.commands import run_command
+
+# Text form of kern.boottime, for example "{ sec = 1571234567, usec = 123456 } Wed Oct 16 ..."
+_BOOTTIME_TEXT = r'sec\s*=\s*(\d+),\s*usec\s*=\s*(\d+)'
+
+
+def _parse_boottime(text):
+    if text is None:
+        return None
+    m = re.search(_BOOTTIME_TEXT, text)
+    if not m:
+        return None
+    return int(m.group(1)), int(m.group(2))
+
+
+class SubprocessSysctl(object):
+    """Reads values by running /usr/sbin/sysctl -n <name>"""
+
+    def _read(self, name):
+        results = run_command(["/usr/sbin/sysctl", "-n", name])
+        if results is None:
+            return None
+        return results.strip()
+
+    def string(self, name):
+        return self._read(name)
+
+    def integer(self, name):
+        try:
+            return int(self._read(name))
+        except (TypeError, ValueError):
+            return None
+
+    def boottime(self):
+        return _parse_boottime(self._read("kern.boottime"))
+
+
+class CtypesSysctl(object):
+    """Reads values in-process with sysctlbyname(3)"""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._libc.sysctlbyname.argtypes = [ctypes.c_char_p,
+                                            ctypes.c_void_p,
+                                            ctypes.POINTER(ctypes.c_size_t),
+                                            ctypes.c_void_p,
+                                            ctypes.c_size_t]
+        self._libc.sysctlbyname.restype = ctypes.c_int
+
+    def raw(self, name):
+        """Returns the raw bytes of a value"""
+        ctypes = self._ctypes
+        name = name.encode('ascii')
+        size = ctypes.c_size_t(0)
+        if self._libc.sysctlbyname(name, None, ctypes.byref(size), None, 0) != 0:
+            return None
+        buf = ctypes.create_string_buffer(size.value)
+        if self._libc.sysctlbyname(name, buf, ctypes.byref(size), None, 0) != 0:
+            return None
+        return buf.raw[:size.value]
+
+    def string(self, name):
+        value = self.raw(name)
+        if value is None:
+            return None
+        return value.rstrip(b'\0').decode('utf-8', 'replace').strip()
+
+    def integer(self, name):
+        value = self.raw(name)
+        if value is None:
+            return None
+        if len(value) == 4:
+            return struct.unpack('=i', value)[0]
+        if len(value) == 8:
+            return struct.unpack('=Q', value)[0]
+        return None
+
+    def boottime(self):
+        # struct timeval: 64 bit tv_sec followed by 32 bit tv_usec
+        value = self.raw("kern.boottime")
+        if value is None or len(value) < 12:
+            return None
+        return struct.unpack('=qi', value[:12])
+
+
+class LinuxSysctl(object):
+    """
+    Answers the macOS sysctl names the checks use from the Linux /proc and
+    /sys files read by macadmin.linux. The hypervisor CPU flag is reported
+    as VMM, like on macOS.
+    """
+
+    def _cpu_flags(self):
+        from macadmin import linux
+        fields = linux.cpuinfo()
+        # x86 calls them flags and arm64 Features
+        return (fields.get('flags') or fields.get('Features') or '').split()
+
+    def _value(self, name):
+        from macadmin import linux
+        if name == "machdep.cpu.features":
+            return " ".join("VMM" if flag == 'hypervisor' else flag.upper()
+                            for flag in self._cpu_flags())
+        if name == "machdep.cpu.brand_string":
+            return linux.cpuinfo().get('model name')
+        if name == "hw.model":
+            return linux.dmi("product_name")
+        if name == "hw.memsize":
+            return linux.meminfo("MemTotal")
+        if name == "hw.cpu64bit_capable":
+            # lm is the long mode flag of x86, CPU architecture 8 is arm64
+            return int('lm' in self._cpu_flags() or
+                       linux.cpuinfo().get('CPU architecture') == '8')
+        if name == "kern.hv_vmm_present":
+            return int('hypervisor' in self._cpu_flags())
+        return None
+
+    def string(self, name):
+        value = self._value(name)
+        if value is None:
+            return None
+        return str(value).strip()
+
+    def integer(self, name):
+        try:
+            return int(self._value(name))
+        except (TypeError, ValueError):
+            return None
+
+    def boottime(self):
+        from macadmin import linux
+        seconds = linux.boottime()
+        if seconds is None:
+            return None
+        return seconds, 0
+
+
+class FixtureSysctl(object):
+    """Returns values from a dictionary of sysctl name -> value"""
+
+    def __init__(self, values):
+        self.values = dict(values)
+
+    def string(self, name):
+        value = self.values.get(name)
+        if value is None:
+            return None
+        return str(value).strip()
+
+    def integer(self, name):
+        try:
+            return int(self.values.get(name))
+        except (TypeError, ValueError):
+            return None
+
+    def boottime(self):
+        return _parse_boottime(self.string("kern.boottime"))
+
+
+_provider = None
+
+
+def default_provider():
+    """Returns the best provider for this platform"""
+    if sys.platform == 'darwin':
+        try:
+            return CtypesSysctl()
+        except (OSError, AttributeError, ImportError):
+            pass
+    if sys.platform.startswith('linux'):
+        return LinuxSysctl()
+    return SubprocessSysctl()
+
+
+def provider():
+    """Returns the provider in use, creating the default one if needed"""
+    global _provider
+    if _provider is None:
+        _provider = default_provider()
+    return _provider
+
+
+def set_provider(new_provider):
+    """Replaces the provider in use. None restores the default provider."""
+    global _provider
+    _provider = new_provider
+
+
+def string(name):
+    """Returns a sysctl value as a string or None"""
+    return provider().string(name)
+
+
+def integer(name):
+    """Returns a sysctl value as an integer or None"""
+    return provider().integer(name)
+
+
+def boottime():
+    """Returns kern.boottime as a (seconds, microseconds) tuple or None"""
+    return provider().boottime()
@@ -0,0 +1,116 @@
+# encoding: utf-8
+"""
+Identifies the hypervisor a virtual machine runs on.
+
+The VMM CPU feature flag only tells that there is a hypervisor, not which
+one. detect() weighs a few cheap signals against the patterns in SIGNATURES
+and returns the vendor with the most weight:
+
+    cpu_features   machdep.cpu.features, VMM means a hypervisor is present
+    hv_vmm_present kern.hv_vmm_present, 1 means a hypervisor is present
+                   (the only hypervisor sysctl of macOS, Apple silicon and
+                   newer Intel releases)
+    brand_string   machdep.cpu.brand_string
+    model          hw.model, for example "VMware7,1" or "VirtualMac2,1"
+    board_id       the raw board-id of the device tree root, for example
+                   "440BX Desktop Reference Platform"
+    manufacturer   the DMI system vendor (Linux)
+    hypervisor     /sys/hypervisor/type (Linux)
+
+On Linux the sysctl values and the board-id are translated from /proc and
+/sys by macadmin.sysctl.LinuxSysctl and macadmin.ioreg (the DMI product name
+is the model and the DMI board name the board-id). The two Linux signals are
+read when LinuxSysctl is the sysctl provider.
+
+A machine without a hypervisor is NONE and one whose hypervisor does not
+match any signature is UNKNOWN. detect() only looks at the dictionary it is
+given, so it can be run against recorded values. signals() reads them from
+this machine; facts.virtual_machine_vendor() keeps the verdict for the boot
+session.
+"""
+
+import re
+
+VMWARE = 'vmware'
+PARALLELS = 'parallels'
+VIRTUALBOX = 'virtualbox'
+APPLE = 'apple_virtualization'
+QEMU = 'qemu'
+KVM = 'kvm'
+HYPERV = 'microsoft_hyperv'
+XEN = 'xen'
+UNKNOWN = 'unknown'
+NONE = 'none'
+
+# (signal, pattern, vendor, weight). The patterns are matched at the start
+# of the value.
+SIGNATURES = [
+    ('model', r'VMware', VMWARE, 3),
+    ('model', r'Parallels', PARALLELS, 3),
+    ('model', r'VirtualBox', VIRTUALBOX, 3),
+    ('model', r'VirtualMac', APPLE, 3),
+    ('model', r'Virtual Machine', HYPERV, 3),
+    ('manufacturer', r'VMware', VMWARE, 2),
+    ('manufacturer', r'Parallels', PARALLELS, 2),
+    ('manufacturer', r'innotek GmbH', VIRTUALBOX, 2),
+    ('manufacturer', r'QEMU', QEMU, 2),
+    ('manufacturer', r'Xen', XEN, 2),
+    ('hypervisor', r'xen', XEN, 2),
+    ('board_id', r'440BX Desktop Reference Platform', VMWARE, 2),
+    ('board_id', r'VMware', VMWARE, 2),
+    ('board_id', r'Parallels', PARALLELS, 2),
+    ('board_id', r'VirtualBox', VIRTUALBOX, 2),
+    ('board_id', r'VMA\d+MACOS', APPLE, 2),
+    ('brand_string', r'QEMU', QEMU, 2),
+    ('brand_string', r'Common KVM', KVM, 3),
+    ('brand_string', r'.*\(Virtual\)', APPLE, 1),
+]
+
+
+def hypervisor_present(signals):
+    """Returns True if the CPU flags or kern.hv_vmm_present report a hypervisor"""
+    return "VMM" in (signals.get('cpu_features') or []) or signals.get('hv_vmm_present') == 1
+
+
+def scores(signals):
+    """Returns a dictionary of vendor -> the weight of its matching signatures"""
+    found = {}
+    for signal, pattern, vendor, weight in SIGNATURES:
+        value = signals.get(signal)
+        if value and re.match(pattern, value):
+            found[vendor] = found.get(vendor, 0) + weight
+    return found
+
+
+def detect(signals):
+    """
+    Returns the hypervisor vendor of a machine with the signals in the
+    dictionary signals, NONE if it is not virtual or UNKNOWN if the vendor
+    can not be told
+    """
+    found = scores(signals)
+    if found:
+        # On a tie the vendor of the earlier signature wins
+        order = [signature[2] for signature in SIGNATURES]
+        return max(sorted(found, key=order.index), key=found.get)
+    if hypervisor_present(signals):
+        return UNKNOWN
+    return NONE
+
+
+def signals():
+    """Returns the signals of this machine"""
+    from macadmin import facts
+    from macadmin import sysctl
+    found = {
+        'cpu_features': facts.cpu_features(),
+        'hv_vmm_present': sysctl.integer("kern.hv_vmm_present"),
+        'brand_string': sysctl.string("machdep.cpu.brand_string"),
+        'model': facts.model(),
+        'board_id': facts.raw_board_id(),
+    }
+    if isinstance(sysctl.provider(), sysctl.LinuxSysctl):
+        from macadmin import linux
+        found['manufacturer'] = linux.dmi("sys_vendor")
+        found['hypervisor'] = linux.hypervisor_type()
+    return found
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# munki-conditions.py
+#
+# This script runs the Munki conditions checks of this repo in one process
+# instead of one python process per script. The checks are loaded from the
+# scripts as plugins (see macadmin/conditions.py), the hardware is probed once
+# for all of them and all conditional items are written to ConditionalItems.plist
+# in a single atomic update.
+#
+# Checks (run with --list to print the names):
+# - virtual_machine        check-if-virtual-machine.py
+# - office_2011_language   office2011-installed-language.py
+# - 10.8 ... 10.15         check-10.*-compatibility.py
+#
+# Choose the checks of a site with enabled_checks and disabled_checks below.
+# Install this script in /usr/local/munki/conditions with the macadmin
+# directory and the check scripts next to it. Remove the executable bit of the
+# check scripts so that Munki does not also run them one by one.
+#
+# Usage:
+#   munki-conditions.py [check ...]
+#   munki-conditions.py --list
+#
+# Exit codes:
+# 0 = Every check ran
+# 1 = At least one check could not be run
+#
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
+
+import sys
+import os
+
+from macadmin import conditions
+from macadmin import output
+from macadmin import preferences
+from macadmin import receipts
+from macadmin.conditional_items import ConditionalItemsStore
+
+
+# ================================================================================
+# Start configuration
+# ================================================================================
+
+# Set this to False if you don't want any output, just the exit codes
+verbose = True
+
+# Set this to False if you don't want to update
+# /Library/Managed Installs/ConditionalItems.plist
+update_munki_conditional_items = True
+
+# Names of the checks to run, None runs every check
+enabled_checks = None
+
+# Names of the checks not to run, for example ['office_2011_language']
+disabled_checks = []
+
+# ================================================================================
+# End configuration
+# ================================================================================
+
+
+def logger(message, status, info):
+    if verbose and output.ndjson:
+        output.check(message, status, info)
+    elif verbose:
+        print "%20s: %-40s [%s]" % (message, status, info)
+    pass
+
+
+def conditional_items_path():
+    # <https://github.com/munki/munki/wiki/Conditional-Items>
+    # Read the location of the ManagedInstallDir from ManagedInstall.plist
+    bundle_id = 'ManagedInstalls'
+    pref_name = 'ManagedInstallDir'
+    managed_installs_dir = preferences.copy_app_value(pref_name, bundle_id)
+
+    # Make sure we're outputting our information to "ConditionalItems.plist"
+    if managed_installs_dir:
+        return os.path.join(managed_installs_dir, 'ConditionalItems.plist')
+    else:
+        # Munki default
+        return "/Library/Managed Installs/ConditionalItems.plist"
+
+
+def munki_installed():
+    return receipts.munki_installed()
+
+
+def append_conditional_items(dictionary):
+    store = ConditionalItemsStore(conditional_items_path())
+    store.update(dictionary)
+    store.commit()
+
+
+def run_checks(names):
+    """
+    Runs the checks in names and returns a tuple of the exit code and a
+    dictionary of the conditional items of all of them
+    """
+    all_ran = 0
+    conditional_items = {}
+    for name in names:
+        try:
+            exit_code, items = conditions.run_check(name)
+        except Exception as e:
+            # One broken check must not keep the others from being written
+            logger(name, "%s: %s" % (type(e).__name__, e), "Failed")
+            all_ran = 1
+            continue
+        conditional_items.update(items)
+        logger(name,
+               ", ".join("%s=%s" % item for item in sorted(items.items())) or "-",
+               "OK")
+    return all_ran, conditional_items
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv == ['--list']:
+        for name in conditions.names():
+            print name
+        return 0
+
+    try:
+        names = conditions.selected(argv or enabled_checks, disabled_checks)
+    except ValueError as e:
+        print >> sys.stderr, e
+        return 1
+
+    all_ran, conditional_items = run_checks(names)
+
+    # Update "ConditionalItems.plist" if munki is installed
+    if update_munki_conditional_items and conditional_items and munki_installed():
+        append_conditional_items(conditional_items)
+
+    if verbose:
+        output.summary(all_ran, conditional_items)
+
+    # Exit codes:
+    # 0 = Every check ran
+    # 1 = At least one check could not be run
+    return all_ran
+
+
+if __name__ == '__main__':
+    sys.exit(main())
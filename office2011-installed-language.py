@@ -14,14 +14,13 @@
 # ================================================================================
 
 import sys
-import subprocess
 import os
 import re
-import plistlib
-import datetime
-from distutils.version import StrictVersion
-from operator import itemgetter, attrgetter
-from Foundation import CFPreferencesCopyAppValue
+from operator import itemgetter
+
+from macadmin import preferences
+from macadmin import receipts
+from macadmin.conditional_items import ConditionalItemsStore
 
 # ================================================================================
 # Start configuration
@@ -35,23 +34,18 @@ update_munki_conditional_items = False
 # End configuration
 # ================================================================================
 
-def info_for_package_identifier(identifier):
+RE_CORE_RESOURCE = r'^com\.microsoft\.office\.(?P<language_code>.*)\.core_resources\.pkg\.(?P<version>[0-9\.]+)(.update$|$)'
+
+
+def core_resource_language(identifier):
     """
-    Returns an info dictionary for a given package identifier
-    by running /usr/sbin/pkgutil --pkg-info-plist <identifier>
+    Returns the language code of an Office core resource package identifier
+    or None if identifier is not one
     """
-    if not identifier:
-        return None
-    
-    cmd = ["/usr/sbin/pkgutil", "--pkg-info-plist", identifier]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    if p.returncode != 0:
-        return None
-    
-    package_info_dict = {}
-    package_info_dict = plistlib.readPlistFromString(results)
-    return package_info_dict
+    m = re.match(RE_CORE_RESOURCE, identifier)
+    if m and m.group('language_code'):
+        return m.group('language_code')
+    return None
 
 
 def installed_core_resource_packages():
@@ -60,21 +54,13 @@ def installed_core_resource_packages():
     
     These packages have the following identifier format:
     com.microsoft.office.<language>.core_resources.pkg.<version>
+    
+    The package info dictionaries are read from the receipts in one pass
+    instead of running pkgutil --pkg-info-plist for every package.
     """
-    cmd = ["/usr/sbin/pkgutil", "--pkgs-plist"]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (results, err) = p.communicate()
-    if p.returncode != 0:
-        return []
-    all_package_identifiers = plistlib.readPlistFromString(results)
-    re_core_resource = re.compile(r'^com\.microsoft\.office\.(?P<language_code>.*)\.core_resources\.pkg\.(?P<version>[0-9\.]+)(.update$|$)')
-    matching_packages = []
-    for identifier in all_package_identifiers:
-        m = re.match(re_core_resource, identifier)
-        if m and m.group('language_code'):
-            item_info = info_for_package_identifier(identifier)
-            item_info['language'] = m.group('language_code')
-            matching_packages.append(item_info)
+    matching_packages = receipts.package_infos(core_resource_language)
+    for item_info in matching_packages:
+        item_info['language'] = core_resource_language(item_info['pkgid'])
     return matching_packages
 
 
@@ -83,7 +69,7 @@ def conditional_items_path():
     # Read the location of the ManagedInstallDir from ManagedInstall.plist
     bundle_id = 'ManagedInstalls'
     pref_name = 'ManagedInstallDir'
-    managed_installs_dir = CFPreferencesCopyAppValue(pref_name, bundle_id)
+    managed_installs_dir = preferences.copy_app_value(pref_name, bundle_id)
     # Make sure we're outputting our information to "ConditionalItems.plist"
     if managed_installs_dir:
         return os.path.join(managed_installs_dir, 'ConditionalItems.plist')
@@ -93,40 +79,47 @@ def conditional_items_path():
 
 
 def munki_installed():
-    cmd = ["pkgutil", "--pkg-info", "com.googlecode.munki.core"]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output = p.communicate()[0]
-    if p.returncode == 0:
-        return True
-    else:
-        return False
+    return receipts.munki_installed()
 
 
 def append_conditional_items(dictionary):
-    current_conditional_items_path = conditional_items_path()
-    if os.path.exists(current_conditional_items_path):
-        existing_dict = plistlib.readPlist(current_conditional_items_path)
-        output_dict = dict(existing_dict.items() + dictionary.items())
-    else:
-        output_dict = dictionary
-    plistlib.writePlist(output_dict, current_conditional_items_path)
-    pass
+    store = ConditionalItemsStore(conditional_items_path())
+    store.update(dictionary)
+    store.commit()
 
 
-def main(argv=None):
+def check_installed_language():
+    """
+    Runs the check and returns a tuple of the exit code and a dictionary
+    of conditional items
+    """
     # Get all Office core resource packages
     packages = installed_core_resource_packages()
     
     if len(packages) == 0:
         # Office is not installed
-        return 1
+        return 1, {}
     
     # Sort the packages by install time
-    packages_sorted = sorted(packages, key=attrgetter('install-time', 'pkg-version'), reverse=True)
+    packages_sorted = sorted(packages, key=itemgetter('install-time', 'pkg-version'), reverse=True)
     
     # Installed language is the language of the latest package
     latest_package_info = packages_sorted[0]
     latest_lang = latest_package_info.get('language', None)
+    if latest_lang:
+        return 0, {'office_2011_language': latest_lang}
+    else:
+        return 0, {}
+
+
+def main(argv=None):
+    office_installed, conditional_items = check_installed_language()
+    
+    if office_installed != 0:
+        # Office is not installed
+        return 1
+    
+    latest_lang = conditional_items.get('office_2011_language')
     
     if verbose:
         if latest_lang:
@@ -136,7 +129,7 @@ def main(argv=None):
 
     # Update "ConditionalItems.plist" if munki is installed
     if munki_installed() and update_munki_conditional_items and latest_lang:
-        append_conditional_items({'office_2011_language': latest_lang})
+        append_conditional_items(conditional_items)
 
     
     return 0
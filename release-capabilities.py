@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# ================================================================================
+# release-capabilities.py
+#
+# This script answers "what is the newest macOS release this hardware can run"
+# from the capability index in macadmin/capabilities.py, which is built from
+# the same rules as the check-10.*-compatibility.py scripts. The current system
+# version is not taken into account, only the hardware.
+#
+# Usage:
+#   release-capabilities.py                               This machine
+#   release-capabilities.py --board-id Mac-... --model MacBookPro11,5
+#   release-capabilities.py --inventory inventory.csv     One row per host
+#   release-capabilities.py --export capabilities.bin     Write the binary index
+#   release-capabilities.py --index capabilities.bin ...  Use a written index
+#
+# The inventory is a CSV or JSON lines file with the columns described in
+# macadmin/fleet.py. The output has the host id, the newest supported release
+# and the supported releases as a bitmask (bit n is the nth release in
+# macadmin/checkers.py, oldest first).
+#
+# Exit codes:
+# 0 = At least one release is supported (always 0 with --inventory and --export)
+# 1 = No release is supported
+#
+#
+# Hannes Juutilainen <hjuutilainen@mac.com>
+# https://github.com/hjuutilainen/adminscripts
+#
+# ================================================================================
+
+import sys
+import argparse
+
+from macadmin import capabilities
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up the releases hardware can run")
+    parser.add_argument("--board-id", help="board-id to look up instead of this machine")
+    parser.add_argument("--model", help="Model identifier to look up instead of this machine")
+    parser.add_argument("--virtual-machine", action="store_true",
+                        help="Look up a virtual machine")
+    parser.add_argument("--inventory", help="CSV or JSON lines inventory to look up")
+    parser.add_argument("--id-column", default="serial_number",
+                        help="Inventory column that identifies a host")
+    parser.add_argument("--index", help="Binary index to read instead of building one")
+    parser.add_argument("--export", metavar="PATH", help="Write the binary index to PATH")
+    args = parser.parse_args(argv)
+
+    if args.index:
+        with open(args.index, 'rb') as f:
+            index = capabilities.read(f)
+    else:
+        index = capabilities.build()
+
+    if args.export:
+        with open(args.export, 'wb') as f:
+            index.write(f)
+        return 0
+
+    if args.inventory:
+        from macadmin import fleet
+        inventory = fleet.read_inventory(args.inventory, args.id_column)
+        sys.stdout.write("%s,newest_supported,mask\n" % args.id_column)
+        for host_id, mask in zip(inventory.ids, capabilities.inventory_masks(index, inventory)):
+            sys.stdout.write("%s,%s,%d\n" % (host_id, index.newest_supported(mask) or '', mask))
+        return 0
+
+    if args.board_id or args.model or args.virtual_machine:
+        mask = index.mask(args.board_id, args.model, args.virtual_machine)
+    else:
+        mask = capabilities.machine_mask(index)
+    newest = index.newest_supported(mask)
+    sys.stdout.write("Newest supported: %s\n" % (newest or "none"))
+    sys.stdout.write("Supported: %s\n" % (", ".join(index.supported_versions(mask)) or "none"))
+    return 0 if newest else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# encoding: utf-8
+"""
+Installs the recorded hardware profiles of fixtures/profiles in place of
+the probes of the local machine, like benchmarks/replay-compatibility-checks.py.
+"""
+import json
+import os
+import unittest
+
+from macadmin import cache
+from macadmin import facts
+from macadmin import ioreg
+from macadmin import receipts
+from macadmin import sysctl
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES_DIR = os.path.join(REPO_DIR, 'fixtures', 'profiles')
+
+
+def names():
+    """Returns the names of the recorded profiles"""
+    return sorted(name for name in os.listdir(PROFILES_DIR)
+                  if os.path.isdir(os.path.join(PROFILES_DIR, name)))
+
+
+def golden():
+    """Returns the golden results of the profiles"""
+    with open(os.path.join(PROFILES_DIR, 'golden.json')) as f:
+        return json.load(f)
+
+
+def sysctl_values(name):
+    """Returns the sysctl values of a profile as a dictionary"""
+    values = {}
+    with open(os.path.join(PROFILES_DIR, name, 'sysctl.txt')) as f:
+        for line in f:
+            if ': ' in line:
+                key, value = line.rstrip('\n').split(': ', 1)
+                values[key] = value
+    return values
+
+
+def board_id(name):
+    """Returns the raw board-id of a profile"""
+    with open(os.path.join(PROFILES_DIR, name, 'IODeviceTree-root.txt')) as f:
+        return ioreg.find_properties(f, ['board-id']).get('board-id')
+
+
+def commands(name):
+    """Returns the recorded command outputs of a profile"""
+    with open(os.path.join(PROFILES_DIR, name, 'commands.json')) as f:
+        return json.load(f)
+
+
+class ProfileTestCase(unittest.TestCase):
+    """Restores the probes and the cache after every test"""
+
+    def setUp(self):
+        self.saved = (cache.enabled, facts.PROBE_TIMEOUT, facts.SYSTEM_VERSION_PLIST,
+                      ioreg.read_board_id, ioreg.stream_properties,
+                      receipts.RECEIPTS_DIR, receipts.run_command, sysctl.provider())
+        cache.enabled = False
+        cache.reset()
+        facts.reset()
+        receipts.reset()
+
+    def tearDown(self):
+        (cache.enabled, facts.PROBE_TIMEOUT, facts.SYSTEM_VERSION_PLIST,
+         ioreg.read_board_id, ioreg.stream_properties,
+         receipts.RECEIPTS_DIR, receipts.run_command, provider) = self.saved
+        sysctl.set_provider(provider)
+        cache.reset()
+        facts.reset()
+        receipts.reset()
+
+    def install_profile(self, name, provider=None):
+        """
+        Points the probes to the recordings of the profile name. provider is
+        the sysctl provider, a FixtureSysctl of the profile by default.
+        """
+        path = os.path.join(PROFILES_DIR, name)
+        recorded_board_id = board_id(name)
+        outputs = commands(name)
+
+        def stream_properties(cmd, keys, timeout=None):
+            output = outputs.get(' '.join(cmd))
+            if output is None:
+                return {}
+            return ioreg.find_properties(output.splitlines(True), keys)
+
+        facts.reset()
+        receipts.reset()
+        facts.SYSTEM_VERSION_PLIST = os.path.join(path, 'SystemVersion.plist')
+        receipts.RECEIPTS_DIR = os.path.join(path, 'receipts')
+        receipts.run_command = lambda cmd, timeout=None: outputs.get(' '.join(cmd))
+        ioreg.read_board_id = lambda: recorded_board_id
+        ioreg.stream_properties = stream_properties
+        sysctl.set_provider(provider or sysctl.FixtureSysctl(sysctl_values(name)))
@@ -0,0 +1,102 @@
+# encoding: utf-8
+import io
+import unittest
+
+from macadmin import capabilities
+from macadmin import checkers
+from macadmin import rules
+from macadmin.intervals import parse_model_range
+
+VERSIONS = [release[0] for release in checkers.RELEASES]
+
+# The open ends of the model intervals are tested at these revisions
+_FIRST = (1, 0)
+_LAST = (99, 99)
+
+
+def rules_source_releases():
+    return rules.read_source()['Releases']
+
+
+def source_board_ids():
+    """Returns every board-id in compatibility_rules.plist"""
+    board_ids = set()
+    for release in rules_source_releases().values():
+        board_ids.update(release.get('BoardIDs', []))
+    return sorted(board_ids)
+
+
+def source_models():
+    """
+    Returns model identifiers at, inside and just outside the bounds of
+    every model interval in compatibility_rules.plist
+    """
+    revisions = {}
+    for release in rules_source_releases().values():
+        for text in release.get('NonSupportedModels', []):
+            family, low, high = parse_model_range(text)
+            low = max(low, _FIRST)
+            high = min(high, _LAST)
+            found = revisions.setdefault(family, set())
+            for major, minor in (low, high):
+                found.update([(major, minor), (major, minor + 1), (major + 1, 0)])
+                if minor > 0:
+                    found.add((major, minor - 1))
+                if major > 1:
+                    found.add((major - 1, 9))
+    return sorted("%s%d,%d" % (family, major, minor)
+                  for family, found in revisions.items() for major, minor in found)
+
+
+class CapabilityIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.index = capabilities.build()
+        cls.rules = [rules.load(version) for version in VERSIONS]
+
+    def test_board_ids_match_the_rules(self):
+        for board_id in source_board_ids() + [None, 'Mac-0000000000000000']:
+            mask = self.index.mask(board_id=board_id)
+            for version, release_rules in zip(VERSIONS, self.rules):
+                self.assertEqual(self.index.supports(mask, version),
+                                 board_id in release_rules.board_ids,
+                                 "%s %s" % (board_id, version))
+
+    def test_models_match_the_rules(self):
+        models = source_models()
+        self.assertTrue(models)
+        for model in models + ['', 'Unknown', 'iMac']:
+            mask = self.index.model_mask(model)
+            for version, release_rules in zip(VERSIONS, self.rules):
+                self.assertEqual(self.index.supports(mask, version),
+                                 model not in release_rules.non_supported_models,
+                                 "%s %s" % (model, version))
+
+    def test_requirements_match_the_rules(self):
+        board_id = source_board_ids()[0]
+        for version, release_rules in zip(VERSIONS, self.rules):
+            bit = self.index.bit(version)
+            if release_rules.minimum_memory:
+                memsize = release_rules.minimum_memory - 1
+                self.assertFalse(self.index.mask(board_id, memsize=memsize) & bit, version)
+            if release_rules.requires_64bit_cpu:
+                self.assertFalse(self.index.mask(board_id, cpu64bit_capable=False) & bit, version)
+            virtual_machine = self.index.mask('440BX Desktop Reference Platform', 'VMware7,1',
+                                              virtual_machine=True)
+            if release_rules.virtual_machine == 'supported':
+                self.assertTrue(virtual_machine & bit, version)
+
+    def test_written_index_reads_back(self):
+        buf = io.BytesIO()
+        self.index.write(buf)
+        buf.seek(0)
+        copy = capabilities.read(buf)
+        self.assertEqual(copy.versions, self.index.versions)
+        self.assertEqual(copy.board_masks, self.index.board_masks)
+        for model in source_models():
+            self.assertEqual(copy.model_mask(model), self.index.model_mask(model), model)
+
+
+if __name__ == '__main__':
+    unittest.main()
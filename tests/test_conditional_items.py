@@ -0,0 +1,91 @@
+# encoding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from macadmin.conditional_items import ConditionalItemsStore
+from macadmin.plists import read_plist
+from macadmin.plists import write_plist
+
+
+class ConditionalItemsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ConditionalItems.plist')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_bytes(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def read_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def commit(self, dictionary):
+        store = ConditionalItemsStore(self.path)
+        store.update(dictionary)
+        return store.commit()
+
+    def test_merges_with_existing_keys(self):
+        write_plist({'other_key': 'kept'}, self.path)
+        self.assertTrue(self.commit({'virtual_machine': True}))
+        self.assertEqual(dict(read_plist(self.path)), {'other_key': 'kept', 'virtual_machine': True})
+
+    def test_unchanged_contents_are_not_written(self):
+        write_plist({'virtual_machine': True}, self.path)
+        self.assertFalse(self.commit({'virtual_machine': True}))
+
+    def test_empty_file_is_replaced(self):
+        self.write_bytes(b'')
+        self.commit({'virtual_machine': True})
+        self.assertEqual(dict(read_plist(self.path)), {'virtual_machine': True})
+
+    def test_truncated_xml_is_replaced(self):
+        write_plist({'other_key': 'kept'}, self.path)
+        data = self.read_bytes()
+        self.write_bytes(data[:len(data) // 2])
+        self.commit({'virtual_machine': True})
+        self.assertEqual(dict(read_plist(self.path)), {'virtual_machine': True})
+
+    def test_unknown_format_is_not_overwritten(self):
+        data = b'bplist15 written by something newer'
+        self.write_bytes(data)
+        self.assertRaises(Exception, self.commit, {'virtual_machine': True})
+        self.assertEqual(self.read_bytes(), data)
+
+    def test_damaged_xml_is_not_overwritten(self):
+        write_plist({'other_key': 'kept'}, self.path)
+        data = self.read_bytes().replace(b'<key>', b'<kye>', 1)
+        self.write_bytes(data)
+        self.assertRaises(Exception, self.commit, {'virtual_machine': True})
+        self.assertEqual(self.read_bytes(), data)
+
+    def test_not_a_dictionary_is_not_overwritten(self):
+        write_plist(['not', 'a', 'dictionary'], self.path)
+        data = self.read_bytes()
+        self.assertRaises(ValueError, self.commit, {'virtual_machine': True})
+        self.assertEqual(self.read_bytes(), data)
+
+    def test_read_error_is_not_overwritten(self):
+        os.mkdir(self.path)
+        self.assertRaises(EnvironmentError, self.commit, {'virtual_machine': True})
+        self.assertTrue(os.path.isdir(self.path))
+
+    @unittest.skipIf(os.geteuid() == 0, "root can read any file")
+    def test_unreadable_file_is_not_overwritten(self):
+        write_plist({'other_key': 'kept'}, self.path)
+        os.chmod(self.path, 0)
+        try:
+            self.assertRaises(IOError, self.commit, {'virtual_machine': True})
+        finally:
+            os.chmod(self.path, 0o644)
+        self.assertEqual(dict(read_plist(self.path)), {'other_key': 'kept'})
+
+
+if __name__ == '__main__':
+    unittest.main()
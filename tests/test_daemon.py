@@ -0,0 +1,105 @@
+# encoding: utf-8
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+from macadmin import daemon
+from macadmin import facts
+from macadmin import sysctl
+from tests import profiles
+
+
+class HangOnceSysctl(sysctl.FixtureSysctl):
+    """FixtureSysctl whose first hw.model read waits until release is set"""
+
+    def __init__(self, values):
+        sysctl.FixtureSysctl.__init__(self, values)
+        self.release = threading.Event()
+        self.hung = False
+
+    def string(self, name):
+        if name == "hw.model" and not self.hung:
+            self.hung = True
+            self.release.wait(5)
+        return sysctl.FixtureSysctl.string(self, name)
+
+
+@unittest.skipIf(sys.version_info[0] > 2, "the check scripts are python 2")
+class RefreshAfterTimeoutTest(profiles.ProfileTestCase):
+
+    def tearDown(self):
+        self.provider.release.set()
+        profiles.ProfileTestCase.tearDown(self)
+
+    def test_answers_are_refreshed_after_a_probe_timed_out(self):
+        self.provider = HangOnceSysctl(profiles.sysctl_values('macbookpro11-5-mojave'))
+        self.install_profile('macbookpro11-5-mojave', self.provider)
+        facts.PROBE_TIMEOUT = 0.2
+        service = daemon.CompatibilityService(['10.14', '10.15'])
+
+        service.refresh()
+        self.assertEqual(service.timed_out, ['model'])
+        self.assertFalse(json.loads(service.response('10.15').decode('utf-8'))['supported'])
+        self.assertTrue(service.is_stale())
+
+        self.provider.release.set()
+        service.refresh()
+        self.assertEqual(service.timed_out, [])
+        self.assertTrue(json.loads(service.response('10.15').decode('utf-8'))['supported'])
+        self.assertFalse(service.is_stale())
+
+
+class QueryHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'compatibility.sock')
+        service = daemon.CompatibilityService(['10.15'])
+        service.responses = {'10.15': daemon._encode({'release': '10.15', 'supported': True})}
+        service.is_stale = lambda: False
+        self.server = daemon.CompatibilityServer(service, self.path, refresh_interval=3600)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.directory)
+
+    def connect(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(self.path)
+        return client, client.makefile('rb')
+
+    def test_answers_requests(self):
+        client, answers = self.connect()
+        try:
+            client.sendall(b'10.15\n10.99\n')
+            self.assertTrue(json.loads(answers.readline().decode('utf-8'))['supported'])
+            self.assertIn('error', json.loads(answers.readline().decode('utf-8')))
+        finally:
+            answers.close()
+            client.close()
+
+    def test_long_request_closes_the_connection(self):
+        client, answers = self.connect()
+        try:
+            client.sendall(b'1' * (daemon.MAX_REQUEST * 4) + b'\n')
+            answer = json.loads(answers.readline().decode('utf-8'))
+            self.assertEqual(answer, {'error': "Request too long"})
+            self.assertEqual(answers.readline(), b'')
+        finally:
+            answers.close()
+            client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# encoding: utf-8
+import os
+import re
+import unittest
+
+from macadmin import distribution
+from macadmin.intervals import ModelRanges
+from macadmin.intervals import parse_model_range
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'fixtures', 'distribution', 'OSInstall-10.15-Distribution.xml')
+
+
+def ranges(intervals):
+    return ModelRanges(parse_model_range(interval) for interval in intervals)
+
+
+class ModelIntervalsTest(unittest.TestCase):
+
+    def test_gap_in_minor_revisions(self):
+        intervals = distribution.model_intervals(['MacBookPro8,1', 'MacBookPro8,3'])
+        self.assertEqual(intervals, ['MacBookPro8,1', 'MacBookPro8,3'])
+        self.assertFalse('MacBookPro8,2' in ranges(intervals))
+
+    def test_revisions_below_the_lowest_listed(self):
+        intervals = distribution.model_intervals(['iMac7,1', 'iMac8,1'])
+        self.assertEqual(intervals, ['iMac7,1', 'iMac8,1'])
+        self.assertFalse('iMac6,1' in ranges(intervals))
+
+    def test_consecutive_minor_revisions(self):
+        intervals = distribution.model_intervals(['Macmini5,3', 'Macmini5,1', 'Macmini5,2'])
+        self.assertEqual(intervals, ['Macmini 5,1 - 5,3'])
+        self.assertFalse('Macmini5,4' in ranges(intervals))
+        self.assertFalse('Macmini6,1' in ranges(intervals))
+
+    def test_unparsed_identifiers_are_kept(self):
+        self.assertEqual(distribution.model_intervals(['Xserve1,1', 'Unknown']),
+                         ['Unknown', 'Xserve1,1'])
+
+    def test_fixture_excludes_exactly_the_listed_models(self):
+        with open(FIXTURE) as f:
+            listed = re.search(r"nonSupportedModels = \[(.*?)\]", f.read()).group(1)
+        listed = set(re.findall(r"'([^']+)'", listed))
+        compiled = ranges(distribution.parse_distribution(FIXTURE)['NonSupportedModels'])
+        for model in listed:
+            self.assertTrue(model in compiled, model)
+        for family in ('iMac', 'MacBook', 'MacBookAir', 'MacBookPro', 'Macmini', 'MacPro', 'Xserve'):
+            for major in range(1, 16):
+                for minor in range(1, 7):
+                    model = "%s%d,%d" % (family, major, minor)
+                    self.assertEqual(model in compiled, model in listed, model)
+
+
+if __name__ == '__main__':
+    unittest.main()
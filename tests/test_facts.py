@@ -0,0 +1,49 @@
+# encoding: utf-8
+import sys
+import time
+import unittest
+
+from macadmin import checkers
+from macadmin import facts
+from macadmin import sysctl
+from tests import profiles
+
+PROFILE = 'macpro5-1-highsierra'
+
+
+class SlowModelSysctl(sysctl.FixtureSysctl):
+    """FixtureSysctl whose hw.model does not answer before the probe timeout"""
+
+    def string(self, name):
+        if name == "hw.model":
+            time.sleep(1)
+        return sysctl.FixtureSysctl.string(self, name)
+
+
+class PrefetchTimeoutTest(profiles.ProfileTestCase):
+
+    def setUp(self):
+        profiles.ProfileTestCase.setUp(self)
+        self.install_profile(PROFILE, SlowModelSysctl(profiles.sysctl_values(PROFILE)))
+        facts.PROBE_TIMEOUT = 0.2
+
+    def test_later_prefetch_reports_earlier_timeouts(self):
+        self.assertEqual(facts.prefetch(), ['model'])
+        self.assertEqual(facts.prefetch(), ['model'])
+        self.assertEqual(facts.prefetch(['memsize']), [])
+
+    def test_slow_probe_within_the_timeout_is_kept(self):
+        facts.PROBE_TIMEOUT = 1.5
+        self.assertEqual(facts.prefetch(), [])
+        self.assertEqual(facts.model(), 'MacPro5,1')
+
+    @unittest.skipIf(sys.version_info[0] > 2, "the check scripts are python 2")
+    def test_releases_checked_after_a_timeout_are_not_supported(self):
+        for version in ('10.8', '10.15', '10.14'):
+            exit_code, conditional_items = checkers.release_result(version)
+            supported_key = "%s_supported" % checkers.release_for_version(version)[1]
+            self.assertEqual((exit_code, conditional_items), (1, {supported_key: False}), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
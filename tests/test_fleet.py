@@ -0,0 +1,162 @@
+# encoding: utf-8
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from macadmin import checkers
+from macadmin import fleet
+from macadmin import rules
+from macadmin.plists import read_plist
+from tests import profiles
+
+# Hosts that are not in the recorded profiles, to reach the memory, 64 bit
+# and system version rules
+EXTRA_RECORDS = [
+    {'serial_number': 'LOWMEM', 'board_id': 'Mac-F221BEC8', 'model': 'MacPro5,1',
+     'product_version': '10.13.6', 'memsize': '1073741824', 'cpu64bit_capable': '1',
+     'cpu_features': 'FPU SSE'},
+    {'serial_number': '32BIT', 'board_id': 'Mac-F4208CC8', 'model': 'MacBook3,1',
+     'product_version': '10.6.8', 'memsize': '2147483648', 'cpu64bit_capable': 'false',
+     'cpu_features': 'FPU SSE'},
+    {'serial_number': 'TOOOLD', 'board_id': 'Mac-06F11F11946D27C5', 'model': 'MacBookPro11,5',
+     'product_version': '10.4.11', 'memsize': '17179869184', 'cpu64bit_capable': 'true'},
+    {'serial_number': 'VMFLAG', 'model': 'VMware7,1', 'product_version': '10.14.6',
+     'memsize': '4294967296', 'cpu64bit_capable': '1', 'virtual_machine': 'true'},
+    {'serial_number': 'EMPTY'},
+]
+
+
+def profile_record(name):
+    """Returns the inventory record of a recorded profile"""
+    values = profiles.sysctl_values(name)
+    system_version = read_plist(os.path.join(profiles.PROFILES_DIR, name, 'SystemVersion.plist'))
+    return {'serial_number': name,
+            'board_id': profiles.board_id(name),
+            'model': values.get('hw.model'),
+            'product_version': system_version['ProductVersion'],
+            'memsize': values.get('hw.memsize'),
+            'cpu64bit_capable': values.get('hw.cpu64bit_capable'),
+            'cpu_features': values.get('machdep.cpu.features', '')}
+
+
+class FleetTestMixin(object):
+    """The tests of the evaluator, run with and without NumPy"""
+
+    numpy = None
+
+    def setUp(self):
+        self.saved_numpy = fleet.numpy
+        fleet.numpy = self.numpy
+
+    def tearDown(self):
+        fleet.numpy = self.saved_numpy
+
+    def test_profiles_match_the_golden_results(self):
+        golden = profiles.golden()
+        names = profiles.names()
+        inventory = fleet.Inventory(profile_record(name) for name in names)
+        results = fleet.evaluate(inventory)
+        for version, key in fleet.release_keys():
+            for name, verdict in zip(names, results[key]):
+                self.assertEqual(bool(verdict), golden[name][version]['conditional_items'][key],
+                                 "%s %s" % (name, version))
+
+    def test_columns_match_the_row_at_a_time_evaluation(self):
+        records = [profile_record(name) for name in profiles.names()] + EXTRA_RECORDS
+        results = fleet.evaluate(fleet.Inventory(records))
+        for version, key in fleet.release_keys():
+            release_rules = rules.load(version)
+            self.assertEqual([bool(value) for value in results[key]],
+                             [fleet.evaluate_record(record, release_rules) for record in records],
+                             version)
+
+    def test_stream_matches_the_matrix(self):
+        records = [profile_record(name) for name in profiles.names()] + EXTRA_RECORDS
+        inventory = fleet.Inventory(records)
+        expected = io.BytesIO()
+        fleet.write_matrix(inventory, fleet.evaluate(inventory), expected, 'jsonl')
+        for workers in (1, 2):
+            output = io.BytesIO()
+            count = fleet.write_stream(iter(records), output, output_format='jsonl',
+                                       workers=workers, batch_size=3)
+            self.assertEqual(count, len(records))
+            self.assertEqual(output.getvalue(), expected.getvalue(), workers)
+
+    def test_binary_matrix_round_trip(self):
+        records = [profile_record(name) for name in profiles.names()] + EXTRA_RECORDS
+        inventory = fleet.Inventory(records)
+        results = fleet.evaluate(inventory, ['10.14', '10.15'])
+        output = io.BytesIO()
+        fleet.write_matrix(inventory, results, output, 'binary')
+        output.seek(0)
+        rows = list(fleet.read_binary_matrix(output))
+        self.assertEqual([host_id for host_id, verdicts in rows],
+                         [str(host_id) for host_id in inventory.ids])
+        for index, (host_id, verdicts) in enumerate(rows):
+            self.assertEqual(verdicts, dict((key, bool(column[index]))
+                                            for key, column in results.items()))
+
+
+class PlainFleetTest(FleetTestMixin, unittest.TestCase):
+    numpy = None
+
+
+@unittest.skipIf(fleet.numpy is None, "NumPy is not installed")
+class NumpyFleetTest(FleetTestMixin, unittest.TestCase):
+    numpy = fleet.numpy
+
+
+@unittest.skipIf(sys.version_info[0] > 2, "the check scripts are python 2")
+class ReleaseResultTest(profiles.ProfileTestCase):
+
+    def test_profiles_match_release_result(self):
+        names = profiles.names()
+        results = fleet.evaluate(fleet.Inventory(profile_record(name) for name in names))
+        for index, name in enumerate(names):
+            self.install_profile(name)
+            for version, key in fleet.release_keys():
+                exit_code, conditional_items = checkers.release_result(version)
+                self.assertEqual(bool(results[key][index]), conditional_items[key],
+                                 "%s %s" % (name, version))
+
+
+class ReadRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.records = [{'serial_number': 'C02A', 'model': 'MacBookPro11,5'},
+                        {'serial_number': 'C02B', 'model': 'MacPro5,1'}]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def json_lines(self):
+        return ''.join(json.dumps(record) + '\n' for record in self.records)
+
+    def test_json_array(self):
+        path = self.write('inventory.json', '\n  ' + json.dumps(self.records, indent=2))
+        self.assertEqual(list(fleet.read_records(path)), self.records)
+
+    def test_json_lines(self):
+        for name in ('inventory.jsonl', 'inventory.ndjson', 'inventory.json'):
+            path = self.write(name, self.json_lines() + '\n')
+            self.assertEqual(list(fleet.read_records(path)), self.records, name)
+
+    def test_csv(self):
+        path = self.write('inventory.csv',
+                          'serial_number,model\nC02A,"MacBookPro11,5"\nC02B,"MacPro5,1"\n')
+        self.assertEqual([dict(record) for record in fleet.read_records(path)], self.records)
+
+
+if __name__ == '__main__':
+    unittest.main()
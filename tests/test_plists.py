@@ -0,0 +1,104 @@
+# encoding: utf-8
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from macadmin import plists
+from macadmin import preferences
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'fixtures', 'plists', 'binary-types.plist')
+
+# The contents of FIXTURE, written by plistlib.dumps(CONTENTS, fmt=plistlib.FMT_BINARY)
+CONTENTS = {
+    'ManagedInstallDir': '/Library/Managed Installs',
+    'false': False,
+    'true': True,
+    'integers': [0, 1, 255, 256, 65535, 65536, 2 ** 32, 2 ** 63 - 1, -1, -(2 ** 63)],
+    'reals': [0.0, 0.5, -1.25, 1e100],
+    'date': datetime.datetime(2019, 10, 16, 14, 2, 47),
+    'data': b'\x00\x01\xfe\xff',
+    'empty data': b'',
+    u'unicode': u'Jyväskylä ☃',
+    'long string': 'x' * 40,
+    'long list': list(range(20)),
+    'empty list': [],
+    'empty dictionary': {},
+    'nested': {'list': [{'a': [1, 2, {'b': u'ä'}]}, [[[]]]], 'dictionary': {'c': 'd'}},
+}
+
+
+def binary_plist(contents):
+    """Returns contents as a binary property list written by plistlib"""
+    import plistlib
+    return plistlib.dumps(contents, fmt=plistlib.FMT_BINARY)
+
+
+def has_binary_writer():
+    import plistlib
+    return hasattr(plistlib, 'FMT_BINARY')
+
+
+class BinaryPlistTest(unittest.TestCase):
+
+    def read_fixture(self):
+        with open(FIXTURE, 'rb') as f:
+            return f.read()
+
+    def test_fixture(self):
+        self.assertEqual(plists.read_binary_plist_from_string(self.read_fixture()), CONTENTS)
+        self.assertEqual(plists.read_plist(FIXTURE), CONTENTS)
+
+    @unittest.skipUnless(has_binary_writer(), "plistlib can not write binary property lists")
+    def test_fixture_is_what_plistlib_writes(self):
+        self.assertEqual(self.read_fixture(), binary_plist(CONTENTS))
+
+    @unittest.skipUnless(has_binary_writer(), "plistlib can not write binary property lists")
+    def test_round_trip(self):
+        values = [CONTENTS, [], {}, 'text', u'ä', 0, -5, 2 ** 40, 3.5, True, False,
+                  b'\x00' * 300, 'y' * 300, list(range(300)),
+                  dict(('key%03d' % index, index) for index in range(300)),
+                  datetime.datetime(2001, 1, 1), datetime.datetime(1969, 7, 20, 20, 17, 40)]
+        for value in values:
+            self.assertEqual(plists.read_binary_plist_from_string(binary_plist(value)), value)
+
+    def test_truncated_data_raises(self):
+        data = self.read_fixture()
+        for length in (0, 8, 20, len(data) // 2, len(data) - 1):
+            self.assertRaises(ValueError, plists.read_binary_plist_from_string, data[:length])
+
+    def test_damaged_offset_table_raises(self):
+        data = bytearray(self.read_fixture())
+        # Point the offset table past the end of the data
+        data[-8:] = b'\x7f' + b'\xff' * 7
+        self.assertRaises(ValueError, plists.read_binary_plist_from_string, bytes(data))
+
+    def test_not_a_binary_plist_raises(self):
+        self.assertRaises(ValueError, plists.read_binary_plist_from_string, b'<?xml version="1.0"?>')
+
+
+class CopyAppValueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = preferences.PREFERENCES_DIR, preferences._overriding_paths
+        preferences.PREFERENCES_DIR = self.directory
+        # No managed or user preferences take precedence
+        preferences._overriding_paths = lambda domain: []
+        shutil.copy(FIXTURE, os.path.join(self.directory, 'ManagedInstalls.plist'))
+
+    def tearDown(self):
+        preferences.PREFERENCES_DIR, preferences._overriding_paths = self.saved
+        shutil.rmtree(self.directory)
+
+    def test_reads_binary_preferences(self):
+        self.assertEqual(preferences.copy_app_value('ManagedInstallDir', 'ManagedInstalls'),
+                         '/Library/Managed Installs')
+        self.assertEqual(preferences.copy_app_value('Missing', 'ManagedInstalls'), None)
+        self.assertEqual(preferences.copy_app_value('ManagedInstallDir', 'NoSuchDomain'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# encoding: utf-8
+import marshal
+import os
+import shutil
+import tempfile
+import unittest
+
+from macadmin import rules
+
+PLANTED_BOARD_ID = 'Mac-0000000000000000'
+
+
+class CompiledRulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_dir = rules.COMPILED_DIR
+        self.directory = tempfile.mkdtemp()
+        rules.COMPILED_DIR = os.path.join(self.directory, 'compiled')
+        rules._loaded.clear()
+
+    def tearDown(self):
+        rules.COMPILED_DIR = self.saved_dir
+        rules._loaded.clear()
+        shutil.rmtree(self.directory)
+
+    def plant(self, version, mode):
+        """Writes a compiled table of version that supports PLANTED_BOARD_ID"""
+        compiled = rules.compile_rules()[version]
+        table = dict((field, rules._compiled_value(field, value))
+                     for field, value in zip(rules._COMPILED_FIELDS, compiled[2:]))
+        table['board_ids'] = frozenset([PLANTED_BOARD_ID])
+        table['signature'] = rules._source_signature()
+        table['rules_version'] = compiled.rules_version
+        if not os.path.isdir(rules.COMPILED_DIR):
+            os.makedirs(rules.COMPILED_DIR)
+        path = rules.compiled_path(version)
+        with open(path, 'wb') as f:
+            marshal.dump(table, f)
+        os.chmod(path, mode)
+
+    def test_writable_tables_are_not_read(self):
+        self.plant('10.15', 0o666)
+        loaded = rules.load('10.15')
+        self.assertNotIn(PLANTED_BOARD_ID, loaded.board_ids)
+        self.assertEqual(loaded.board_ids, rules.compile_rules()['10.15'].board_ids)
+
+    @unittest.skipIf(os.geteuid() == 0, "root owns every file it writes")
+    def test_tables_of_other_users_are_not_read(self):
+        self.plant('10.15', 0o644)
+        self.assertNotIn(PLANTED_BOARD_ID, rules.load('10.15').board_ids)
+
+    @unittest.skipIf(os.geteuid() != 0, "only root writes the tables")
+    def test_tables_written_by_root_are_read(self):
+        rules.compile_rules()
+        path = rules.compiled_path('10.15')
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+        self.plant('10.15', 0o644)
+        self.assertIn(PLANTED_BOARD_ID, rules.load('10.15').board_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
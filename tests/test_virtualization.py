@@ -0,0 +1,100 @@
+# encoding: utf-8
+import os
+import sys
+import unittest
+
+from macadmin import checkers
+from macadmin import facts
+from macadmin import ioreg
+from macadmin import sysctl
+from macadmin import virtualization
+from tests import profiles
+
+# (name, signals, expected vendor, expected scores)
+DETECTIONS = [
+    ('vmware',
+     {'cpu_features': ['FPU', 'SSE', 'VMM'], 'hv_vmm_present': 1,
+      'model': 'VMware7,1', 'board_id': '440BX Desktop Reference Platform'},
+     virtualization.VMWARE, {virtualization.VMWARE: 5}),
+    ('parallels',
+     {'cpu_features': ['FPU', 'VMM'], 'model': 'Parallels15,1',
+      'board_id': 'Parallels-ARM', 'brand_string': 'Intel(R) Core(TM) i7-8559U CPU'},
+     virtualization.PARALLELS, {virtualization.PARALLELS: 5}),
+    ('virtualbox',
+     {'cpu_features': ['FPU', 'VMM'], 'model': 'VirtualBox',
+      'board_id': 'VirtualBox', 'manufacturer': 'innotek GmbH'},
+     virtualization.VIRTUALBOX, {virtualization.VIRTUALBOX: 7}),
+    ('apple without cpu features',
+     {'cpu_features': [], 'hv_vmm_present': 1, 'model': 'VirtualMac2,1',
+      'board_id': 'VMA2MACOSAP', 'brand_string': 'Apple M1 (Virtual)'},
+     virtualization.APPLE, {virtualization.APPLE: 6}),
+    ('model outweighs manufacturer',
+     {'cpu_features': ['VMM'], 'model': 'VMware7,1', 'manufacturer': 'Parallels'},
+     virtualization.VMWARE, {virtualization.VMWARE: 3, virtualization.PARALLELS: 2}),
+    ('unknown hypervisor',
+     {'cpu_features': ['FPU', 'VMM'], 'hv_vmm_present': 1,
+      'model': 'MacPro5,1', 'board_id': 'Mac-F221BEC8'},
+     virtualization.UNKNOWN, {}),
+    ('unknown from hv_vmm_present alone',
+     {'cpu_features': [], 'hv_vmm_present': 1, 'model': 'Mac14,2'},
+     virtualization.UNKNOWN, {}),
+    ('bare metal',
+     {'cpu_features': ['FPU', 'SSE', 'SSE2'], 'hv_vmm_present': 0,
+      'model': 'MacBookPro11,5', 'board_id': 'Mac-06F11F11946D27C5',
+      'brand_string': 'Intel(R) Core(TM) i7-4870HQ CPU @ 2.50GHz'},
+     virtualization.NONE, {}),
+    ('nothing known',
+     {'cpu_features': None, 'hv_vmm_present': None, 'model': None, 'board_id': None},
+     virtualization.NONE, {}),
+]
+
+
+class DetectTest(unittest.TestCase):
+
+    def test_detect(self):
+        for name, signals, vendor, scores in DETECTIONS:
+            self.assertEqual(virtualization.detect(signals), vendor, name)
+
+    def test_scores(self):
+        for name, signals, vendor, scores in DETECTIONS:
+            self.assertEqual(virtualization.scores(signals), scores, name)
+
+    def test_hypervisor_present(self):
+        for name, signals, vendor, scores in DETECTIONS:
+            self.assertEqual(virtualization.hypervisor_present(signals),
+                             vendor != virtualization.NONE, name)
+
+
+class IsVirtualMachineTest(profiles.ProfileTestCase):
+
+    def install_apple_guest(self):
+        sysctl.set_provider(sysctl.FixtureSysctl({'hw.model': 'VirtualMac2,1',
+                                                  'kern.hv_vmm_present': '1',
+                                                  'hw.memsize': '8589934592'}))
+        ioreg.read_board_id = lambda: 'VMA2MACOSAP'
+
+    def test_apple_guest_without_cpu_features_is_virtual(self):
+        self.install_apple_guest()
+        self.assertEqual(facts.cpu_features(), [])
+        self.assertEqual(facts.virtual_machine_vendor(), virtualization.APPLE)
+        self.assertTrue(facts.is_virtual_machine())
+
+    @unittest.skipIf(sys.version_info[0] > 2, "the check scripts are python 2")
+    def test_conditionals_agree_on_an_apple_guest(self):
+        self.install_apple_guest()
+        checker = checkers.load_script(os.path.join(profiles.REPO_DIR, 'check-if-virtual-machine.py'))
+        self.assertEqual(checker.check_virtual_machine(),
+                         (0, {'virtual_machine': True,
+                              'virtual_machine_vendor': virtualization.APPLE}))
+
+    def test_recorded_profiles_agree_with_their_vendor(self):
+        golden = profiles.golden()
+        for name in profiles.names():
+            self.install_profile(name)
+            vendor = golden[name]['virtual_machine_vendor']
+            self.assertEqual(facts.virtual_machine_vendor(), vendor, name)
+            self.assertEqual(facts.is_virtual_machine(), vendor != virtualization.NONE, name)
+
+
+if __name__ == '__main__':
+    unittest.main()